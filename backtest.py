@@ -0,0 +1,179 @@
+import math
+import os
+import re
+
+import numpy as np
+import pandas as pd
+
+from metrics import N_PAIRS, PAIR_A, PAIR_B, draw_pair_ids, draw_days
+from scoring import composite_from_arrays, chi_square_from_counts, single_weights, DEFAULT_WEIGHTS
+
+COLORS = ("red", "white")
+DEFAULT_CHUNK = 128
+
+
+def parse_step(text) -> int:
+    """'1d' -> 1, '2w' -> 14, '7' -> 7 (days)."""
+    m = re.fullmatch(r"\s*(\d+)\s*([dw]?)\s*", str(text).lower())
+    if not m or int(m.group(1)) < 1:
+        raise ValueError(f"Invalid step: {text!r} (expected e.g. 1d, 7d, 2w)")
+    return int(m.group(1)) * (7 if m.group(2) == "w" else 1)
+
+
+def parse_windows(text) -> list:
+    try:
+        windows = sorted({int(w) for w in str(text).split(",") if w.strip()})
+    except ValueError:
+        raise ValueError(f"Invalid window list: {text!r} (expected e.g. 7,30,90)") from None
+    if not windows or windows[0] < 1:
+        raise ValueError(f"Invalid window list: {text!r} (expected e.g. 7,30,90)")
+    return windows
+
+
+def eval_points(days, step: int):
+    """End offsets (exclusive) of the evaluation dates: the last draw of each day, at least `step` days apart."""
+    ends = np.flatnonzero(np.diff(days, append=days[-1] + 1)) + 1
+    keep = []
+    last = None
+    for e in ends:
+        if last is None or days[e - 1] - last >= step:
+            keep.append(e)
+            last = days[e - 1]
+    return np.asarray(keep, dtype=np.int64)
+
+
+def _prefix_at(segment, ids, values, n_points):
+    """
+    (n_points, 325) per-pair sums of the draws before each point, for one
+    color. segment[r] is the first point after draw r (its searchsorted
+    position in the points), so each draw lands in one bincount cell and a
+    cumsum over the points gives the prefix sums; memory grows with the
+    points, not the draws.
+    """
+    hist = np.bincount(segment * N_PAIRS + ids, weights=values, minlength=(n_points + 1) * N_PAIRS)
+    return np.cumsum(hist.reshape(-1, N_PAIRS)[:n_points], axis=0)
+
+
+def _score(counts, weighted, n, weights):
+    chi = chi_square_from_counts(counts, n)
+    return chi, composite_from_arrays(counts, weighted, chi, weights)
+
+
+def rolling_scores(df: pd.DataFrame, windows, decay: float = 0.98, step: int = 1, chunk: int = DEFAULT_CHUNK,
+                   weights=DEFAULT_WEIGHTS):
+    """
+    Yield long-format frames (one per chunk of evaluation dates) with the
+    frequency, weighted score, chi-square, composite score and delta vs the
+    expanding global window for all 325 pairs, both colors and every window,
+    as of each evaluation date.
+
+    Windows follow temporal.get_window_df (draws with date >= t - days). Counts
+    and decayed sums come from prefix sums taken only at the chunk's
+    evaluation ends and window starts, so the 2-D arrays are bounded by the
+    chunk size times the number of windows, never draws x pairs or
+    dates x pairs x windows. Decayed sums are taken relative to the chunk's
+    last day and rescaled per date; chunks are also capped in day span so
+    that rescaling cannot overflow.
+    """
+    windows = sorted(windows)
+    weights = single_weights(weights)
+    if isinstance(df, pd.DataFrame):  # a DrawStore is already sorted
+        df = df.sort_values("date", kind="stable")
+    days = draw_days(df)
+    if len(days) == 0:
+        return
+    ids = np.stack(draw_pair_ids(df))
+    if (ids < 0).any():
+        raise ValueError("Draw data contains a ball outside 1..26 or a repeated ball")
+
+    ends = eval_points(days, step)
+    max_span = max(1, int(250 * math.log(10) / -math.log(decay))) if 0 < decay < 1 else None
+    longest = windows[-1]
+
+    base_counts = np.zeros((2, N_PAIRS), dtype=np.int64)  # draws before `base_at`
+    base_weighted = np.zeros((2, N_PAIRS))                 # ... decayed to `base_day`
+    base_at, base_day = 0, int(days[0])
+
+    pos = 0
+    while pos < len(ends):
+        stop = min(pos + chunk, len(ends))
+        if max_span is not None:
+            span_end = np.searchsorted(days[ends[pos:stop] - 1], days[ends[pos] - 1] + max_span, side="right")
+            stop = pos + max(1, int(span_end))
+        e = ends[pos:stop]
+        t = days[e - 1]
+        lo = int(np.searchsorted(days, t[0] - longest, side="left"))
+        ref = int(t[-1])
+
+        # Carry the global base forward to the start of this slice
+        if lo > base_at:
+            seg = slice(base_at, lo)
+            w = np.power(decay, (ref - days[seg]).astype(np.float64))
+            base_weighted *= decay ** (ref - base_day)
+            for c in range(2):
+                base_counts[c] += np.bincount(ids[c, seg], minlength=N_PAIRS)
+                base_weighted[c] += np.bincount(ids[c, seg], weights=w, minlength=N_PAIRS)
+        else:
+            base_weighted *= decay ** (ref - base_day)
+        base_at, base_day = max(base_at, lo), ref
+
+        hi = int(e[-1])
+        u = np.power(decay, (ref - days[lo:hi]).astype(np.float64))
+        rescale = np.power(decay, (t - ref).astype(np.float64))[:, None]
+        e_loc = e - lo
+        s_locs = {w: np.searchsorted(days, t - w, side="left") - lo for w in windows}
+
+        # Prefix sums are only read at the evaluation ends and window starts
+        points = np.unique(np.concatenate([e_loc, *s_locs.values()]))
+        segment = np.searchsorted(points, np.arange(hi - lo), side="right")
+        e_at = np.searchsorted(points, e_loc)
+
+        frames = []
+        for c, color in enumerate(COLORS):
+            C = _prefix_at(segment, ids[c, lo:hi], None, len(points))
+            W = _prefix_at(segment, ids[c, lo:hi], u, len(points))
+
+            g_counts = base_counts[c] + C[e_at]
+            g_weighted = rescale * (base_weighted[c] + W[e_at])
+            g_chi, g_score = _score(g_counts, g_weighted, e.astype(np.float64), weights)
+            frames.append(_frame(t, color, "global", g_counts, g_weighted, g_chi, g_score, g_score))
+
+            for w in windows:
+                s_loc = s_locs[w]
+                s_at = np.searchsorted(points, s_loc)
+                counts = C[e_at] - C[s_at]
+                weighted = rescale * (W[e_at] - W[s_at])
+                weighted[counts == 0] = 0.0
+                chi, score = _score(counts, weighted, (e_loc - s_loc).astype(np.float64), weights)
+                frames.append(_frame(t, color, f"{w}d", counts, weighted, chi, score, g_score))
+
+        yield pd.concat(frames, ignore_index=True)
+        pos = stop
+
+
+def _frame(t, color, window, counts, weighted, chi, score, global_score):
+    k = len(t)
+    return pd.DataFrame({
+        "date": np.repeat(t.astype("datetime64[D]"), N_PAIRS),
+        "color": color,
+        "window": window,
+        "a": np.tile(PAIR_A, k),
+        "b": np.tile(PAIR_B, k),
+        "frequency": counts.ravel(),
+        "weighted_score": weighted.ravel(),
+        "chi_square": chi.ravel(),
+        "composite_score": score.ravel(),
+        "delta": (score - global_score).ravel(),
+    })
+
+
+def write_rolling(df: pd.DataFrame, out_path: str, windows, decay: float = 0.98, step: int = 1,
+                  chunk: int = DEFAULT_CHUNK, weights=DEFAULT_WEIGHTS) -> int:
+    """Stream rolling_scores to a CSV chunk by chunk; returns the number of rows written."""
+    if os.path.exists(out_path):
+        os.remove(out_path)
+    rows = 0
+    for frame in rolling_scores(df, windows, decay=decay, step=step, chunk=chunk, weights=weights):
+        frame.to_csv(out_path, mode="a", header=rows == 0, index=False)
+        rows += len(frame)
+    return rows
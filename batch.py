@@ -0,0 +1,210 @@
+import contextlib
+import glob
+import hashlib
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from draw_cache import DrawCache
+from main import build_parser, check_config, run_pipeline, ConfigError
+
+STAMP_SUFFIX = "_batch.json"  # <out>_batch.json: what a finished job read and wrote
+LOG_SUFFIX = "_batch.log"     # <out>_batch.log: the job's console output
+
+
+class BatchJob:
+    """One manifest entry: its name, the equivalent command line, and the checked config."""
+    __slots__ = ("name", "argv", "config")
+
+    def __init__(self, name, argv, config):
+        self.name = name
+        self.argv = argv
+        self.config = config
+
+
+def manifest_argv(entry: dict) -> list:
+    """
+    Manifest settings as pipeline arguments: keys are option names (`eps_grid`
+    or `eps-grid`), true flags are passed bare, false/null ones left out and
+    lists joined with commas, so {ml: true, decay: [0.98, 0.99]} becomes
+    ["--ml", "--decay", "0.98,0.99"].
+    """
+    argv = []
+    for key, value in entry.items():
+        if value is None or value is False:
+            continue
+        flag = "--" + str(key).replace("_", "-")
+        if value is True:
+            argv.append(flag)
+        elif isinstance(value, (list, tuple)):
+            argv += [flag, ",".join(str(v) for v in value)]
+        else:
+            argv += [flag, str(value)]
+    return argv
+
+
+def load_manifest(path: str) -> list:
+    """
+    Read a YAML manifest into BatchJobs. Each entry under `jobs:` is merged
+    over `defaults:` and checked like a command line; any bad job fails the
+    whole manifest before anything runs.
+    """
+    import yaml  # only needed for batch runs
+
+    with open(path, "r", encoding="utf-8") as f:
+        data = yaml.safe_load(f) or {}
+    defaults = data.get("defaults") or {}
+    entries = data.get("jobs") or []
+    if not entries:
+        raise ConfigError(f"{path}: no jobs")
+
+    ap = build_parser(exit_on_error=False)
+    jobs, outs = [], {}
+    for i, entry in enumerate(entries, 1):
+        entry = {**defaults, **(entry or {})}
+        name = str(entry.pop("name", None) or entry.get("out") or f"job{i}")
+        argv = manifest_argv(entry)
+        try:
+            config = check_config(ap.parse_args(argv))
+        except ConfigError as e:
+            raise ConfigError(f"{path}: job {name!r}: {e}") from None
+        if config.out in outs:
+            raise ConfigError(f"{path}: jobs {outs[config.out]!r} and {name!r} both write to --out {config.out}")
+        outs[config.out] = name
+        # Jobs may share a parsed-page cache while running side by side; run_batch prunes it once at the end
+        config.prune_cache = False
+        jobs.append(BatchJob(name, argv, config))
+    return jobs
+
+
+def input_files(config) -> list:
+    """Files a job reads: its pages, archive, ledger and rules."""
+    paths = []
+    if config.html_glob:
+        paths += sorted(glob.glob(os.path.expandvars(os.path.expanduser(config.html_glob))))
+    for path in (config.html_file, config.archive, config.from_ledger, config.rules):
+        if path:
+            paths.append(path)
+    return paths
+
+
+def fingerprint(job: BatchJob) -> str:
+    """Hash of the job's arguments and the path, size and mtime of every input."""
+    h = hashlib.sha1(json.dumps(job.argv).encode())
+    for path in input_files(job.config):
+        try:
+            st = os.stat(path)
+            h.update(f"{path}\0{st.st_size}\0{st.st_mtime_ns}\n".encode())
+        except OSError:
+            h.update(f"{path}\0missing\n".encode())
+    return h.hexdigest()
+
+
+def is_current(job: BatchJob, digest: str) -> bool:
+    """True when the last run of this job saw the same inputs and all its outputs still exist."""
+    try:
+        with open(job.config.out + STAMP_SUFFIX, "r", encoding="utf-8") as f:
+            stamp = json.load(f)
+    except (OSError, ValueError):
+        return False
+    outputs = stamp.get("outputs") or {}
+    return stamp.get("fingerprint") == digest and bool(outputs) and all(os.path.exists(p) for p in outputs.values())
+
+
+def _write_stamp(job: BatchJob, digest: str, outputs: dict, seconds: float):
+    path = job.config.out + STAMP_SUFFIX
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump({"name": job.name, "argv": job.argv, "fingerprint": digest,
+                   "seconds": round(seconds, 3), "outputs": outputs}, f, indent=1)
+    os.replace(tmp, path)
+
+
+def _preload(modules):
+    # Pay for heavy imports once per process instead of once per job
+    for name in modules:
+        __import__(name)
+
+
+def _run_job(job: BatchJob):
+    """Run one job with its console output in <out>_batch.log; returns (outputs, error, seconds)."""
+    start = time.perf_counter()
+    try:
+        with open(job.config.out + LOG_SUFFIX, "w", encoding="utf-8") as log, contextlib.redirect_stdout(log):
+            outputs = run_pipeline(job.config)
+    except (Exception, SystemExit) as e:
+        return None, f"{type(e).__name__}: {e}", time.perf_counter() - start
+    return outputs, None, time.perf_counter() - start
+
+
+def run_batch(jobs: list, workers: int = 1, force: bool = False) -> dict:
+    """
+    Run the jobs that are not current (all of them with force=True), `workers`
+    at a time in one process pool, largest inputs first. Prints a line per job
+    as it finishes and returns {job name: "done" | "skipped" | "failed"}.
+    """
+    status, pending = {}, []
+    total = len(jobs)
+    for job in jobs:
+        digest = fingerprint(job)
+        if not force and is_current(job, digest):
+            status[job.name] = "skipped"
+            print(f"[{len(status)}/{total}] skipped {job.name} (outputs current)", flush=True)
+        else:
+            pending.append((job, digest))
+    if not pending:
+        return status
+
+    for job, _ in pending:
+        os.makedirs(os.path.dirname(job.config.out) or ".", exist_ok=True)
+    # Big jobs first so a large dataset does not start last and set the finish time
+    pending.sort(key=lambda p: -sum(os.path.getsize(f) for f in input_files(p[0].config) if os.path.isfile(f)))
+    # --rebuild-cache empties a shared cache dir; do it once here, not under running jobs
+    for cache_dir in sorted({j.config.cache_dir for j, _ in pending if j.config.rebuild_cache}):
+        DrawCache(cache_dir, rebuild=True)
+    for job, _ in pending:
+        job.config.rebuild_cache = False
+    modules = ["ml"] if any(j.config.ml for j, _ in pending) else []
+    modules += ["viz"] if any(j.config.plots for j, _ in pending) else []
+    _preload(modules)
+
+    def finish(job, digest, result):
+        outputs, error, seconds = result
+        if error is None:
+            if job.config.from_ledger:
+                digest = fingerprint(job)  # the run may have added pages to its ledger
+            _write_stamp(job, digest, outputs, seconds)
+            status[job.name] = "done"
+            print(f"[{len(status)}/{total}] done {job.name} ({seconds:.1f}s)", flush=True)
+        else:
+            status[job.name] = "failed"
+            print(f"[{len(status)}/{total}] failed {job.name} ({seconds:.1f}s): {error} "
+                  f"(see {job.config.out + LOG_SUFFIX})", flush=True)
+
+    if workers and workers > 1 and len(pending) > 1:
+        with ProcessPoolExecutor(max_workers=min(workers, len(pending)),
+                                 initializer=_preload, initargs=(modules,)) as ex:
+            futures = {ex.submit(_run_job, job): (job, digest) for job, digest in pending}
+            for fut in as_completed(futures):
+                try:
+                    result = fut.result()
+                except Exception as e:  # e.g. BrokenProcessPool when a worker dies
+                    result = None, f"{type(e).__name__}: {e}", 0.0
+                finish(*futures[fut], result)
+    else:
+        for job, digest in pending:
+            finish(job, digest, _run_job(job))
+    _prune_caches(job for job, _ in pending)
+    return status
+
+
+def _prune_caches(jobs):
+    # Now that no job is writing to them, drop entries for deleted pages and orphaned files
+    for cache_dir in sorted({j.config.cache_dir for j in jobs
+                             if (j.config.html_glob or j.config.html_file) and not j.config.no_cache
+                             and not j.config.from_ledger}):
+        if os.path.isdir(cache_dir):
+            cache = DrawCache(cache_dir)
+            cache.prune()
+            cache.save()
@@ -0,0 +1 @@
+"""Benchmark harness for the pipeline stages: ``python -m bench --help``."""
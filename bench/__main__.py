@@ -0,0 +1,247 @@
+import argparse
+import contextlib
+import gc
+import io
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from bench.synth import synthetic_draws, synthetic_pages, write_pages
+from data_parser import parse_from_html
+from draw_store import DrawStore
+from metrics import pair_frequencies, weighted_scores, all_pairs_support
+from temporal import build_temporal_features, compute_windows, compute_decay_sweep, get_window_df, FEATURE_COLUMNS
+from stats import window_stats, window_stats_batch
+from rules import load_rules, evaluate_rules_df
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+STAGES = [
+    "parse_from_html", "pair_frequencies", "weighted_scores", "compute_windows", "decay_sweep",
+    "build_temporal_features", "window_stats", "window_stats_batch", "evaluate_rules", "run_dbscan", "main",
+]
+
+# Decay values for the decay_sweep stage (compare with compute_windows x 8)
+SWEEP_DECAYS = [0.9, 0.95, 0.96, 0.97, 0.98, 0.99, 0.995, 0.999]
+
+# `import main` must stay under this many seconds (about 0.8 s measured, most
+# of it pandas) and must not pull in these modules; they load only when their
+# stage (--ml, --plots, bs4 parsing, rules loading) runs. tests/test_startup.py
+# checks the same limits.
+STARTUP_BUDGET = 1.0
+HEAVY_MODULES = ("ml", "viz", "sklearn", "scipy", "matplotlib", "bs4", "lxml", "yaml")
+
+
+def _measure(fn, repeat: int):
+    """Best wall time over `repeat` runs, then one extra run under tracemalloc for peak memory."""
+    best = float("inf")
+    for _ in range(repeat):
+        gc.collect()
+        t0 = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - t0)
+    gc.collect()
+    tracemalloc.start()
+    try:
+        fn()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return best, peak / 2 ** 20
+
+
+def _stage_fns(stage: str, df: pd.DataFrame, args, workdir: str):
+    """Return (callable, draws actually used) for one stage at one size."""
+    decay = args.decay
+    if stage == "parse_from_html":
+        sub = df.iloc[-min(len(df), args.html_max):]
+        pages = synthetic_pages(sub, args.cards_per_page)
+        return (lambda: [parse_from_html(p, parser=args.parser) for p in pages]), len(sub)
+
+    if stage == "pair_frequencies":
+        return (lambda: pair_frequencies(df)), len(df)
+    if stage == "weighted_scores":
+        return (lambda: weighted_scores(df, decay=decay)), len(df)
+    if stage == "compute_windows":
+        return (lambda: compute_windows(df, decay)), len(df)
+    if stage == "decay_sweep":
+        decays = SWEEP_DECAYS
+        return (lambda: compute_decay_sweep(df, decays)), len(df)
+    if stage == "build_temporal_features":
+        return (lambda: [build_temporal_features(df, c, decay) for c in ("red", "white")]), len(df)
+
+    if stage == "window_stats":
+        support = all_pairs_support()
+        freqs = []
+        for days in [None, 365, 90, 30]:
+            freqs.extend(pair_frequencies(get_window_df(df, days)))
+        return (lambda: [window_stats(f, support) for f in freqs]), len(df)
+    if stage == "window_stats_batch":
+        # Counts for every 30-day window ending at each draw, as one matrix.
+        # Each window is counted from a DrawStore view of its own draws only,
+        # so the setup does not rescan the whole history per window.
+        store = DrawStore.from_frame(df)
+        windows = np.stack([compute_windows(store[:i].window(30), decay, [30]).counts[30][0]
+                            for i in range(max(1, len(df) - 1000), len(df) + 1)])
+        return (lambda: window_stats_batch(windows)), len(windows)
+
+    from main import enrich_with_facts
+    windows = compute_windows(df, decay)
+    merged = enrich_with_facts(df, "red", decay, windows=windows)
+
+    if stage == "evaluate_rules":
+        rules = load_rules(os.path.join(REPO_DIR, "rules.yaml"), columns=FEATURE_COLUMNS)
+        return (lambda: evaluate_rules_df(merged, rules, "red")), len(df)
+    if stage == "run_dbscan":
+        from ml import run_dbscan
+        return (lambda: run_dbscan(merged, eps=0.8, min_samples=8)), len(df)
+
+    if stage == "main":
+        import main as cli
+        sub = df.iloc[-min(len(df), args.html_max):]
+        pattern = write_pages(sub, os.path.join(workdir, f"pages_{len(sub)}"), args.cards_per_page)
+        argv = ["main.py", "--html-glob", pattern, "--out", os.path.join(workdir, "run"),
+                "--rules", os.path.join(REPO_DIR, "rules.yaml"), "--no-cache", "--ml",
+                "--parser", args.parser]
+
+        def run_main():
+            saved = sys.argv
+            sys.argv = argv
+            try:
+                with contextlib.redirect_stdout(io.StringIO()):
+                    cli.main()
+            finally:
+                sys.argv = saved
+        return run_main, len(sub)
+
+    raise ValueError(f"Unknown stage: {stage}")
+
+
+def startup_check(repeat: int, budget: float) -> dict:
+    """Time `import main` in a fresh interpreter and list the heavy modules it loaded."""
+    probe = f"import sys, main; print(','.join(m for m in {HEAVY_MODULES!r} if m in sys.modules))"
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        out = subprocess.run([sys.executable, "-c", probe], cwd=REPO_DIR,
+                             capture_output=True, text=True, check=True)
+        best = min(best, time.perf_counter() - t0)
+    heavy = [m for m in out.stdout.strip().split(",") if m]
+    ok = best <= budget and not heavy
+    print(f"  {'startup':<24} {best * 1000:10.2f} ms (budget {budget * 1000:.0f} ms)"
+          f"{'  heavy imports: ' + ', '.join(heavy) if heavy else ''}{'' if ok else '  OVER BUDGET'}")
+    return {"seconds": best, "budget": budget, "heavy_modules": heavy, "ok": ok}
+
+
+def run(args) -> dict:
+    results = []
+    with tempfile.TemporaryDirectory(prefix="bench_2by2_") as workdir:
+        for size in args.sizes:
+            df = synthetic_draws(size, seed=args.seed)
+            for stage in args.stages:
+                fn, used = _stage_fns(stage, df, args, workdir)
+                seconds, peak_mb = _measure(fn, args.repeat)
+                row = {"stage": stage, "size": size, "draws": used, "seconds": seconds,
+                       "peak_mb": peak_mb, "draws_per_sec": used / seconds if seconds > 0 else None}
+                results.append(row)
+                print(f"  {stage:<24} size={size:<9} draws={used:<9} {seconds * 1000:10.2f} ms "
+                      f"{peak_mb:9.1f} MB peak")
+    return {
+        "meta": {
+            "timestamp": datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "numpy": np.__version__,
+            "pandas": pd.__version__,
+            "seed": args.seed,
+            "repeat": args.repeat,
+            "parser": args.parser,
+        },
+        "results": results,
+    }
+
+
+def compare(report: dict, baseline: dict, threshold: float):
+    """Rows whose time grew by more than `threshold`x against the baseline."""
+    base = {(r["stage"], r["size"]): r for r in baseline.get("results", [])}
+    regressions = []
+    for r in report["results"]:
+        b = base.get((r["stage"], r["size"]))
+        if not b or not b["seconds"]:
+            continue
+        ratio = r["seconds"] / b["seconds"]
+        flag = ratio > threshold
+        print(f"  {'REGRESSION' if flag else 'ok':<10} {r['stage']:<24} size={r['size']:<9} "
+              f"{b['seconds'] * 1000:10.2f} -> {r['seconds'] * 1000:10.2f} ms ({ratio:.2f}x)")
+        if flag:
+            regressions.append({**r, "baseline_seconds": b["seconds"], "ratio": ratio})
+    return regressions
+
+
+def _int_list(text):
+    return [int(float(x)) for x in text.split(",") if x.strip()]
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(prog="python -m bench", description="Benchmark the 2by2 pipeline stages")
+    ap.add_argument("--sizes", type=_int_list, default=[1000, 10000, 100000],
+                    help="Comma-separated synthetic history sizes in draws (e.g. 1000,1e6,1e7)")
+    ap.add_argument("--stages", default=",".join(STAGES),
+                    help=f"Comma-separated subset of: {', '.join(STAGES)}")
+    ap.add_argument("--repeat", type=int, default=3, help="Timed runs per stage (best is kept)")
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--decay", type=float, default=0.98)
+    ap.add_argument("--parser", default="bs4", help="Parser backend for the HTML stages")
+    ap.add_argument("--html-max", type=int, default=20000,
+                    help="Cap on draws rendered to HTML for parse_from_html and main")
+    ap.add_argument("--cards-per-page", type=int, default=100)
+    ap.add_argument("--out", default="bench_results.json", help="Where to write the JSON report")
+    ap.add_argument("--compare", help="Baseline JSON report to compare against")
+    ap.add_argument("--threshold", type=float, default=1.25,
+                    help="Flag a regression when time exceeds baseline by this factor")
+    ap.add_argument("--startup-budget", type=float, default=STARTUP_BUDGET,
+                    help="Fail when `import main` takes longer than this many seconds (0 = skip the check)")
+    args = ap.parse_args(argv)
+
+    args.stages = [s.strip() for s in args.stages.split(",") if s.strip()]
+    unknown = [s for s in args.stages if s not in STAGES]
+    if unknown:
+        ap.error(f"unknown stages: {unknown}")
+
+    print(f"[+] Benchmarking {len(args.stages)} stages at sizes {args.sizes}")
+    startup = startup_check(args.repeat, args.startup_budget) if args.startup_budget > 0 else None
+    report = run(args)
+    report["startup"] = startup
+    with open(args.out, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"[+] Report: {args.out}")
+
+    status = 0
+    if startup is not None and not startup["ok"]:
+        print("[!] Startup over budget or importing heavy modules eagerly")
+        status = 1
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        regressions = compare(report, baseline, args.threshold)
+        report["regressions"] = regressions
+        with open(args.out, "w") as f:
+            json.dump(report, f, indent=2)
+        if regressions:
+            print(f"[!] {len(regressions)} regressions over {args.threshold}x baseline")
+            return 1
+        print("[+] No regressions")
+    return status
+
+
+if __name__ == "__main__":
+    sys.exit(main())
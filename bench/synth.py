@@ -0,0 +1,89 @@
+import os
+from typing import List
+
+import numpy as np
+import pandas as pd
+
+from metrics import PAIR_A, PAIR_B, N_PAIRS
+
+# Enough calendar for big histories without leaving datetime64's range:
+# past this many days, draws are packed several to a day.
+MAX_DAYS = 20 * 365
+
+
+def synthetic_draws(n: int, seed: int = 0, start: str = "2005-01-01") -> pd.DataFrame:
+    """Uniform random 2by2 history of n draws, sorted by date, same columns as the parser output."""
+    rng = np.random.default_rng(seed)
+    per_day = max(1, -(-n // MAX_DAYS))
+    day0 = np.datetime64(start, "D")
+    dates = day0 + (np.arange(n) // per_day).astype("timedelta64[D]")
+
+    red = rng.integers(0, N_PAIRS, n)
+    white = rng.integers(0, N_PAIRS, n)
+    # Balls come in random order on the page, as they do in the real draws
+    swap_r = rng.random(n) < 0.5
+    swap_w = rng.random(n) < 0.5
+    ra, rb = PAIR_A[red].astype(np.int64), PAIR_B[red].astype(np.int64)
+    wa, wb = PAIR_A[white].astype(np.int64), PAIR_B[white].astype(np.int64)
+    return pd.DataFrame({
+        "date": pd.to_datetime(dates).as_unit("us"),
+        "r1": np.where(swap_r, rb, ra), "r2": np.where(swap_r, ra, rb),
+        "w1": np.where(swap_w, wb, wa), "w2": np.where(swap_w, wa, wb),
+    })
+
+
+def _card(date, r1, r2, w1, w2) -> str:
+    return (
+        f'<a class="card" href="/draw-result?gc=2by2&amp;date={date:%Y-%m-%d}">'
+        f'<div class="card-body"><h5 class="card-title">{date:%a, %b %d, %Y}</h5>'
+        '<div class="game-ball-group">'
+        f'<div class="form-control col red-balls item-2by2">{r1}</div>'
+        f'<div class="form-control col red-balls item-2by2">{r2}</div>'
+        f'<div class="form-control col white-balls item-2by2">{w1}</div>'
+        f'<div class="form-control col white-balls item-2by2">{w2}</div>'
+        '</div></div></a>\n'
+    )
+
+
+def synthetic_pages(df: pd.DataFrame, cards_per_page: int = 100) -> List[str]:
+    """Render draws as /previous-results style pages, newest first like the site."""
+    pages = []
+    rows = list(df.sort_values("date", ascending=False).itertuples(index=False))
+    for i in range(0, len(rows), cards_per_page):
+        cards = "".join(_card(r.date, r.r1, r.r2, r.w1, r.w2) for r in rows[i:i + cards_per_page])
+        pages.append(
+            "<!DOCTYPE html><html><head><title>Previous Results | Powerball</title></head>"
+            f'<body><div class="container"><div class="row">\n{cards}</div></div></body></html>'
+        )
+    return pages
+
+
+def write_pages(df: pd.DataFrame, out_dir: str, cards_per_page: int = 100) -> str:
+    """Write pages as 2by2_pg_NNNN.html; returns the glob that matches them."""
+    os.makedirs(out_dir, exist_ok=True)
+    for i, html in enumerate(synthetic_pages(df, cards_per_page)):
+        with open(os.path.join(out_dir, f"2by2_pg_{i:04d}.html"), "w", encoding="utf-8") as f:
+            f.write(html)
+    return os.path.join(out_dir, "2by2_pg_*.html")
+
+
+def write_synthetic_archive(path: str, n: int, seed: int = 0, start: str = "2005-01-01",
+                            chunk: int = 1 << 22) -> int:
+    """
+    Stream a uniform history of n draws (same layout over days as
+    synthetic_draws) into a draw archive without holding it in memory.
+    """
+    from draw_archive import ArchiveWriter
+
+    rng = np.random.default_rng(seed)
+    per_day = max(1, -(-n // MAX_DAYS))
+    day0 = int(np.datetime64(start, "D").astype(np.int64))
+    with ArchiveWriter(path) as w:
+        for lo in range(0, n, chunk):
+            m = min(chunk, n - lo)
+            days = day0 + (np.arange(lo, lo + m) // per_day)
+            red = rng.integers(0, N_PAIRS, m)
+            white = rng.integers(0, N_PAIRS, m)
+            balls = np.stack([PAIR_A[red], PAIR_B[red], PAIR_A[white], PAIR_B[white]], axis=1)
+            w.append(days, balls)
+    return n
@@ -0,0 +1,156 @@
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from metrics import N_PAIRS, decay_weights
+from scoring import DEFAULT_WEIGHTS, composite_from_arrays, chi_square_from_counts, single_weights
+from temporal import WINDOWS, COLORS
+
+DEFAULT_LEVEL = 0.95
+INDEX_BUDGET = 4_000_000  # resampled draw indices per task; bounds a task's memory
+
+# Global-window columns of the pair feature table that get an interval, plus
+# each window's composite score
+GLOBAL_COLUMNS = ("frequency", "weighted_score", "chi_square", "composite_score")
+WINDOW_COLUMNS = tuple(f"score_{days}d" for days in WINDOWS)
+CI_COLUMNS = tuple(f"{col}_ci_{side}" for col in GLOBAL_COLUMNS + WINDOW_COLUMNS for side in ("low", "high"))
+
+
+def resample_indices(rng, n: int, size: int, block: int = 1):
+    """
+    (size, n) draw indices: n draws with replacement, or with block > 1 a
+    circular block bootstrap that takes runs of `block` consecutive draws
+    from random starts (wrapping past the latest draw), so short-range
+    dependence between neighboring draws survives the resampling.
+    """
+    if block <= 1:
+        return rng.integers(0, n, size=(size, n))
+    n_blocks = -(-n // block)
+    starts = rng.integers(0, n, size=(size, n_blocks, 1))
+    return ((starts + np.arange(block)) % n).reshape(size, n_blocks * block)[:, :n]
+
+
+def _replicate_chunk(segments, replicates: int, block: int, weights, seed_seq):
+    """
+    Bootstrap `replicates` histories of each window in one go. segments: per
+    window (global first) the (n, 2) pair ids and decay weights of its draws.
+    Every replicate's pairs are offset into their own 325-wide slice of one
+    bincount, giving (replicates, 2, 325) counts and decayed sums at once.
+    """
+    rng = np.random.default_rng(seed_seq)
+    offsets = (np.arange(replicates, dtype=np.int64) * N_PAIRS)[:, None]
+    size = replicates * N_PAIRS
+    scores = np.zeros((replicates, len(segments), 2, N_PAIRS), dtype=np.float32)
+    global_counts = global_weighted = None
+    for k, (ids, w) in enumerate(segments):
+        n = len(w)
+        counts = np.zeros((replicates, 2, N_PAIRS), dtype=np.int64)
+        weighted = np.zeros((replicates, 2, N_PAIRS))
+        if n:
+            idx = resample_indices(rng, n, replicates, block)
+            rw = w[idx].ravel()
+            for c in range(2):
+                keys = (ids[:, c][idx] + offsets).ravel()
+                counts[:, c] = np.bincount(keys, minlength=size).reshape(replicates, N_PAIRS)
+                weighted[:, c] = np.bincount(keys, weights=rw, minlength=size).reshape(replicates, N_PAIRS)
+            scores[:, k] = composite_from_arrays(counts, weighted, chi_square_from_counts(counts, n), weights)
+        if k == 0:
+            global_counts, global_weighted = counts.astype(np.int32), weighted.astype(np.float32)
+    return global_counts, global_weighted, scores
+
+
+def _fill_samples(samples: dict, parts, n: int, window_columns):
+    # Copy each task's replicates into their rows as the task finishes
+    lo = 0
+    for counts, weighted, scores in parts:
+        hi = lo + len(counts)
+        samples["frequency"][lo:hi] = counts
+        samples["weighted_score"][lo:hi] = weighted
+        samples["chi_square"][lo:hi] = chi_square_from_counts(counts, n)
+        samples["composite_score"][lo:hi] = scores[:, 0]
+        for k, col in enumerate(window_columns, start=1):
+            samples[col][lo:hi] = scores[:, k]
+        lo = hi
+
+
+class BootstrapCI:
+    """
+    Percentile intervals from `replicates` bootstrap resamples of the draws:
+    `low` and `high` map a pair feature column to a (2, 325) array (rows in
+    COLORS order, columns by pair id).
+    """
+    __slots__ = ("replicates", "block", "level", "low", "high")
+
+    def __init__(self, replicates, block, level, low, high):
+        self.replicates = int(replicates)
+        self.block = int(block)
+        self.level = float(level)
+        self.low = low
+        self.high = high
+
+    def frame(self, color: str) -> pd.DataFrame:
+        """<column>_ci_low / <column>_ci_high for every pair, indexed by pair id."""
+        c = COLORS.index(color)
+        cols = {}
+        for col in self.low:
+            cols[f"{col}_ci_low"] = self.low[col][c]
+            cols[f"{col}_ci_high"] = self.high[col][c]
+        return pd.DataFrame(cols)
+
+
+def bootstrap_ci(draws, decay: float, replicates: int, block: int = 1, level: float = DEFAULT_LEVEL,
+                 weights=DEFAULT_WEIGHTS, seed: int = 0, workers: int = 1, windows=None) -> BootstrapCI:
+    """
+    Resample the draws of the global history and of each window (with
+    replacement, or in blocks of `block` consecutive draws) and rescore all
+    325 pairs per replicate, as pair_features scores the real draws. Draws
+    keep the decay weight of their real date. Replicates are split into
+    tasks of at most INDEX_BUDGET resampled indices, seeded from
+    SeedSequence(seed).spawn, so the result does not depend on `workers`.
+
+    Each task's results are copied into preallocated float32 sample arrays
+    as it arrives, so memory is one task's working set plus
+    4 bytes x replicates x 650 x (4 + len(windows)) for the samples, about
+    18 KB per replicate with the default windows; the quantiles then sort
+    one column at a time.
+    """
+    if not 0 < level < 1:
+        raise ValueError(f"confidence level must be between 0 and 1, got {level}")
+    weights = single_weights(weights)
+    windows = list(WINDOWS if windows is None else windows)
+    max_day = draws.max_day
+    segments = []
+    for days in [None] + windows:
+        part = draws.window(days)
+        segments.append((np.asarray(part.pair_ids, dtype=np.int64),
+                         decay_weights(part.days, decay, max_day)))
+
+    n = len(segments[0][1])
+    chunk = max(1, INDEX_BUDGET // max(n, 1))
+    sizes = [min(chunk, replicates - lo) for lo in range(0, replicates, chunk)]
+    seeds = np.random.SeedSequence(seed).spawn(len(sizes))
+    n_tasks = len(sizes)
+    args = ([segments] * n_tasks, sizes, [max(int(block), 1)] * n_tasks, [weights] * n_tasks, seeds)
+    window_columns = [f"score_{days}d" for days in windows]
+    samples = {col: np.empty((replicates, 2, N_PAIRS), dtype=np.float32)
+               for col in list(GLOBAL_COLUMNS) + window_columns}
+    if workers and workers > 1 and n_tasks > 1:
+        with ProcessPoolExecutor(max_workers=min(workers, n_tasks)) as ex:
+            _fill_samples(samples, ex.map(_replicate_chunk, *args), n, window_columns)
+    else:
+        _fill_samples(samples, map(_replicate_chunk, *args), n, window_columns)
+
+    tail = (1 - level) / 2
+    low, high = {}, {}
+    for col, values in samples.items():
+        low[col], high[col] = np.quantile(values, [tail, 1 - tail], axis=0)
+    return BootstrapCI(replicates, block, level, low, high)
+
+
+def add_ci_columns(features: pd.DataFrame, ci: BootstrapCI, color: str) -> pd.DataFrame:
+    """Append the interval columns to a pair feature table, matched on its `pair` column."""
+    ids = features["pair"].cat.codes.to_numpy()
+    extra = ci.frame(color).iloc[ids].reset_index(drop=True)
+    extra.index = features.index
+    return pd.concat([features, extra], axis=1)
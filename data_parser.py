@@ -1,11 +1,17 @@
 import glob
 import os
 import re
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime
+from functools import lru_cache, partial
+from html import unescape
 from typing import List, Optional
 
+import numpy as np
 import pandas as pd
-from bs4 import BeautifulSoup
+
+BALL_COLS = ["r1", "r2", "w1", "w2"]
 
 
 def load_html_file(path: str) -> str:
@@ -16,39 +22,87 @@ def load_html_file(path: str) -> str:
         return f.read()
 
 
+_DATE_FORMATS = ("%a, %b %d, %Y", "%a, %B %d, %Y")
+_WS_RE = re.compile(r"\s+")
+
+
+@lru_cache(maxsize=8192)
 def _parse_date(text: str) -> Optional[datetime]:
     """
     Examples seen on powerball pages:
       "Fri, Mar 28, 2025"
       "Mon, Dec 1, 2020" (sometimes no leading zero)
+
+    Cached: overlapping pages repeat the same date strings many times.
     """
     text = (text or "").strip()
-    for fmt in ("%a, %b %d, %Y", "%a, %B %d, %Y"):
+    for fmt in _DATE_FORMATS:
         try:
             return datetime.strptime(text, fmt)
         except ValueError:
             pass
 
     # Fallback: try to normalize multiple spaces / remove commas weirdness
-    text2 = re.sub(r"\s+", " ", text).strip()
+    text2 = _WS_RE.sub(" ", text).strip()
     try:
         return datetime.strptime(text2, "%a, %b %d, %Y")
     except ValueError:
         return None
 
 
-def parse_from_html(html: str) -> pd.DataFrame:
+_EPOCH_ORDINAL = datetime(1970, 1, 1).toordinal()
+
+
+def _card_day(date_text: Optional[str]) -> Optional[int]:
+    # Day ordinal (days since epoch) of a card title, as draws_to_arrays stores it
+    draw_date = _parse_date(date_text) if date_text is not None else None
+    return None if draw_date is None else draw_date.toordinal() - _EPOCH_ORDINAL
+
+
+def _card_draw(date_text: Optional[str], red: List[str], white: List[str]) -> Optional[dict]:
+    # Validation shared by both parser backends
+    if date_text is None:
+        return None
+
+    draw_date = _parse_date(date_text)
+    if not draw_date:
+        return None
+
+    if len(red) != 2 or len(white) != 2:
+        return None
+
+    try:
+        r1, r2 = map(int, red)
+        w1, w2 = map(int, white)
+    except ValueError:
+        return None
+
+    return {"date": draw_date, "r1": r1, "r2": r2, "w1": w1, "w2": w2}
+
+
+def _draws_frame(draws: List[dict]) -> pd.DataFrame:
+    df = pd.DataFrame(draws)
+    if df.empty:
+        raise RuntimeError(
+            "No draws parsed from HTML. "
+            "Make sure you saved the full /previous-results page HTML and not a redirect/consent page."
+        )
+
+    # Deduplicate and sort
+    df = df.drop_duplicates(subset=["date", "r1", "r2", "w1", "w2"]).sort_values("date").reset_index(drop=True)
+    return df
+
+
+def _parse_bs4(html: str, skip_days=frozenset()) -> List[dict]:
+    from bs4 import BeautifulSoup  # loaded only when this backend actually parses a page
+
     soup = BeautifulSoup(html, "lxml")
     draws = []
 
     # Each draw is an <a class="card" href="...date=YYYY-MM-DD">
     for card in soup.select("a.card"):
         date_el = card.select_one("h5.card-title")
-        if not date_el:
-            continue
-
-        draw_date = _parse_date(date_el.get_text(strip=True))
-        if not draw_date:
+        if skip_days and date_el and _card_day(date_el.get_text(strip=True)) in skip_days:
             continue
 
         # Balls are rendered like:
@@ -57,47 +111,197 @@ def parse_from_html(html: str) -> pd.DataFrame:
         red = [b.get_text(strip=True) for b in card.select("div.form-control.red-balls.item-2by2")]
         white = [b.get_text(strip=True) for b in card.select("div.form-control.white-balls.item-2by2")]
 
-        if len(red) != 2 or len(white) != 2:
+        draw = _card_draw(date_el.get_text(strip=True) if date_el else None, red, white)
+        if draw:
+            draws.append(draw)
+    return draws
+
+
+# --- fast backend: a precompiled tag scanner over the raw markup, no tree ---
+
+_A_OPEN_RE = re.compile(r"<a\b[^>]*>", re.I)
+_A_CLOSE_RE = re.compile(r"</a\s*>", re.I)
+_H5_OPEN_RE = re.compile(r"<h5\b[^>]*>", re.I)
+_H5_CLOSE_RE = re.compile(r"</h5\s*>", re.I)
+_DIV_OPEN_RE = re.compile(r"<div\b[^>]*>", re.I)
+_DIV_CLOSE_RE = re.compile(r"</div\s*>", re.I)
+_CLASS_RE = re.compile(r"""\sclass\s*=\s*(?:"([^"]*)"|'([^']*)'|([^\s"'>]+))""", re.I)
+_TAG_RE = re.compile(r"<[^>]*>")
+
+_CARD = frozenset(["card"])
+_CARD_TITLE = frozenset(["card-title"])
+_RED_BALL = frozenset(["form-control", "red-balls", "item-2by2"])
+_WHITE_BALL = frozenset(["form-control", "white-balls", "item-2by2"])
+
+
+def _classes(tag: str) -> frozenset:
+    m = _CLASS_RE.search(tag)
+    if not m:
+        return frozenset()
+    return frozenset((m.group(1) or m.group(2) or m.group(3) or "").split())
+
+
+def _element_text(html: str, start: int, close_re) -> str:
+    # Mirrors get_text(strip=True): strip each text node and join them
+    m = close_re.search(html, start)
+    inner = html[start:m.start() if m else len(html)]
+    return "".join(unescape(t).strip() for t in _TAG_RE.split(inner))
+
+
+def _parse_fast(html: str, skip_days=frozenset()) -> List[dict]:
+    draws = []
+    for a in _A_OPEN_RE.finditer(html):
+        if not _CARD <= _classes(a.group(0)):
             continue
+        end = _A_CLOSE_RE.search(html, a.end())
+        card = html[a.end():end.start() if end else len(html)]
 
-        try:
-            r1, r2 = map(int, red)
-            w1, w2 = map(int, white)
-        except ValueError:
+        date_text = None
+        for h in _H5_OPEN_RE.finditer(card):
+            if _CARD_TITLE <= _classes(h.group(0)):
+                date_text = _element_text(card, h.end(), _H5_CLOSE_RE)
+                break
+        if skip_days and _card_day(date_text) in skip_days:
             continue
 
-        draws.append({"date": draw_date, "r1": r1, "r2": r2, "w1": w1, "w2": w2})
+        red, white = [], []
+        for d in _DIV_OPEN_RE.finditer(card):
+            cls = _classes(d.group(0))
+            if _RED_BALL <= cls:
+                red.append(_element_text(card, d.end(), _DIV_CLOSE_RE))
+            elif _WHITE_BALL <= cls:
+                white.append(_element_text(card, d.end(), _DIV_CLOSE_RE))
 
-    df = pd.DataFrame(draws)
-    if df.empty:
-        raise RuntimeError(
-            "No draws parsed from HTML. "
-            "Make sure you saved the full /previous-results page HTML and not a redirect/consent page."
-        )
+        draw = _card_draw(date_text, red, white)
+        if draw:
+            draws.append(draw)
+    return draws
 
-    # Deduplicate and sort
-    df = df.drop_duplicates(subset=["date", "r1", "r2", "w1", "w2"]).sort_values("date").reset_index(drop=True)
+
+# Backends take the page markup and an optional set of day ordinals whose
+# cards are skipped before their balls are extracted
+PARSERS = {"bs4": _parse_bs4, "fast": _parse_fast}
+DEFAULT_PARSER = "bs4"
+
+
+def page_days(html: str) -> Counter:
+    """
+    Cards per day ordinal on a page, read from the card titles' <h5> tags
+    alone (no card or ball extraction), to tell cheaply whether a page has
+    any draws not seen before.
+    """
+    days = Counter()
+    for h in _H5_OPEN_RE.finditer(html):
+        if _CARD_TITLE <= _classes(h.group(0)):
+            day = _card_day(_element_text(html, h.end(), _H5_CLOSE_RE))
+            if day is not None:
+                days[day] += 1
+    return days
+
+
+def parse_from_html(html: str, parser: str = DEFAULT_PARSER) -> pd.DataFrame:
+    """
+    parser: "bs4" (BeautifulSoup + lxml) or "fast" (tag scanner, no tree);
+    both apply the same card validation.
+    """
+    if parser not in PARSERS:
+        raise ValueError(f"Unknown parser backend: {parser} (expected one of {sorted(PARSERS)})")
+    return _draws_frame(PARSERS[parser](html))
+
+
+def draws_to_arrays(df: pd.DataFrame):
+    """Compact form of a draw frame: int32 day ordinals and an (n, 4) int8 ball array."""
+    days = pd.to_datetime(df["date"]).values.astype("datetime64[D]").astype(np.int32)
+    balls = df[BALL_COLS].to_numpy(dtype=np.int8)
+    return days, balls
+
+
+def arrays_to_draws(days, balls) -> pd.DataFrame:
+    df = pd.DataFrame(np.asarray(balls).astype(np.int64), columns=BALL_COLS)
+    df.insert(0, "date", pd.to_datetime(np.asarray(days).astype("datetime64[D]")).as_unit("us"))
     return df
 
 
-def parse_file(path: str) -> pd.DataFrame:
+def parse_file(path: str, parser: str = DEFAULT_PARSER) -> pd.DataFrame:
     html = load_html_file(path)
-    return parse_from_html(html)
+    return parse_from_html(html, parser=parser)
+
 
+def check_parser_conformance(paths: List[str]) -> List[str]:
+    """Parse each page with every backend; returns a description of each mismatch."""
+    problems = []
+    for p in paths:
+        results = {}
+        for name in PARSERS:
+            try:
+                results[name] = parse_file(p, parser=name)
+            except Exception as e:
+                results[name] = f"{type(e).__name__}: {e}"
+        ref = results[DEFAULT_PARSER]
+        for name, got in results.items():
+            if isinstance(ref, str) or isinstance(got, str):
+                if not (isinstance(ref, str) and isinstance(got, str)):
+                    problems.append(f"{p}: {DEFAULT_PARSER}={str(ref)[:80]!r} vs {name}={str(got)[:80]!r}")
+            elif not ref.equals(got):
+                problems.append(f"{p}: {name} parsed {len(got)} draws, {DEFAULT_PARSER} parsed {len(ref)} "
+                                "(or values differ)")
+    return problems
+
+
+def _parse_file_arrays(path: str, parser: str = DEFAULT_PARSER):
+    # Process-pool worker: ship compact arrays back instead of a pickled DataFrame
+    return draws_to_arrays(parse_file(path, parser=parser))
 
-def parse_glob(pattern: str) -> pd.DataFrame:
+
+def parse_glob(pattern: str, cache=None, workers: Optional[int] = None,
+               parser: str = DEFAULT_PARSER) -> pd.DataFrame:
+    """
+    cache: optional draw_cache.DrawCache; pages whose content is unchanged
+    since this parser last parsed them are read back from it instead of
+    re-parsed.
+    workers: parse pages in a process pool of this size (0 = one per CPU,
+    None/1 = in-process).
+    """
     pattern = os.path.expandvars(os.path.expanduser(pattern))
     paths = sorted(glob.glob(pattern))
     if not paths:
         raise FileNotFoundError(f"No files matched glob: {pattern}")
 
-    frames: List[pd.DataFrame] = []
-    for p in paths:
-        try:
-            frames.append(parse_file(p))
-        except Exception as e:
-            raise RuntimeError(f"Failed parsing {p}: {e}") from e
+    results: List = [None] * len(paths)
+    todo = []
+    for i, p in enumerate(paths):
+        cached = cache.lookup(p, parser) if cache is not None else None
+        if cached is not None:
+            results[i] = cached
+        else:
+            todo.append(i)
+
+    if workers == 0:
+        workers = os.cpu_count() or 1
+    if workers and workers > 1 and len(todo) > 1:
+        with ProcessPoolExecutor(max_workers=min(workers, len(todo))) as ex:
+            chunksize = max(1, len(todo) // (workers * 4))
+            it = ex.map(partial(_parse_file_arrays, parser=parser), [paths[i] for i in todo],
+                        chunksize=chunksize)
+            for i in todo:
+                try:
+                    results[i] = next(it)
+                except Exception as e:
+                    raise RuntimeError(f"Failed parsing {paths[i]}: {e}") from e
+    else:
+        for i in todo:
+            try:
+                results[i] = _parse_file_arrays(paths[i], parser=parser)
+            except Exception as e:
+                raise RuntimeError(f"Failed parsing {paths[i]}: {e}") from e
+
+    if cache is not None:
+        for i in todo:
+            cache.store(paths[i], *results[i], parser=parser)
+        cache.save()
 
-    df = pd.concat(frames, ignore_index=True)
+    days = np.concatenate([r[0] for r in results])
+    balls = np.concatenate([r[1] for r in results])
+    df = arrays_to_draws(days, balls)
     df = df.drop_duplicates(subset=["date", "r1", "r2", "w1", "w2"]).sort_values("date").reset_index(drop=True)
     return df
@@ -0,0 +1,284 @@
+import json
+import os
+import struct
+
+import numpy as np
+import pandas as pd
+
+from data_parser import arrays_to_draws
+from draw_store import DrawStore
+from metrics import N_PAIRS, encode_pairs, decay_weights
+
+# File layout:
+#   header   HEADER fields, zero-padded to HEADER_SIZE bytes
+#   layout   JSON list of [field, dtype, shape] describing one record
+#   records  `count` fixed-size records sorted by day, from `data_offset`
+#   index    int32 first day of every `block_size` records, from `index_offset`
+MAGIC = b"2BY2DRW\0"
+ARCHIVE_VERSION = 1
+HEADER = struct.Struct("<8sHHIQQiiQQI")
+HEADER_SIZE = 64
+RECORD_DTYPE = np.dtype([("day", "<i4"), ("balls", "i1", (4,)), ("pair_ids", "<i2", (2,))])
+DEFAULT_BLOCK = 1 << 16     # records per index entry
+DEFAULT_CHUNK = 1 << 20     # records counted at a time
+
+
+def _layout(dtype: np.dtype) -> bytes:
+    fields = []
+    for name in dtype.names:
+        sub = dtype.fields[name][0]
+        base, shape = (sub.base, list(sub.shape)) if sub.shape else (sub, [])
+        fields.append([name, base.str, shape])
+    return json.dumps(fields).encode()
+
+
+def _dtype_from_layout(raw: bytes) -> np.dtype:
+    return np.dtype([(name, t, tuple(shape)) for name, t, shape in json.loads(raw)])
+
+
+class ArchiveWriter:
+    """
+    Streams draws into an archive. Chunks must arrive in date order (each
+    chunk sorted, starting no earlier than the previous one ended), so the
+    file never has to be held or sorted in memory. The file is written under
+    a temporary name and moved into place by close().
+
+        with ArchiveWriter("history.draws") as w:
+            for days, balls in chunks:
+                w.append(days, balls)
+    """
+
+    def __init__(self, path: str, block_size: int = DEFAULT_BLOCK):
+        self.path = path
+        self.block_size = int(block_size)
+        self.count = 0
+        self.min_day = None
+        self.last_day = None
+        self._index = []
+        self._layout = _layout(RECORD_DTYPE)
+        self._data_offset = -(-(HEADER_SIZE + len(self._layout)) // 64) * 64
+        self._tmp = path + ".tmp"
+        self._f = open(self._tmp, "wb")
+        self._f.write(b"\0" * self._data_offset)
+
+    def append(self, days, balls):
+        days = np.asarray(days, dtype=np.int64)
+        balls = np.asarray(balls).reshape(-1, 4)
+        if len(days) == 0:
+            return
+        if len(days) != len(balls):
+            raise ValueError(f"{len(days)} days but {len(balls)} ball rows")
+        if (np.diff(days) < 0).any() or (self.last_day is not None and days[0] < self.last_day):
+            raise ValueError("archive records must be appended in date order")
+        ids = np.stack([encode_pairs(balls[:, 0], balls[:, 1]),
+                        encode_pairs(balls[:, 2], balls[:, 3])], axis=1)
+        if (ids < 0).any():
+            raise ValueError("Draw data contains a ball outside 1..26 or a repeated ball")
+
+        rec = np.empty(len(days), dtype=RECORD_DTYPE)
+        rec["day"] = days
+        rec["balls"] = balls
+        rec["pair_ids"] = ids
+        first = -(-self.count // self.block_size) * self.block_size - self.count
+        self._index.extend(days[first::self.block_size].tolist())
+        self._f.write(rec.tobytes())
+
+        self.count += len(days)
+        if self.min_day is None:
+            self.min_day = int(days[0])
+        self.last_day = int(days[-1])
+
+    def close(self):
+        if self._f is None:
+            return
+        index_offset = self._data_offset + self.count * RECORD_DTYPE.itemsize
+        self._f.write(np.asarray(self._index, dtype="<i4").tobytes())
+        header = HEADER.pack(MAGIC, ARCHIVE_VERSION, RECORD_DTYPE.itemsize, self.block_size, self.count,
+                             self._data_offset, self.min_day or 0, self.last_day or 0,
+                             index_offset, len(self._index), len(self._layout))
+        self._f.seek(0)
+        self._f.write(header.ljust(HEADER_SIZE, b"\0") + self._layout)
+        self._f.close()
+        self._f = None
+        os.replace(self._tmp, self.path)
+
+    def abort(self):
+        if self._f is not None:
+            self._f.close()
+            self._f = None
+            os.remove(self._tmp)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, *exc):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+        return False
+
+
+def write_archive(path: str, draws, block_size: int = DEFAULT_BLOCK) -> int:
+    """Write a draw DataFrame or DrawStore as an archive; returns the record count."""
+    store = DrawStore.from_frame(draws)
+    with ArchiveWriter(path, block_size=block_size) as w:
+        w.append(store.days, store.balls)
+    return len(store)
+
+
+class DrawArchive:
+    """
+    Read-only np.memmap view of an archive, or of the rows [start, stop) of
+    one. days / balls / pair_ids are views into the mapped file like the
+    DrawStore arrays, so nothing is read until it is touched. Counting goes
+    through iter_chunks(), which copies at most `chunk` records at a time,
+    and window queries locate their first row through the block index, so
+    only the pages of the window (plus one index block) are read.
+    """
+    __slots__ = ("path", "block_size", "index", "start", "stop", "_records")
+
+    def __init__(self, path: str):
+        with open(path, "rb") as f:
+            raw = f.read(HEADER_SIZE)
+            if len(raw) < HEADER_SIZE or raw[:8] != MAGIC:
+                raise ValueError(f"{path}: not a draw archive")
+            (_, version, record_size, block_size, count, data_offset,
+             _, _, index_offset, index_count, layout_len) = HEADER.unpack_from(raw)
+            if version != ARCHIVE_VERSION:
+                raise ValueError(f"{path}: unsupported archive version {version}")
+            dtype = _dtype_from_layout(f.read(layout_len))
+            if dtype.itemsize != record_size or dtype != RECORD_DTYPE:
+                raise ValueError(f"{path}: unexpected record layout {dtype}")
+            f.seek(index_offset)
+            self.index = np.fromfile(f, dtype="<i4", count=index_count)
+
+        self.path = path
+        self.block_size = block_size
+        self._records = (np.memmap(path, dtype=dtype, mode="r", offset=data_offset, shape=(count,))
+                         if count else np.empty(0, dtype=dtype))
+        self.start, self.stop = 0, count
+
+    def _view(self, start: int, stop: int):
+        view = object.__new__(DrawArchive)
+        view.path, view.block_size, view.index = self.path, self.block_size, self.index
+        view._records = self._records
+        view.start, view.stop = start, stop
+        return view
+
+    def __len__(self):
+        return self.stop - self.start
+
+    def __repr__(self):
+        if not len(self):
+            return f"DrawArchive({self.path!r}, 0 draws)"
+        return (f"DrawArchive({self.path!r}, {len(self)} draws, "
+                f"{self.min_date.date()} .. {self.max_date.date()})")
+
+    # --- DrawStore-compatible views ---
+
+    def __getitem__(self, key):
+        if not isinstance(key, slice) or key.step not in (None, 1):
+            raise TypeError("DrawArchive supports contiguous slicing only")
+        lo, hi, _ = key.indices(len(self))
+        return self._view(self.start + lo, self.start + max(lo, hi))
+
+    @property
+    def days(self):
+        return self._records["day"][self.start:self.stop]
+
+    @property
+    def balls(self):
+        return self._records["balls"][self.start:self.stop]
+
+    @property
+    def pair_ids(self):
+        return self._records["pair_ids"][self.start:self.stop]
+
+    @property
+    def max_day(self) -> int:
+        return int(self._records["day"][self.stop - 1])
+
+    @property
+    def min_date(self):
+        return pd.Timestamp(np.datetime64(int(self._records["day"][self.start]), "D"))
+
+    @property
+    def max_date(self):
+        return pd.Timestamp(np.datetime64(self.max_day, "D"))
+
+    def column(self, name: str):
+        return self.balls[:, ["r1", "r2", "w1", "w2"].index(name)]
+
+    # --- date index ---
+
+    def row_of(self, day: int) -> int:
+        """First row of the whole archive with day >= `day`, reading one index block."""
+        n = len(self._records)
+        if n == 0:
+            return 0
+        b = max(int(np.searchsorted(self.index, day, side="left")) - 1, 0)
+        lo, hi = b * self.block_size, min((b + 1) * self.block_size, n)
+        return lo + int(np.searchsorted(self._records["day"][lo:hi], day, side="left"))
+
+    def since(self, day: int):
+        return self._view(min(max(self.row_of(day), self.start), self.stop), self.stop)
+
+    def between(self, first_day: int, last_day: int):
+        """Rows with first_day <= day <= last_day."""
+        lo = min(max(self.row_of(first_day), self.start), self.stop)
+        hi = min(max(self.row_of(last_day + 1), lo), self.stop)
+        return self._view(lo, hi)
+
+    def window(self, days):
+        """Same rows as temporal.get_window_df: day >= latest - days."""
+        if days is None or not len(self):
+            return self
+        return self.since(self.max_day - days)
+
+    # --- bounded-memory access ---
+
+    def iter_chunks(self, chunk: int = DEFAULT_CHUNK):
+        """Consecutive DrawStores of at most `chunk` records (copied out of the map)."""
+        rec = self._records
+        for lo in range(self.start, self.stop, chunk):
+            part = np.array(rec[lo:min(lo + chunk, self.stop)])
+            yield DrawStore(part["day"], part["balls"], part["pair_ids"])
+
+    def window_counts(self, decay: float, windows=None, chunk: int = DEFAULT_CHUNK):
+        """temporal.compute_windows over the archive, one chunk at a time."""
+        from temporal import WINDOWS, WindowCounts
+
+        windows = list(WINDOWS if windows is None else windows)
+        n = len(self)
+        counts = np.zeros((2, N_PAIRS), dtype=np.int64)
+        weighted = np.zeros((2, N_PAIRS))
+        if n == 0:
+            return WindowCounts({d: 0 for d in [None] + windows}, {d: counts for d in [None] + windows},
+                                {d: weighted for d in [None] + windows})
+
+        max_day = self.max_day
+        starts = {w: self.window(w).start for w in windows}
+        at_bound = {}
+        stop = self.stop
+        for start in sorted(set(starts.values()) | {self.start}, reverse=True):
+            for part in self._view(start, stop).iter_chunks(chunk):
+                w = decay_weights(part.days, decay, max_day)
+                for c in range(2):
+                    counts[c] += np.bincount(part.pair_ids[:, c], minlength=N_PAIRS)
+                    weighted[c] += np.bincount(part.pair_ids[:, c], weights=w, minlength=N_PAIRS)
+            at_bound[start] = (counts.copy(), weighted.copy())
+            stop = start
+
+        n_draws, out_counts, out_weighted = {None: n}, {None: at_bound[self.start][0]}, {None: at_bound[self.start][1]}
+        for w, start in starts.items():
+            n_draws[w] = self.stop - start
+            out_counts[w], out_weighted[w] = at_bound[start]
+        return WindowCounts(n_draws, out_counts, out_weighted)
+
+    def to_store(self) -> DrawStore:
+        return DrawStore(np.array(self.days), np.array(self.balls), np.array(self.pair_ids))
+
+    def to_df(self) -> pd.DataFrame:
+        return arrays_to_draws(self.days, self.balls)
+
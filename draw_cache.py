@@ -0,0 +1,192 @@
+import contextlib
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+from data_parser import parse_file, draws_to_arrays, arrays_to_draws, DEFAULT_PARSER
+
+# Bump when parse_from_html changes what it extracts, so stale entries are dropped
+CACHE_VERSION = 2
+DEFAULT_CACHE_DIR = ".draw_cache"
+
+
+def file_sha1(path: str) -> str:
+    h = hashlib.sha1()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+@contextlib.contextmanager
+def _locked(path: str):
+    """Hold an exclusive lock on `path` (created if missing), across processes."""
+    with open(path, "a+b") as f:
+        if os.name == "nt":
+            import msvcrt
+            f.seek(0)
+            msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+            try:
+                yield
+            finally:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+        else:
+            import fcntl
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+
+class DrawCache:
+    """
+    On-disk cache of parsed draw rows, one .npz per distinct page content and
+    parser backend (int32 day ordinals + int8 balls), plus an index.json
+    keyed by path. Entries parsed by one backend are never served to
+    another, so switching --parser re-parses and --check-parser stays honest.
+
+    A page is a hit when its size and mtime match the index; otherwise its
+    SHA-1 is compared with the stored one, so touched-but-unchanged files are
+    not re-parsed either.
+
+    Several processes may share one cache dir: entry files are written under
+    unique temp names and renamed into place, and save() merges this
+    instance's changes into the index on disk under a lock instead of
+    replacing it.
+    """
+
+    def __init__(self, cache_dir: str = DEFAULT_CACHE_DIR, rebuild: bool = False):
+        self.cache_dir = os.path.expandvars(os.path.expanduser(cache_dir))
+        self.index_path = os.path.join(self.cache_dir, "index.json")
+        self.lock_path = os.path.join(self.cache_dir, "index.lock")
+        self.hits = 0
+        self.misses = 0
+        self._dirty = False
+        self._touched = set()   # index keys added or updated since load
+        self._removed = set()   # index keys dropped by prune()
+        if rebuild:
+            self.clear()
+        self.index = self._load_index()
+
+    def _load_index(self):
+        data = self._read_index()
+        if data is None:
+            self.clear()
+            return {}
+        return data
+
+    def _read_index(self):
+        # The on-disk index entries, {} if there is none, None if it has another version
+        try:
+            with open(self.index_path, "r") as f:
+                data = json.load(f)
+        except (FileNotFoundError, ValueError):
+            return {}
+        if data.get("version") != CACHE_VERSION:
+            return None
+        return data.get("files", {})
+
+    def clear(self):
+        if os.path.isdir(self.cache_dir):
+            shutil.rmtree(self.cache_dir)
+        self.index = {}
+        self._dirty = True
+
+    def _entry_path(self, sha1: str, parser: str) -> str:
+        return os.path.join(self.cache_dir, f"{sha1}.{parser}.npz")
+
+    def lookup(self, path: str, parser: str = DEFAULT_PARSER):
+        """Return (days, balls) for a page unchanged since `parser` parsed it, else None."""
+        found = self._lookup(path, parser)
+        if found is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return found
+
+    def _lookup(self, path: str, parser: str):
+        key = os.path.abspath(path)
+        st = os.stat(key)
+        meta = self.index.get(key)
+        if meta is None or meta.get("parser") != parser:
+            return None
+        if (meta["size"], meta["mtime_ns"]) != (st.st_size, st.st_mtime_ns):
+            if meta["size"] != st.st_size or file_sha1(key) != meta["sha1"]:
+                return None
+            meta["mtime_ns"] = st.st_mtime_ns
+            self._touched.add(key)
+            self._dirty = True
+        try:
+            with np.load(self._entry_path(meta["sha1"], parser)) as z:
+                return z["days"], z["balls"]
+        except (FileNotFoundError, KeyError, ValueError):
+            return None
+
+    def store(self, path: str, days, balls, parser: str = DEFAULT_PARSER):
+        key = os.path.abspath(path)
+        st = os.stat(key)
+        sha1 = file_sha1(key)
+        os.makedirs(self.cache_dir, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=self.cache_dir, suffix=".tmp")
+        with os.fdopen(fd, "wb") as f:
+            np.savez(f, days=np.asarray(days, dtype=np.int32), balls=np.asarray(balls, dtype=np.int8))
+        os.replace(tmp, self._entry_path(sha1, parser))
+        self.index[key] = {"size": st.st_size, "mtime_ns": st.st_mtime_ns, "sha1": sha1, "parser": parser}
+        self._touched.add(key)
+        self._dirty = True
+
+    def parse_file(self, path: str, parser: str = DEFAULT_PARSER) -> pd.DataFrame:
+        cached = self.lookup(path, parser)
+        if cached is not None:
+            return arrays_to_draws(*cached)
+        df = parse_file(path, parser=parser)
+        self.store(path, *draws_to_arrays(df), parser=parser)
+        return df
+
+    def prune(self):
+        """
+        Drop index entries for pages that no longer exist, and orphaned .npz
+        files. Entries another process stored but has not saved yet look
+        orphaned, so only prune when no other run is using the cache dir.
+        """
+        for key in [k for k in self.index if not os.path.isfile(k)]:
+            del self.index[key]
+            self._touched.discard(key)
+            self._removed.add(key)
+            self._dirty = True
+        if not os.path.isdir(self.cache_dir):
+            return
+        with _locked(self.lock_path):
+            on_disk = {k: m for k, m in (self._read_index() or {}).items() if k not in self._removed}
+            live = {f"{meta['sha1']}.{meta['parser']}" for meta in list(self.index.values()) + list(on_disk.values())
+                    if "parser" in meta}
+            for name in os.listdir(self.cache_dir):
+                if name.endswith(".npz") and name[:-4] not in live:
+                    os.remove(os.path.join(self.cache_dir, name))
+
+    def save(self):
+        """Merge this instance's added, updated and pruned entries into the index on disk."""
+        if not self._dirty:
+            return
+        os.makedirs(self.cache_dir, exist_ok=True)
+        with _locked(self.lock_path):
+            merged = self._read_index() or {}
+            for key in self._removed:
+                merged.pop(key, None)
+            for key in self._touched:
+                merged[key] = self.index[key]
+            fd, tmp = tempfile.mkstemp(dir=self.cache_dir, suffix=".tmp")
+            with os.fdopen(fd, "w") as f:
+                json.dump({"version": CACHE_VERSION, "files": merged}, f)
+            os.replace(tmp, self.index_path)
+        self.index = merged
+        self._touched.clear()
+        self._removed.clear()
+        self._dirty = False
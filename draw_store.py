@@ -0,0 +1,90 @@
+import numpy as np
+import pandas as pd
+
+from data_parser import BALL_COLS, draws_to_arrays, arrays_to_draws
+from metrics import encode_pairs
+
+
+class DrawStore:
+    """
+    Draw history as contiguous arrays, sorted by day:
+
+        days      int32 (n,)    days since 1970-01-01
+        balls     int8  (n, 4)  r1, r2, w1, w2
+        pair_ids  int16 (n, 2)  red / white pair index into metrics.SUPPORT
+
+    Window slices are searchsorted offsets into the same buffers (views, no
+    copy). The counting functions in metrics and temporal accept a DrawStore
+    wherever they take a draw DataFrame; to_df() builds one when a caller
+    really needs pandas.
+    """
+    __slots__ = ("days", "balls", "pair_ids")
+
+    def __init__(self, days, balls, pair_ids=None):
+        self.days = days
+        self.balls = balls
+        if pair_ids is None:
+            pair_ids = np.stack([encode_pairs(balls[:, 0], balls[:, 1]),
+                                 encode_pairs(balls[:, 2], balls[:, 3])], axis=1)
+            if (pair_ids < 0).any():
+                raise ValueError("Draw data contains a ball outside 1..26 or a repeated ball")
+        self.pair_ids = pair_ids
+
+    @classmethod
+    def from_arrays(cls, days, balls):
+        days = np.asarray(days, dtype=np.int32)
+        balls = np.asarray(balls, dtype=np.int8).reshape(-1, 4)
+        order = np.argsort(days, kind="stable")
+        return cls(np.ascontiguousarray(days[order]), np.ascontiguousarray(balls[order]))
+
+    @classmethod
+    def from_frame(cls, df: pd.DataFrame):
+        if isinstance(df, cls):
+            return df
+        return cls.from_arrays(*draws_to_arrays(df))
+
+    def __len__(self):
+        return len(self.days)
+
+    def __repr__(self):
+        if not len(self):
+            return "DrawStore(0 draws)"
+        return f"DrawStore({len(self)} draws, {self.min_date.date()} .. {self.max_date.date()})"
+
+    @property
+    def max_day(self) -> int:
+        return int(self.days[-1])
+
+    @property
+    def min_date(self):
+        return pd.Timestamp(np.datetime64(int(self.days[0]), "D"))
+
+    @property
+    def max_date(self):
+        return pd.Timestamp(np.datetime64(int(self.days[-1]), "D"))
+
+    @property
+    def nbytes(self) -> int:
+        return self.days.nbytes + self.balls.nbytes + self.pair_ids.nbytes
+
+    def column(self, name: str):
+        """One ball column (r1, r2, w1 or w2) as an int8 view."""
+        return self.balls[:, BALL_COLS.index(name)]
+
+    def __getitem__(self, key):
+        if not isinstance(key, slice):
+            raise TypeError("DrawStore supports slicing only; use to_df() for row access")
+        return DrawStore(self.days[key], self.balls[key], self.pair_ids[key])
+
+    def since(self, day: int):
+        """Draws on or after day ordinal `day`."""
+        return self[int(np.searchsorted(self.days, day, side="left")):]
+
+    def window(self, days):
+        """Same rows as temporal.get_window_df: date >= latest - days."""
+        if days is None or not len(self):
+            return self
+        return self.since(self.max_day - days)
+
+    def to_df(self) -> pd.DataFrame:
+        return arrays_to_draws(self.days, self.balls)
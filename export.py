@@ -0,0 +1,181 @@
+import os
+import shutil
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+
+FORMATS = ("csv", "parquet", "feather")
+DEFAULT_FORMAT = "csv"
+EXTENSIONS = {"csv": ".csv", "parquet": ".parquet", "feather": ".feather"}
+
+# name -> (column, largest?) for the convenience top-N exports
+TOP_VIEWS = {
+    "global": ("composite_score", True),
+    "emerging": ("delta_30d", True),
+    "fading": ("delta_30d", False),
+}
+
+
+def require_format(fmt: str):
+    """Fail before any work is done when the format's writer is not installed."""
+    if fmt not in FORMATS:
+        raise ValueError(f"Unknown export format: {fmt} (expected one of {', '.join(FORMATS)})")
+    if fmt != "csv":
+        try:
+            import pyarrow  # noqa: F401
+        except ImportError:
+            raise ImportError(f"--format {fmt} needs pyarrow; install it with `pip install pyarrow` "
+                              f"or use --format csv") from None
+
+
+def top_views(df: pd.DataFrame, n: int = 25) -> dict:
+    """
+    The top-N convenience views, each from one partial selection
+    (nlargest / nsmallest) instead of a full sort of the table.
+    Same rows and order as sort_values(col).head(n).
+    """
+    views = {}
+    for name, (col, largest) in TOP_VIEWS.items():
+        views[name] = df.nlargest(n, col) if largest else df.nsmallest(n, col)
+    return views
+
+
+def _columnar(df: pd.DataFrame) -> pd.DataFrame:
+    # Arrow formats cannot hold tuple pairs (plain or categorical); store them as the same "(a, b)" text the CSVs have.
+    # Feather also needs a default index.
+    out = df.reset_index(drop=True)
+    for col in out.columns:
+        if out[col].dtype == object or isinstance(out[col].dtype, pd.CategoricalDtype):
+            first = out[col].dropna()
+            if len(first) and isinstance(first.iloc[0], tuple):
+                out[col] = out[col].astype(str)
+    return out
+
+
+def write_frame(df: pd.DataFrame, path: str, fmt: str):
+    if fmt == "csv":
+        df.to_csv(path, index=False)
+    elif fmt == "parquet":
+        _columnar(df).to_parquet(path, index=False)
+    elif fmt == "feather":
+        _columnar(df).to_feather(path)
+    else:
+        raise ValueError(f"Unknown export format: {fmt}")
+
+
+class Exporter:
+    """
+    Writes the run's tables as <out>_<name>.<ext>, on a background thread so
+    serialization overlaps with the next color's computation. Writes run in
+    submission order; call close() (or use as a context manager) to wait for
+    them and surface any write error. `rows` counts the rows queued and
+    `write_seconds` the time spent serializing them, for the profiler.
+
+    With dataset=True the tables form one hive-partitioned dataset instead:
+    each is written, in the background as it arrives, to
+    <out>_dataset/table=<name>/part-0.<ext>. Tables keep their own columns,
+    so read one table per partition (pd.read_parquet on
+    <out>_dataset/table=<name>): a read of the whole directory takes one
+    fragment's schema and drops the columns the other tables have.
+    """
+
+    def __init__(self, out_prefix: str, fmt: str = DEFAULT_FORMAT, dataset: bool = False,
+                 background: bool = True):
+        require_format(fmt)
+        self.out_prefix = out_prefix
+        self.fmt = fmt
+        self.dataset = dataset
+        self.paths = {}
+        self.rows = 0
+        self.write_seconds = 0.0
+        self._futures = []
+        self._pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="export") if background else None
+
+    def path(self, name: str) -> str:
+        if self.dataset:
+            return os.path.join(self.dataset_dir, f"table={name}", f"part-0{EXTENSIONS[self.fmt]}")
+        return f"{self.out_prefix}_{name}{EXTENSIONS[self.fmt]}"
+
+    @property
+    def dataset_dir(self) -> str:
+        return f"{self.out_prefix}_dataset"
+
+    def _timed(self, fn, *args):
+        # Runs on the single writer thread, so the sum needs no lock
+        t0 = time.perf_counter()
+        try:
+            fn(*args)
+        finally:
+            self.write_seconds += time.perf_counter() - t0
+
+    def _submit(self, fn, *args):
+        if self._pool is None:
+            self._timed(fn, *args)
+            return
+        self._futures.append(self._pool.submit(self._timed, fn, *args))
+
+    def write(self, name: str, df: pd.DataFrame):
+        """Queue one table. The frame must not be modified afterwards."""
+        path = self.paths[name] = self.path(name)
+        if self.dataset:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.rows += len(df)
+        self._submit(write_frame, df, path, self.fmt)
+
+    def write_top(self, prefix: str, df: pd.DataFrame, n: int = 25):
+        for view, sub in top_views(df, n).items():
+            self.write(f"{prefix}_top{n}_{view}", sub)
+
+    def concat(self, name: str, parts: list, frames: list):
+        """
+        Write a table that is the row concatenation of already written tables.
+        CSV parts are joined byte-wise instead of serializing the rows again.
+        In dataset mode it is skipped: the parts are already in the dataset.
+        """
+        if self.dataset:
+            return
+        path = self.paths[name] = self.path(name)
+        self.rows += sum(len(f) for f in frames)
+        if self.fmt == "csv" and all(p in self.paths for p in parts):
+            sources = [self.paths[p] for p in parts]
+            self._submit(_concat_csv, sources, path)
+        else:
+            self._submit(write_frame, pd.concat(frames, ignore_index=True), path, self.fmt)
+
+    def close(self):
+        if self._pool is not None:
+            try:
+                for future in self._futures:
+                    future.result()
+            finally:
+                self._pool.shutdown(wait=True)
+                self._pool = None
+        if self.dataset and self.paths:
+            self._drop_stale_partitions()
+            self.paths["dataset"] = self.dataset_dir
+        return self.paths
+
+    def _drop_stale_partitions(self):
+        # Partitions from an earlier run that this run did not write would be read back as current
+        live = {f"table={name}" for name in self.paths}
+        for entry in os.listdir(self.dataset_dir):
+            if entry.startswith("table=") and entry not in live:
+                shutil.rmtree(os.path.join(self.dataset_dir, entry))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
+
+
+def _concat_csv(sources, path):
+    # Runs on the writer thread after the parts it reads, which were queued first.
+    with open(path, "wb") as out:
+        for i, src in enumerate(sources):
+            with open(src, "rb") as f:
+                if i:
+                    f.readline()  # header
+                shutil.copyfileobj(f, out)
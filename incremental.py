@@ -0,0 +1,193 @@
+import os
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+from data_parser import BALL_COLS, draws_to_arrays
+from metrics import N_PAIRS, encode_pairs
+from draw_store import DrawStore
+from temporal import WINDOWS, WindowCounts, pair_features, stats_window_rows
+
+STATE_VERSION = 1
+
+
+class PairState:
+    """
+    Running per-pair counts and decayed sums for the global history and each
+    sliding window in temporal.WINDOWS, so new draws can be folded in without
+    recomputing the whole history.
+
+    Weighted sums are always kept relative to the latest draw day: when the
+    latest day advances by d, every sum is multiplied by decay ** d and the new
+    draws are added with their own weight. Windows evict draws that fall
+    before latest_day - window, matching temporal.get_window_df.
+    """
+
+    def __init__(self, decay: float = 0.98):
+        self.decay = float(decay)
+        self.windows = list(WINDOWS)
+        self.days = np.empty(0, dtype=np.int64)
+        self.balls = np.empty((0, 4), dtype=np.int8)
+        self.pair_ids = np.empty((0, 2), dtype=np.int16)  # red, white
+        self.max_day = None
+
+        n_win = len(self.windows)
+        self.counts = np.zeros((2, N_PAIRS), dtype=np.int64)
+        self.weighted = np.zeros((2, N_PAIRS))
+        self.win_counts = np.zeros((n_win, 2, N_PAIRS), dtype=np.int64)
+        self.win_weighted = np.zeros((n_win, 2, N_PAIRS))
+        self.win_start = np.zeros(n_win, dtype=np.int64)
+
+    def __len__(self):
+        return len(self.days)
+
+    @classmethod
+    def from_draws(cls, df: pd.DataFrame, decay: float = 0.98):
+        state = cls(decay=decay)
+        state.update(df)
+        return state
+
+    # --- ingestion ---
+
+    def _dedupe(self, days, balls):
+        order = np.lexsort(tuple(balls[:, i] for i in range(3, -1, -1)) + (days,))
+        days, balls = days[order], balls[order]
+        keep = np.ones(len(days), dtype=bool)
+        keep[1:] = (days[1:] != days[:-1]) | (balls[1:] != balls[:-1]).any(axis=1)
+
+        # Drop draws already held; only same-day rows need comparing
+        lo = np.searchsorted(self.days, days, side="left")
+        hi = np.searchsorted(self.days, days, side="right")
+        for i in np.flatnonzero(hi > lo):
+            if (self.balls[lo[i]:hi[i]] == balls[i]).all(axis=1).any():
+                keep[i] = False
+        return days[keep], balls[keep]
+
+    def _add(self, target_counts, target_weighted, ids, weights, sign=1):
+        for c in range(2):
+            target_counts[c] += sign * np.bincount(ids[:, c], minlength=N_PAIRS)
+            target_weighted[c] += sign * np.bincount(ids[:, c], weights=weights, minlength=N_PAIRS)
+
+    def update(self, draws: pd.DataFrame) -> int:
+        """Fold new draws into the state; returns how many were new."""
+        if draws is None or len(draws) == 0:
+            return 0
+        days, balls = draws_to_arrays(draws)
+        days = days.astype(np.int64)
+        days, balls = self._dedupe(days, balls)
+        if len(days) == 0:
+            return 0
+
+        ids = np.stack([encode_pairs(balls[:, 0], balls[:, 1]),
+                        encode_pairs(balls[:, 2], balls[:, 3])], axis=1)
+        if (ids < 0).any():
+            raise ValueError("Draw data contains a ball outside 1..26 or a repeated ball")
+
+        old_max = self.max_day
+        new_max = int(days.max()) if old_max is None else max(old_max, int(days.max()))
+
+        # Advance the decay reference point
+        if old_max is not None and new_max > old_max:
+            scale = self.decay ** (new_max - old_max)
+            self.weighted *= scale
+            self.win_weighted *= scale
+
+        weights = np.power(self.decay, (new_max - days).astype(np.float64))
+        self._add(self.counts, self.weighted, ids, weights)
+
+        for k, w in enumerate(self.windows):
+            cutoff = new_max - w
+            # Evict held draws that aged out of this window
+            stop = np.searchsorted(self.days, cutoff, side="left")
+            start = self.win_start[k]
+            if stop > start:
+                old_w = np.power(self.decay, (new_max - self.days[start:stop]).astype(np.float64))
+                self._add(self.win_counts[k], self.win_weighted[k], self.pair_ids[start:stop], old_w, sign=-1)
+            inside = days >= cutoff
+            if inside.any():
+                self._add(self.win_counts[k], self.win_weighted[k], ids[inside], weights[inside])
+            # Subtraction can leave rounding residue on emptied pairs
+            self.win_weighted[k][self.win_counts[k] == 0] = 0.0
+
+        self._insert(days, balls, ids)
+        self.max_day = new_max
+        for k, w in enumerate(self.windows):
+            self.win_start[k] = np.searchsorted(self.days, new_max - w, side="left")
+        return len(days)
+
+    def _insert(self, days, balls, ids):
+        if len(self.days) == 0 or days[0] >= self.days[-1]:
+            self.days = np.concatenate([self.days, days])
+            self.balls = np.concatenate([self.balls, balls])
+            self.pair_ids = np.concatenate([self.pair_ids, ids])
+            return
+        # Back-filled history: keep arrays sorted by day
+        pos = np.searchsorted(self.days, days, side="right")
+        self.days = np.insert(self.days, pos, days)
+        self.balls = np.insert(self.balls, pos, balls, axis=0)
+        self.pair_ids = np.insert(self.pair_ids, pos, ids, axis=0)
+
+    # --- outputs ---
+
+    def draws(self) -> pd.DataFrame:
+        df = pd.DataFrame(self.balls.astype(np.int64), columns=BALL_COLS)
+        df.insert(0, "date", pd.to_datetime(self.days.astype("datetime64[D]")))
+        return df
+
+    def store(self) -> DrawStore:
+        """The held draws as a DrawStore sharing the ball and pair-id arrays."""
+        return DrawStore(self.days.astype(np.int32), self.balls, self.pair_ids)
+
+    def window_counts(self) -> WindowCounts:
+        n = len(self.days)
+        n_draws, counts, weighted = {None: n}, {None: self.counts}, {None: self.weighted}
+        for k, w in enumerate(self.windows):
+            n_draws[w] = n - int(self.win_start[k])
+            counts[w] = self.win_counts[k]
+            weighted[w] = self.win_weighted[k]
+        return WindowCounts(n_draws, counts, weighted)
+
+    def features(self, color: str) -> pd.DataFrame:
+        """Same table as main.enrich_with_facts, built from the held sums."""
+        return pair_features(self.window_counts(), color)
+
+    def stats_rows(self):
+        return stats_window_rows(self.window_counts())
+
+    # --- persistence ---
+
+    def save(self, path: str):
+        path = os.path.expandvars(os.path.expanduser(path))
+        # A unique temp file, so runs sharing a --state path never write the same one
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(path)), suffix=".tmp")
+        with os.fdopen(fd, "wb") as f:
+            np.savez(
+                f,
+                version=STATE_VERSION, decay=self.decay, windows=np.array(self.windows, dtype=np.int64),
+                days=self.days, balls=self.balls, pair_ids=self.pair_ids,
+                counts=self.counts, weighted=self.weighted,
+                win_counts=self.win_counts, win_weighted=self.win_weighted, win_start=self.win_start,
+            )
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path: str, decay: float = 0.98):
+        """
+        Load a saved state. If it was built with a different decay or window
+        set, the sums are rebuilt from the stored draws.
+        """
+        path = os.path.expandvars(os.path.expanduser(path))
+        with np.load(path) as z:
+            if int(z["version"]) != STATE_VERSION:
+                raise ValueError(f"Unsupported state version in {path}: {int(z['version'])}")
+            state = cls(decay=float(z["decay"]))
+            stored_windows = [int(w) for w in z["windows"]]
+            for name in ("days", "balls", "pair_ids", "counts", "weighted",
+                         "win_counts", "win_weighted", "win_start"):
+                setattr(state, name, z[name])
+        state.max_day = int(state.days[-1]) if len(state.days) else None
+
+        if state.decay != float(decay) or stored_windows != state.windows:
+            return cls.from_draws(state.draws(), decay=decay)
+        return state
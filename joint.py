@@ -0,0 +1,112 @@
+import numpy as np
+import pandas as pd
+
+from metrics import SUPPORT, N_PAIRS, N_JOINT, N_NUMBERS, joint_counts, number_counts
+from stats import sparse_window_stats
+from temporal import WINDOWS, COLORS, get_window_df
+
+
+class JointCounts:
+    """
+    Counts of the 4-ball combination (red pair x white pair) for one window,
+    held sparsely: sorted keys red_id * 325 + white_id of the cells that were
+    drawn, and their counts. Everything else is zero, so a window costs 12
+    bytes per observed cell instead of the 105,625-cell table.
+    """
+    __slots__ = ("keys", "counts", "n_draws")
+
+    def __init__(self, keys, counts, n_draws: int):
+        self.keys = keys
+        self.counts = counts
+        self.n_draws = int(n_draws)
+
+    @classmethod
+    def from_draws(cls, df):
+        keys, counts = joint_counts(df)
+        return cls(keys, counts, int(counts.sum()))
+
+    def __len__(self):
+        return len(self.keys)
+
+    @property
+    def nbytes(self) -> int:
+        return self.keys.nbytes + self.counts.nbytes
+
+    def dense(self):
+        """(325, 325) int64 table indexed [red_id, white_id]."""
+        return np.bincount(self.keys, weights=self.counts, minlength=N_JOINT).astype(np.int64).reshape(N_PAIRS, N_PAIRS)
+
+    def stats(self) -> dict:
+        """window_stats over all 105,625 cells, computed from the observed ones."""
+        return sparse_window_stats(self.counts, N_JOINT)
+
+    def top(self, k: int) -> pd.DataFrame:
+        """The k most drawn combinations, ties broken by key (red pair, then white pair)."""
+        counts = self.counts
+        if 0 < k < len(counts):
+            # Only cells at or above the k-th count can make the cut
+            kth = np.partition(counts, len(counts) - k)[len(counts) - k]
+            cand = np.flatnonzero(counts >= kth)
+        else:
+            cand = np.arange(len(counts))
+        cand = cand[np.lexsort((self.keys[cand], -counts[cand]))][:max(k, 0)]
+        red, white = np.divmod(self.keys[cand].astype(np.int64), N_PAIRS)
+        expected = self.n_draws / N_JOINT
+        obs = counts[cand]
+        return pd.DataFrame({
+            "red_pair": [SUPPORT[i] for i in red],
+            "white_pair": [SUPPORT[i] for i in white],
+            "count": obs,
+            "expected": expected,
+            "chi_square": (obs - expected) ** 2 / expected if expected > 0 else 0.0,
+        })
+
+
+def _label(days):
+    return "global" if days is None else f"{days}d"
+
+
+def joint_windows(df, windows=None) -> dict:
+    """JointCounts for the global history and each window (same rows as get_window_df)."""
+    windows = list(WINDOWS if windows is None else windows)
+    return {days: JointCounts.from_draws(get_window_df(df, days)) for days in [None] + windows}
+
+
+def joint_stats_rows(joint: dict):
+    """Rows for *_joint_stats_windows: window_stats of the red x white table per window."""
+    rows = []
+    for days, jc in joint.items():
+        rows.append({"window": _label(days), "cells_observed": len(jc), **jc.stats()})
+    return rows
+
+
+def joint_top_table(joint: dict, k: int = 25) -> pd.DataFrame:
+    """Top-k combinations per window, long format with a rank column."""
+    parts = []
+    for days, jc in joint.items():
+        top = jc.top(k)
+        top.insert(0, "rank", np.arange(1, len(top) + 1))
+        top.insert(0, "window", _label(days))
+        parts.append(top)
+    return pd.concat(parts, ignore_index=True)
+
+
+def number_marginals(df, windows=None) -> pd.DataFrame:
+    """Per window and color, how often each number 1..26 was drawn, with its chi-square term."""
+    windows = list(WINDOWS if windows is None else windows)
+    numbers = np.arange(1, N_NUMBERS + 1)
+    parts = []
+    for days in [None] + windows:
+        sub = get_window_df(df, days)
+        counts = number_counts(sub)
+        # Two distinct balls of each color per draw
+        expected = 2 * len(sub) / N_NUMBERS
+        for c, color in enumerate(COLORS):
+            obs = counts[c, 1:]
+            parts.append(pd.DataFrame({
+                "window": _label(days), "color": color, "number": numbers, "count": obs,
+                "expected": expected,
+                "chi_square": (obs - expected) ** 2 / expected if expected > 0 else 0.0,
+            }))
+    return pd.concat(parts, ignore_index=True)
+
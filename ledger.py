@@ -0,0 +1,126 @@
+import os
+import sqlite3
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from data_parser import load_html_file, page_days, arrays_to_draws, PARSERS, DEFAULT_PARSER, BALL_COLS
+
+_EPOCH = datetime(1970, 1, 1)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS draws (
+    day INTEGER NOT NULL,
+    r1 INTEGER NOT NULL,
+    r2 INTEGER NOT NULL,
+    w1 INTEGER NOT NULL,
+    w2 INTEGER NOT NULL
+);
+CREATE UNIQUE INDEX IF NOT EXISTS draws_key ON draws (day, r1, r2, w1, w2);
+"""
+
+
+def _day(value) -> int:
+    """Day ordinal of a date string or timestamp, as the ledger stores it."""
+    return int(np.datetime64(pd.Timestamp(value).date(), "D").astype(np.int64))
+
+
+class DrawLedger:
+    """
+    Canonical draw history in a SQLite file: one row per distinct draw, with
+    dates stored as day ordinals and a unique index on (day, r1, r2, w1, w2)
+    that both rejects duplicates and serves date-range queries.
+
+    Saved results pages overlap heavily, so sync() counts each page's cards
+    per date first and only extracts the cards of dates where the page shows
+    more draws than the ledger holds; a page with nothing new is not parsed
+    at all. Once a date with several draws has been seen (on the page or in
+    the ledger), the page's oldest and newest dates are always extracted
+    too, since a page break can split their draws; the unique index then
+    keeps only the draws not stored yet.
+    """
+
+    def __init__(self, path: str):
+        self.path = os.path.expandvars(os.path.expanduser(path))
+        self.conn = sqlite3.connect(self.path)
+        self.conn.executescript(_SCHEMA)
+
+    def close(self):
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __len__(self):
+        return self.conn.execute("SELECT COUNT(*) FROM draws").fetchone()[0]
+
+    def day_counts(self, days=None) -> dict:
+        """Stored draws per day ordinal, for all days or just `days`."""
+        if days is None:
+            return dict(self.conn.execute("SELECT day, COUNT(*) FROM draws GROUP BY day"))
+        days = [int(d) for d in days]
+        if not days:
+            return {}
+        marks = ",".join("?" * len(days))
+        return dict(self.conn.execute(f"SELECT day, COUNT(*) FROM draws WHERE day IN ({marks}) GROUP BY day",
+                                      days))
+
+    def add(self, rows) -> int:
+        """Insert (day, r1, r2, w1, w2) rows, ignoring ones already present; returns how many were new."""
+        before = self.conn.total_changes
+        with self.conn:
+            self.conn.executemany("INSERT OR IGNORE INTO draws VALUES (?, ?, ?, ?, ?)", rows)
+        return self.conn.total_changes - before
+
+    def sync(self, paths, parser: str = DEFAULT_PARSER) -> dict:
+        """
+        Add the draws these pages have and the ledger does not. Returns
+        counts: pages, pages_skipped (nothing new), cards_parsed, added and
+        added_on_known_dates (new draws on a date that already had one).
+        """
+        if parser not in PARSERS:
+            raise ValueError(f"Unknown parser backend: {parser} (expected one of {sorted(PARSERS)})")
+        known = self.day_counts()
+        multi = any(n > 1 for n in known.values())
+        stats = {"pages": 0, "pages_skipped": 0, "cards_parsed": 0, "added": 0, "added_on_known_dates": 0}
+        for path in paths:
+            stats["pages"] += 1
+            html = load_html_file(path)
+            days = page_days(html)
+            multi = multi or any(n > 1 for n in days.values())
+            todo = {d for d, n in days.items() if n > known.get(d, 0)}
+            if multi and days:
+                todo.update((min(days), max(days)))
+            if days and not todo:
+                stats["pages_skipped"] += 1
+                continue
+            try:
+                cards = PARSERS[parser](html, skip_days=frozenset(days) - todo)
+            except Exception as e:
+                raise RuntimeError(f"Failed parsing {path}: {e}") from e
+            if not cards and not days:
+                raise RuntimeError(f"No draws parsed from {path}. Make sure you saved the full "
+                                   "/previous-results page HTML and not a redirect/consent page.")
+            rows = [((c["date"] - _EPOCH).days, c["r1"], c["r2"], c["w1"], c["w2"]) for c in cards]
+            stats["cards_parsed"] += len(rows)
+            stats["added"] += self.add(rows)
+            touched = {r[0] for r in rows}
+            now = self.day_counts(touched)
+            stats["added_on_known_dates"] += sum(now[d] - known[d] for d in touched if known.get(d))
+            known.update(now)
+            multi = multi or any(n > 1 for n in now.values())
+        return stats
+
+    def draws(self, since=None, until=None) -> pd.DataFrame:
+        """Draws with since <= date <= until (either bound optional), sorted by date, via the index."""
+        lo = _day(since) if since is not None else np.iinfo(np.int32).min
+        hi = _day(until) if until is not None else np.iinfo(np.int32).max
+        rows = self.conn.execute(
+            "SELECT day, r1, r2, w1, w2 FROM draws WHERE day BETWEEN ? AND ? ORDER BY day, r1, r2, w1, w2",
+            (int(lo), int(hi))).fetchall()
+        data = np.array(rows, dtype=np.int32).reshape(-1, 1 + len(BALL_COLS))
+        return arrays_to_draws(data[:, 0], data[:, 1:])
@@ -1,209 +1,749 @@
 # main.py
 import argparse
+import glob
 import os
+import sys
+import time
 import pandas as pd
 
-from data_parser import parse_file, parse_glob
+from data_parser import parse_file, parse_glob, check_parser_conformance, PARSERS, DEFAULT_PARSER
+from draw_cache import DrawCache, DEFAULT_CACHE_DIR
 from metrics import (
     pair_frequencies, weighted_scores, chi_square_per_pair,
-    cooccurrence_matrix, all_pairs_support
+    cooccurrence_matrix, all_pairs_support, set_engine, ENGINES
 )
-from scoring import build_score_table
-from temporal import build_temporal_features, get_window_df
-from rules import load_rules, evaluate_rules
+from scoring import build_score_table, DEFAULT_WEIGHTS
+from temporal import (
+    build_temporal_features, get_window_df, attach_temporal, compute_windows, stats_window_rows,
+    compute_decay_sweep, parse_decays, pair_features, FEATURE_COLUMNS
+)
+from rules import load_rules, compile_rules, evaluate_rules_df
 from stats import window_stats
-from ml import run_dbscan, cluster_summary
+from incremental import PairState
+from draw_store import DrawStore
+from draw_archive import DrawArchive, write_archive
+from profiling import Profiler, parse_importtime, import_summary
+from backtest import write_rolling, parse_windows, parse_step, DEFAULT_CHUNK
+from export import Exporter, require_format, FORMATS, DEFAULT_FORMAT, EXTENSIONS
+from bootstrap import bootstrap_ci, add_ci_columns, DEFAULT_LEVEL, CI_COLUMNS
+from montecarlo import (
+    null_distribution, add_stats_pvalues, add_pair_pvalues, PAIR_P_COLUMN, DEFAULT_CACHE_DIR as MC_CACHE_DIR
+)
 
 
-def enrich_with_facts(df_draws, color, decay):
+def enrich_with_facts(df_draws, color, decay, windows=None, weights=DEFAULT_WEIGHTS):
+    """
+    The enriched pair feature table for one color. windows: a
+    temporal.compute_windows result shared across colors, scored as dense
+    arrays; without one every table is recomputed from df_draws.
+    """
+    if windows is not None:
+        return pair_features(windows, color, weights=weights)
+
     red_freq, white_freq = pair_frequencies(df_draws)
     freq = red_freq if color == "red" else white_freq
-
     weighted = weighted_scores(df_draws, decay=decay)
     chi = chi_square_per_pair(freq, len(df_draws))
 
-    score_df = build_score_table(color, freq.keys(), freq, weighted, chi)
+    score_df = build_score_table(color, freq.keys(), freq, weighted, chi, weights=weights)
+
+    temporal_df = build_temporal_features(df_draws, color, decay, weights=weights)
+
+    return attach_temporal(score_df, temporal_df)
+
+
+def plot_jobs(df_draws, merged, color, args):
+    """The Step 4 plots for one color, as viz.PlotJobs to render in one batch."""
+    from viz import plot_job
+
+    jobs = []
+    heat = cooccurrence_matrix(df_draws, color=color)
+    jobs.append(plot_job(
+        "heatmap", os.path.join(args.plot_dir, f"heatmap_{color}.png"),
+        heat,
+        f"{color.upper()} pair co-occurrence heatmap",
+    ))
+
+    top_freq = merged.sort_values("frequency", ascending=False)[["pair", "frequency"]]\
+                     .rename(columns={"frequency": "value"}).head(args.top_n)
+    jobs.append(plot_job(
+        "bar", os.path.join(args.plot_dir, f"top_{color}_frequency.png"),
+        top_freq,
+        f"Top {args.top_n} {color.upper()} pairs by frequency (global)",
+        top_n=args.top_n
+    ))
+
+    top_delta = merged.sort_values("delta_30d", ascending=False)[["pair", "delta_30d"]]\
+                      .rename(columns={"delta_30d": "value"}).head(args.top_n)
+    jobs.append(plot_job(
+        "bar", os.path.join(args.plot_dir, f"top_{color}_emerging_delta30d.png"),
+        top_delta,
+        f"Top {args.top_n} {color.upper()} EMERGING pairs (delta_30d)",
+        top_n=args.top_n
+    ))
+
+    jobs.append(plot_job(
+        "hist", os.path.join(args.plot_dir, f"{color}_delta30d_hist.png"),
+        merged["delta_30d"],
+        f"{color.upper()} delta_30d distribution",
+    ))
+
+    tmp = merged.copy()
+    tmp["rank_global"] = tmp["score_global"].rank(ascending=False, method="min")
+    tmp["rank_30d"] = tmp["score_30d"].rank(ascending=False, method="min")
+    jobs.append(plot_job(
+        "scatter", os.path.join(args.plot_dir, f"{color}_rank_change_global_vs_30d.png"),
+        tmp["rank_global"], tmp["rank_30d"],
+        f"{color.upper()} rank change: global vs 30d",
+        xlabel="Global rank (lower=better)", ylabel="30d rank (lower=better)"
+    ))
+    return jobs
+
+
+def add_input_args(ap):
+    # HTML input modes
+    ap.add_argument("--html-file", help="Path to a saved 2by2 results HTML page")
+    ap.add_argument("--html-glob", help=r'Glob for saved HTML pages, e.g. "C:\...\2by2_pg_*.html"')
 
-    temporal_df = build_temporal_features(df_draws, color, decay)
+    ap.add_argument("--parser", choices=sorted(PARSERS), default=DEFAULT_PARSER,
+                    help="HTML parser backend (fast = tag scanner without BeautifulSoup)")
+    ap.add_argument("--parse-workers", type=int, default=1,
+                    help="Parse --html-glob pages in a process pool of this size (0 = one per CPU)")
 
-    merged = score_df.merge(temporal_df, on=["color", "pair"], how="left")
+    # Parsed-draw cache
+    ap.add_argument("--cache-dir", default=DEFAULT_CACHE_DIR, help="Where parsed pages are cached")
+    ap.add_argument("--no-cache", action="store_true", help="Parse every page, ignoring the cache")
+    ap.add_argument("--rebuild-cache", action="store_true", help="Discard the cache and re-parse every page")
+    # Not a flag: batch runs share cache dirs across processes and prune once afterwards
+    ap.set_defaults(prune_cache=True)
 
-    # Fill numeric NaNs only (avoid categorical 'confidence' blowing up)
-    num_cols = merged.select_dtypes(include=["number"]).columns
-    merged[num_cols] = merged[num_cols].fillna(0.0)
+    # Draw ledger
+    ap.add_argument("--from-ledger", help="Read draws from this SQLite draw ledger (created if missing); "
+                                          "with --html-glob/--html-file, unseen dates are added to it first")
+    ap.add_argument("--since", help="With --from-ledger: first draw date to read (YYYY-MM-DD)")
+    ap.add_argument("--until", help="With --from-ledger: last draw date to read (YYYY-MM-DD)")
 
-    # Optional: fill trend/confidence if missing (should rarely happen)
-    if "trend" in merged.columns:
-        merged["trend"] = merged["trend"].fillna("STABLE")
-    if "confidence" in merged.columns:
-        merged["confidence"] = merged["confidence"].cat.add_categories(["UNKNOWN"]).fillna("UNKNOWN")
 
-    return merged, freq, weighted, chi
+def load_draws(args, prof):
+    """Parse the --html-glob / --html-file input (or read --from-ledger) into a sorted, de-duplicated draw frame."""
+    if not (args.html_glob or args.html_file or args.from_ledger):
+        raise SystemExit(
+            "You must provide --html-glob, --html-file or --from-ledger.\n"
+            "Example:\n"
+            '  python main.py --html-glob "C:\\Users\\12242\\powerball_2by2\\2by2_pg_*.html" --out run1'
+        )
+    if args.from_ledger:
+        return load_ledger(args, prof)
+    with prof.stage("load"):
+        cache = None if args.no_cache else DrawCache(args.cache_dir, rebuild=args.rebuild_cache)
+        if args.html_glob:
+            df = parse_glob(args.html_glob, cache=cache, workers=args.parse_workers, parser=args.parser)
+        else:
+            if cache is None:
+                df = parse_file(args.html_file, parser=args.parser)
+            else:
+                df = cache.parse_file(args.html_file, parser=args.parser)
+
+        if cache is not None:
+            if args.prune_cache:
+                cache.prune()
+            cache.save()
+            prof.count("pages_cached", cache.hits)
+            prof.count("pages_parsed", cache.misses)
+            print(f"[+] Page cache: {cache.hits} hits, {cache.misses} parsed")
+
+    # parse_glob / parse_file already return draws sorted by date with duplicates dropped
+    if "date" not in df.columns:
+        raise RuntimeError("Parsed dataframe missing 'date' column.")
+    return df
+
+
+def load_ledger(args, prof):
+    """Add any --html-glob / --html-file pages to the --from-ledger ledger, then read its draws."""
+    from ledger import DrawLedger
+
+    with prof.stage("load"), DrawLedger(args.from_ledger) as ledger:
+        if args.html_glob or args.html_file:
+            if args.html_glob:
+                paths = sorted(glob.glob(os.path.expandvars(os.path.expanduser(args.html_glob))))
+                if not paths:
+                    raise FileNotFoundError(f"No files matched glob: {args.html_glob}")
+            else:
+                paths = [args.html_file]
+            synced = ledger.sync(paths, parser=args.parser)
+            prof.count("pages_skipped", synced["pages_skipped"])
+            prof.count("cards_parsed", synced["cards_parsed"])
+            print(f"[+] Ledger sync: {synced['pages']} pages ({synced['pages_skipped']} already known), "
+                  f"{synced['cards_parsed']} cards parsed, {synced['added']} new draws")
+            if synced["added_on_known_dates"]:
+                print(f"[!] {synced['added_on_known_dates']} new draws were on dates the ledger already had: "
+                      "this history has several draws per date")
+        df = ledger.draws(since=args.since, until=args.until)
+    if df.empty:
+        raise RuntimeError(f"No draws in ledger {args.from_ledger} for the requested dates")
+    return df
+
+
+def load_rules_or_empty(path, columns=FEATURE_COLUMNS):
+    try:
+        return load_rules(path, columns=columns)
+    except FileNotFoundError:
+        print(f"[!] rules file not found: {path} (continuing with zero rules)")
+        return compile_rules([])
+
+
+def feature_columns(config):
+    """Numeric columns this run's pair feature tables will have, which rules may test."""
+    columns = list(FEATURE_COLUMNS)
+    if config.mc_replicates > 0:
+        columns.append(PAIR_P_COLUMN)
+    if config.bootstrap > 0:
+        columns += CI_COLUMNS
+    return columns
+
+
+def decay_sweep(draws, decays, rules, args, prof):
+    """
+    --decay with several values: one pass computes the windows for every
+    decay, then each value gets its own feature set under <out>_decay<value>.
+    Window stats do not depend on decay and are written once.
+    """
+    with prof.stage("windows", rows=len(draws) * len(decays)):
+        sweep = compute_decay_sweep(draws, decays)
+
+    stats_exporter = Exporter(args.out, fmt=args.format, dataset=args.dataset)
+    stats_exporter.write("stats_windows", pd.DataFrame(stats_window_rows(sweep[decays[0]])))
+
+    written = []
+    for decay in decays:
+        exporter = Exporter(f"{args.out}_decay{decay:g}", fmt=args.format, dataset=args.dataset)
+        outputs, hits = [], []
+        for color in ["red", "white"]:
+            with prof.stage(f"enrich.{color}", rows=len(draws)):
+                merged = enrich_with_facts(draws, color, decay=decay, windows=sweep[decay], weights=args.weights)
+            if rules:
+                with prof.stage("rules", rows=len(merged) * len(rules)):
+                    hits.append(evaluate_rules_df(merged, rules, color))
+            exporter.write(f"{color}_pair_features", merged)
+            exporter.write_top(color, merged, 25)
+            outputs.append(merged)
+        exporter.concat("ALL_pair_features", [f"{c}_pair_features" for c in ["red", "white"]], outputs)
+        exporter.write("rule_hits", pd.concat(hits, ignore_index=True) if hits else pd.DataFrame())
+        with prof.stage("export_wait"):
+            written.append(exporter.close())
+        prof.record("export", exporter.write_seconds, rows=exporter.rows)
+    with prof.stage("export_wait"):
+        stats_paths = stats_exporter.close()
+    prof.record("export", stats_exporter.write_seconds, rows=stats_exporter.rows)
+
+    print(f"[+] Decay sweep: {len(decays)} values")
+    key = "dataset" if args.dataset else "stats_windows"
+    print(f"    - Window stats: {stats_paths[key]}")
+    out = dict(stats_paths)
+    for decay, paths in zip(decays, written):
+        key = "dataset" if args.dataset else "ALL_pair_features"
+        print(f"    - decay={decay:g}: {paths[key]}")
+        out.update({f"decay{decay:g}_{name}": path for name, path in paths.items()})
+    return out
+
+
+def _weights(text):
+    parts = text.split(",")
+    try:
+        weights = tuple(float(w) for w in parts)
+    except ValueError:
+        weights = ()
+    if len(weights) != 3:
+        raise argparse.ArgumentTypeError(f"expected three comma-separated weights, got {text!r}")
+    return weights
+
+
+def _number_list(kind):
+    def parse(text):
+        try:
+            values = [kind(v) for v in text.split(",") if v.strip()]
+        except ValueError:
+            values = []
+        if not values or min(values) <= 0:
+            raise argparse.ArgumentTypeError(f"expected positive comma-separated values, got {text!r}")
+        return values
+    return parse
+
+
+def _finish_profile(prof, args):
+    if not prof.enabled:
+        return
+    path = args.profile_out or f"{args.out}_profile.json"
+    prof.write(path)
+    print(prof.summary())
+    print(f"    - Profile:      {path}")
+    if args.profile_pstats:
+        print(f"    - pstats:       {args.profile_pstats}/")
+
+
+def _import_profiled(args):
+    """Re-run this command under `python -X importtime` and report where startup time went."""
+    import json
+    import subprocess
+
+    proc = subprocess.run([sys.executable, "-X", "importtime"] + sys.argv, stderr=subprocess.PIPE, text=True)
+    rows, other = parse_importtime(proc.stderr)
+    if other:
+        print("\n".join(other), file=sys.stderr)
+    path = f"{args.out}_imports.json"
+    with open(path, "w") as f:
+        json.dump({"modules": rows}, f, indent=1)
+    print(import_summary(rows))
+    print(f"    - Imports:      {path}")
+    return proc.returncode
+
+
+def serve(argv):
+    ap = argparse.ArgumentParser(prog="main.py serve",
+                                 description="Keep the pair feature tables in memory and answer queries over HTTP")
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=8765)
+    ap.add_argument("--socket", help="Listen on this Unix socket path instead of host:port")
+    ap.add_argument("--rules", default="rules.yaml")
+    ap.add_argument("--decay", type=float, default=0.98)
+    ap.add_argument("--state", help="Pair-state .npz to start from; ingested draws are saved back to it")
+    add_input_args(ap)
+    args = ap.parse_args(argv)
 
+    from server import AnalysisService, run
 
+    if args.state and os.path.isfile(args.state):
+        state = PairState.load(args.state, decay=args.decay)
+    else:
+        state = PairState(decay=args.decay)
+    if args.html_glob or args.html_file or args.from_ledger:
+        added = state.update(load_draws(args, Profiler()))
+        print(f"[+] Loaded {added} new draws, {len(state)} total")
+        if args.state:
+            state.save(args.state)
+    if not len(state):
+        raise SystemExit("serve needs --html-glob, --html-file, --from-ledger or an existing --state")
 
-def main():
-    ap = argparse.ArgumentParser(description="Powerball 2by2 analysis pipeline (HTML mode)")
+    service = AnalysisService(state, load_rules_or_empty(args.rules), state_path=args.state, parser=args.parser)
+    run(service, host=args.host, port=args.port, socket_path=args.socket)
+
+
+def batch(argv):
+    ap = argparse.ArgumentParser(prog="main.py batch",
+                                 description="Run every job in a YAML manifest, skipping those whose outputs are current")
+    ap.add_argument("manifest", help="YAML file with `defaults:` and a `jobs:` list of pipeline settings")
+    ap.add_argument("--workers", type=int, default=1, help="Run this many jobs at a time in a process pool")
+    ap.add_argument("--force", action="store_true", help="Re-run jobs even if their outputs are current")
+    args = ap.parse_args(argv)
+
+    from batch import load_manifest, run_batch
+
+    try:
+        jobs = load_manifest(args.manifest)
+    except (ValueError, OSError) as e:  # batch raises main.ConfigError, not __main__.ConfigError
+        ap.error(str(e))
+    start = time.perf_counter()
+    status = run_batch(jobs, workers=args.workers, force=args.force)
+    counts = {s: sum(v == s for v in status.values()) for s in ("done", "skipped", "failed")}
+    print(f"[+] Batch: {counts['done']} run, {counts['skipped']} skipped, {counts['failed']} failed "
+          f"in {time.perf_counter() - start:.1f}s")
+    return 1 if counts["failed"] else 0
+
+
+class ConfigError(ValueError):
+    """An invalid combination of pipeline settings."""
+
+
+class _RaisingParser(argparse.ArgumentParser):
+    def error(self, message):
+        raise ConfigError(message)
+
+
+def build_parser(exit_on_error: bool = True):
+    """
+    The pipeline's argument parser; its namespace is the config run_pipeline
+    takes. With exit_on_error=False bad arguments raise ConfigError instead
+    (for configs that do not come from the command line, e.g. batch manifests).
+    """
+    parser_class = argparse.ArgumentParser if exit_on_error else _RaisingParser
+    ap = parser_class(description="Powerball 2by2 analysis pipeline (HTML mode)")
     ap.add_argument("--out", default="output")
+    ap.add_argument("--format", choices=FORMATS, default=DEFAULT_FORMAT,
+                    help="Output table format (parquet/feather need pyarrow)")
+    ap.add_argument("--dataset", action="store_true",
+                    help="Write the tables as one dataset directory <out>_dataset/table=<name>/, "
+                         "partitioned by table")
     ap.add_argument("--rules", default="rules.yaml")
-    ap.add_argument("--decay", type=float, default=0.98)
-
-    # HTML input modes
-    ap.add_argument("--html-file", help="Path to a saved 2by2 results HTML page")
-    ap.add_argument("--html-glob", help=r'Glob for saved HTML pages, e.g. "C:\...\2by2_pg_*.html"')
+    ap.add_argument("--decay", default="0.98",
+                    help="Decay per day for weighted scores; a comma-separated list (e.g. "
+                         "0.95,0.97,0.98,0.99) runs a sweep writing one feature set per value")
+    ap.add_argument("--weights", type=_weights, default=DEFAULT_WEIGHTS,
+                    help="Composite score weights for frequency, weighted score and chi-square "
+                         "(default 0.4,0.4,0.2)")
+    ap.add_argument("--engine", choices=ENGINES, default="numpy",
+                    help="Counting engine for metrics (python = original row loops, for comparison)")
+
+    add_input_args(ap)
+    ap.add_argument("--check-parser", action="store_true",
+                    help="Parse the input pages with every backend, report mismatches and exit")
 
     # Plots
     ap.add_argument("--plots", action="store_true")
     ap.add_argument("--plot-dir", default="plots")
     ap.add_argument("--top-n", type=int, default=10)
+    ap.add_argument("--plot-workers", type=int, default=1,
+                    help="Render plots in a process pool of this size")
+    ap.add_argument("--replot", action="store_true",
+                    help="Re-render every plot even if its input data is unchanged")
 
     # ML
     ap.add_argument("--ml", action="store_true")
     ap.add_argument("--eps", type=float, default=0.8)
     ap.add_argument("--min-samples", type=int, default=8)
+    ap.add_argument("--eps-grid", type=_number_list(float),
+                    help="With --ml, also sweep these eps values (e.g. 0.5,0.8,1.2) and write "
+                         "<out>_<color>_ml_sweep with cluster count, noise and silhouette per setting")
+    ap.add_argument("--min-samples-grid", type=_number_list(int),
+                    help="min_samples values for the sweep (default: --min-samples)")
+    ap.add_argument("--ml-workers", type=int, default=1, help="Threads for the DBSCAN sweep grid")
+
+    # Backtest mode
+    ap.add_argument("--rolling-windows", help="Backtest mode: comma-separated window lengths in days, "
+                                              "e.g. 7,30,90; writes <out>_rolling_scores.csv and exits")
+    ap.add_argument("--step", default="1d", help="Spacing between backtest evaluation dates (e.g. 1d, 7d, 2w)")
+    ap.add_argument("--rolling-chunk", type=int, default=DEFAULT_CHUNK,
+                    help="Evaluation dates computed and written per chunk")
+
+    # Profiling
+    ap.add_argument("--profile", action="store_true",
+                    help="Time each stage; prints a summary and writes <out>_profile.json")
+    ap.add_argument("--profile-out", help="Path for the JSON timing report (default <out>_profile.json)")
+    ap.add_argument("--profile-pstats", metavar="DIR",
+                    help="With --profile, also dump a cProfile .pstats file per stage into DIR")
+    ap.add_argument("--import-profile", action="store_true",
+                    help="Run under `python -X importtime`; prints the slowest imports and "
+                         "writes <out>_imports.json")
+
+    # Joint red x white analysis
+    ap.add_argument("--joint", action="store_true",
+                    help="Also write red x white combination stats/top-K and single-number marginals")
+    ap.add_argument("--joint-top", type=int, default=25, help="Combinations per window in <out>_joint_top")
+
+    # Monte Carlo null
+    ap.add_argument("--mc-replicates", type=int, default=0,
+                    help="Simulate this many uniform histories per window size and add empirical "
+                         "p-value (*_p_mc) columns to the stats and pair feature tables (0 = off)")
+    ap.add_argument("--mc-workers", type=int, default=1, help="Process pool size for the simulation")
+    ap.add_argument("--mc-seed", type=int, default=0, help="Base seed; results do not depend on --mc-workers")
+    ap.add_argument("--mc-cache-dir", default=MC_CACHE_DIR,
+                    help="Simulated null distributions are cached here by window size and replicate count")
+
+    # Bootstrap confidence intervals
+    ap.add_argument("--bootstrap", type=int, default=0,
+                    help="Resample the draws this many times and add <column>_ci_low/_ci_high columns "
+                         "to the pair feature tables (0 = off)")
+    ap.add_argument("--bootstrap-block", type=int, default=1,
+                    help="Resample runs of this many consecutive draws (block bootstrap; 1 = single draws)")
+    ap.add_argument("--bootstrap-level", type=float, default=DEFAULT_LEVEL, help="Interval coverage")
+    ap.add_argument("--bootstrap-workers", type=int, default=1, help="Process pool size for the replicates")
+    ap.add_argument("--bootstrap-seed", type=int, default=0,
+                    help="Base seed; results do not depend on --bootstrap-workers")
+
+    # Incremental state
+    ap.add_argument("--state", help="Path to a saved pair-state .npz; new draws are folded into it "
+                                    "instead of recomputing the full history (created if missing)")
+
+    # Binary draw archive
+    ap.add_argument("--archive", help="Read draws from a memory-mapped draw archive instead of HTML")
+    ap.add_argument("--write-archive", metavar="PATH", help="Also save the loaded draws as a draw archive")
+
+    return ap
+
+
+def check_config(config):
+    """
+    Validate a parsed config and fill in derived fields: `decays` (with
+    `decay` set to the first value) and `rule_set`, the compiled --rules.
+    Raises ConfigError.
+    """
+    try:
+        require_format(config.format)
+    except ImportError as e:
+        raise ConfigError(str(e)) from None
+    try:
+        decays = parse_decays(config.decay)
+    except ValueError as e:
+        raise ConfigError(str(e)) from None
+    config.decays = decays
+    config.decay = decays[0]
+    if not (config.html_glob or config.html_file or config.archive or config.from_ledger):
+        raise ConfigError("an input is required: --html-glob, --html-file, --from-ledger or --archive")
+    if config.archive and config.from_ledger:
+        raise ConfigError("--archive and --from-ledger are separate draw sources; pick one")
+    if (config.since or config.until) and not config.from_ledger:
+        raise ConfigError("--since / --until select dates from --from-ledger")
+    for bound in (config.since, config.until):
+        if bound is not None:
+            try:
+                pd.Timestamp(bound)
+            except ValueError:
+                raise ConfigError(f"invalid date: {bound!r} (expected YYYY-MM-DD)") from None
+    if config.archive and (config.state or config.engine == "python"):
+        raise ConfigError("--archive is read in chunks by the numpy engine; it cannot be combined "
+                          "with --state or --engine python")
+    if (config.eps_grid or config.min_samples_grid) and not config.ml:
+        raise ConfigError("--eps-grid / --min-samples-grid need --ml")
+    if not 0 < config.bootstrap_level < 1:
+        raise ConfigError("--bootstrap-level must be between 0 and 1")
+    if len(decays) > 1 and (config.state or config.engine == "python" or config.rolling_windows
+                            or config.plots or config.ml or config.mc_replicates or config.joint
+                            or config.bootstrap):
+        raise ConfigError("a --decay sweep writes feature tables only; it cannot be combined with --state, "
+                          "--engine python, --rolling-windows, --plots, --ml, --mc-replicates, --joint "
+                          "or --bootstrap")
+    # Rules are checked against the columns this run writes before any data is read
+    try:
+        config.rule_set = load_rules_or_empty(config.rules, columns=feature_columns(config))
+    except ValueError as e:
+        raise ConfigError(str(e)) from None
+    return config
 
-    args = ap.parse_args()
+
+def run_pipeline(config) -> dict:
+    """
+    One full analysis run for a config from build_parser (checked with
+    check_config): load, score, export. Returns {table name: path} for the
+    files written.
+    """
+    set_engine(config.engine)
+    prof = Profiler(enabled=config.profile, pstats_dir=config.profile_pstats)
 
     # --- Load data ---
-    if args.html_glob:
-        df = parse_glob(args.html_glob)
-    elif args.html_file:
-        df = parse_file(args.html_file)
+    state = None
+    if config.archive:
+        df = None
+        draws = DrawArchive(config.archive)
     else:
-        raise SystemExit(
-            "You must provide --html-glob or --html-file.\n"
-            "Example:\n"
-            '  python main.py --html-glob "C:\\Users\\12242\\powerball_2by2\\2by2_pg_*.html" --out run1'
-        )
-
-    # Normalize + de-dupe (important when you stitch many pages)
-    if "date" not in df.columns:
-        raise RuntimeError("Parsed dataframe missing 'date' column.")
-    df["date"] = pd.to_datetime(df["date"])
-    df = df.sort_values("date").drop_duplicates(subset=["date", "r1", "r2", "w1", "w2"]).reset_index(drop=True)
-
-    print(f"[+] Parsed draws: {len(df)} (min={df.date.min().date()} max={df.date.max().date()})")
+        df = load_draws(config, prof)
+
+    if config.state:
+        with prof.stage("state_update", rows=len(df)):
+            if os.path.isfile(config.state):
+                state = PairState.load(config.state, decay=config.decay)
+            else:
+                state = PairState(decay=config.decay)
+            added = state.update(df)
+            state.save(config.state)
+            print(f"[+] State {config.state}: {added} new draws, {len(state)} total")
+            df = state.draws()
+
+    # Compact sorted arrays for the counting stages; df stays for the row-loop engine
+    if df is not None:
+        draws = state.store() if state is not None else DrawStore.from_frame(df)
+    prof.count("draws", len(draws))
+
+    if config.write_archive:
+        with prof.stage("write_archive", rows=len(draws)):
+            write_archive(config.write_archive, draws)
+        print(f"[+] Archive: {len(draws)} draws -> {config.write_archive}")
+
+    print(f"[+] Parsed draws: {len(draws)} (min={draws.min_date.date()} max={draws.max_date.date()})")
+
+    # --- Backtest mode ---
+    if config.rolling_windows:
+        windows = parse_windows(config.rolling_windows)
+        out_path = f"{config.out}_rolling_scores.csv"
+        with prof.stage("backtest", rows=len(draws)):
+            rows = write_rolling(draws, out_path, windows, decay=config.decay, step=parse_step(config.step),
+                                 chunk=config.rolling_chunk, weights=config.weights)
+        print(f"[+] Rolling scores: {rows} rows -> {out_path}")
+        _finish_profile(prof, config)
+        return {"rolling_scores": out_path}
 
     # --- Rules ---
-    try:
-        rules = load_rules(args.rules)
-    except FileNotFoundError:
-        print(f"[!] rules file not found: {args.rules} (continuing with zero rules)")
-        rules = []
+    rules = config.rule_set
+
+    if len(config.decays) > 1:
+        paths = decay_sweep(draws, config.decays, rules, config, prof)
+        _finish_profile(prof, config)
+        return paths
 
+    # Tables are written in the background while the next stage computes
+    exporter = Exporter(config.out, fmt=config.format, dataset=config.dataset)
     all_outputs = []
+    all_plot_jobs = []
     all_rule_hits = []
     all_stats_rows = []
 
+    # One pass over the draws serves the stats windows and both colors' features
+    with prof.stage("windows", rows=len(draws)):
+        if state is not None:
+            windows = state.window_counts()
+        elif config.engine == "python":
+            windows = None  # original per-window recomputation, for comparison
+        else:
+            windows = compute_windows(draws, config.decay)
+
     # --- Step 5: window-level stats ---
-    support = all_pairs_support()
-    for days in [None, 365, 90, 30]:
-        sub = get_window_df(df, days)
-        red_freq, white_freq = pair_frequencies(sub)
-        for color, freq in [("red", red_freq), ("white", white_freq)]:
-            s = window_stats(freq, support)
-            all_stats_rows.append({
-                "window": "global" if days is None else f"{days}d",
-                "color": color,
-                **s
-            })
+    with prof.stage("stats_windows", rows=len(draws)):
+        if windows is not None:
+            all_stats_rows = stats_window_rows(windows)
+        else:
+            support = all_pairs_support()
+            for days in [None, 365, 90, 30]:
+                sub = get_window_df(df, days)
+                red_freq, white_freq = pair_frequencies(sub)
+                for color, freq in [("red", red_freq), ("white", white_freq)]:
+                    s = window_stats(freq, support)
+                    all_stats_rows.append({
+                        "window": "global" if days is None else f"{days}d",
+                        "color": color,
+                        **s
+                    })
 
     stats_windows_df = pd.DataFrame(all_stats_rows)
-    stats_windows_df.to_csv(f"{args.out}_stats_windows.csv", index=False)
+
+    # --- Monte Carlo null: one simulation per distinct window size ---
+    nulls = {}
+    if config.mc_replicates > 0:
+        sizes = sorted({int(n) for n in stats_windows_df["total"] if n > 0})
+        with prof.stage("montecarlo", rows=len(sizes) * config.mc_replicates):
+            for n in sizes:
+                nulls[n] = null_distribution(n, config.mc_replicates, seed=config.mc_seed,
+                                             workers=config.mc_workers, cache_dir=config.mc_cache_dir)
+            stats_windows_df = add_stats_pvalues(stats_windows_df, nulls)
+        print(f"[+] Monte Carlo null: {config.mc_replicates} replicates x {len(sizes)} window sizes")
+    exporter.write("stats_windows", stats_windows_df)
+
+    # --- Joint red x white combinations and single-number marginals ---
+    if config.joint:
+        from joint import joint_windows, joint_stats_rows, joint_top_table, number_marginals
+        with prof.stage("joint", rows=len(draws)):
+            joint = joint_windows(draws)
+            exporter.write("joint_stats_windows", pd.DataFrame(joint_stats_rows(joint)))
+            exporter.write("joint_top", joint_top_table(joint, config.joint_top))
+            exporter.write("number_marginals", number_marginals(draws))
+        prof.count("joint_cells", len(joint[None]))
+
+    # --- Bootstrap intervals: both colors and every window in one set of replicates ---
+    ci = None
+    if config.bootstrap > 0:
+        with prof.stage("bootstrap", rows=len(draws) * config.bootstrap):
+            ci = bootstrap_ci(draws, config.decay, config.bootstrap, block=config.bootstrap_block,
+                              level=config.bootstrap_level, weights=config.weights, seed=config.bootstrap_seed,
+                              workers=config.bootstrap_workers)
+        print(f"[+] Bootstrap: {config.bootstrap} replicates, block {config.bootstrap_block}, "
+              f"{config.bootstrap_level:.0%} intervals")
 
     # --- Pair-level features for red + white ---
     for color in ["red", "white"]:
-        merged, freq, weighted, chi = enrich_with_facts(df, color, decay=args.decay)
-
-        # Rule hits (using raw facts)
+        with prof.stage(f"enrich.{color}", rows=len(draws)):
+            merged = enrich_with_facts(df if windows is None else draws, color,
+                                       decay=config.decay, windows=windows, weights=config.weights)
+            if len(draws) in nulls:
+                merged = add_pair_pvalues(merged, nulls[len(draws)])
+            if ci is not None:
+                merged = add_ci_columns(merged, ci, color)
+
+        # Rule hits: every rule evaluated over the whole table at once
         if rules:
-            for _, row in merged.iterrows():
-                facts = {
-                    "frequency": float(row["frequency"]),
-                    "weighted_score": float(row["weighted_score"]),
-                    "chi_square": float(row["chi_square"]),
-                }
-                all_rule_hits.extend(evaluate_rules(color, row["pair"], facts, rules))
-
-        merged.to_csv(f"{args.out}_{color}_pair_features.csv", index=False)
-        all_outputs.append(merged)
+            with prof.stage("rules", rows=len(merged) * len(rules)):
+                hits = evaluate_rules_df(merged, rules, color)
+            prof.count("rule_hits", len(hits))
+            all_rule_hits.append(hits)
 
+        exporter.write(f"{color}_pair_features", merged)
         # Convenience exports
-        merged.sort_values("composite_score", ascending=False).head(25)\
-            .to_csv(f"{args.out}_{color}_top25_global.csv", index=False)
-        merged.sort_values("delta_30d", ascending=False).head(25)\
-            .to_csv(f"{args.out}_{color}_top25_emerging.csv", index=False)
-        merged.sort_values("delta_30d", ascending=True).head(25)\
-            .to_csv(f"{args.out}_{color}_top25_fading.csv", index=False)
+        exporter.write_top(color, merged, 25)
+        all_outputs.append(merged)
 
         # --- Plots ---
-        if args.plots:
-            from viz import ensure_dir, plot_heatmap, plot_bar, plot_hist, plot_scatter
-            ensure_dir(args.plot_dir)
-
-            heat = cooccurrence_matrix(df, color=color)
-            plot_heatmap(
-                heat,
-                f"{color.upper()} pair co-occurrence heatmap",
-                os.path.join(args.plot_dir, f"heatmap_{color}.png")
-            )
-
-            top_freq = merged.sort_values("frequency", ascending=False)[["pair", "frequency"]]\
-                             .rename(columns={"frequency": "value"})
-            plot_bar(
-                top_freq,
-                f"Top {args.top_n} {color.upper()} pairs by frequency (global)",
-                os.path.join(args.plot_dir, f"top_{color}_frequency.png"),
-                top_n=args.top_n
-            )
-
-            top_delta = merged.sort_values("delta_30d", ascending=False)[["pair", "delta_30d"]]\
-                              .rename(columns={"delta_30d": "value"})
-            plot_bar(
-                top_delta,
-                f"Top {args.top_n} {color.upper()} EMERGING pairs (delta_30d)",
-                os.path.join(args.plot_dir, f"top_{color}_emerging_delta30d.png"),
-                top_n=args.top_n
-            )
-
-            plot_hist(
-                merged["delta_30d"],
-                f"{color.upper()} delta_30d distribution",
-                os.path.join(args.plot_dir, f"{color}_delta30d_hist.png")
-            )
-
-            tmp = merged.copy()
-            tmp["rank_global"] = tmp["score_global"].rank(ascending=False, method="min")
-            tmp["rank_30d"] = tmp["score_30d"].rank(ascending=False, method="min")
-            plot_scatter(
-                tmp["rank_global"], tmp["rank_30d"],
-                f"{color.upper()} rank change: global vs 30d",
-                os.path.join(args.plot_dir, f"{color}_rank_change_global_vs_30d.png"),
-                "Global rank (lower=better)", "30d rank (lower=better)"
-            )
+        if config.plots:
+            with prof.stage("plot_jobs"):
+                all_plot_jobs.extend(plot_jobs(draws, merged, color, config))
 
         # --- ML (DBSCAN) ---
-        if args.ml:
-            clustered, used_features = run_dbscan(merged, eps=args.eps, min_samples=args.min_samples)
-            clustered.to_csv(f"{args.out}_{color}_ml_dbscan.csv", index=False)
-
-            summary = cluster_summary(clustered)
-            summary.to_csv(f"{args.out}_{color}_ml_clusters_summary.csv", index=False)
+        if config.ml:
+            with prof.stage(f"ml.{color}", rows=len(merged)):
+                from ml import run_dbscan, cluster_summary  # sklearn is only paid for with --ml
+                clustered, used_features = run_dbscan(merged, eps=config.eps, min_samples=config.min_samples)
+                summary = cluster_summary(clustered)
+            exporter.write(f"{color}_ml_dbscan", clustered)
+            exporter.write(f"{color}_ml_clusters_summary", summary)
+            if config.eps_grid or config.min_samples_grid:
+                from ml import dbscan_sweep
+                eps_grid = config.eps_grid or [config.eps]
+                ms_grid = config.min_samples_grid or [config.min_samples]
+                with prof.stage(f"ml_sweep.{color}", rows=len(merged) * len(eps_grid) * len(ms_grid)):
+                    sweep = dbscan_sweep(merged, eps_grid, ms_grid, workers=config.ml_workers)
+                exporter.write(f"{color}_ml_sweep", sweep)
+
+    # --- Plots: one batch for both colors ---
+    if all_plot_jobs:
+        from viz import render_jobs
+        with prof.stage("plots", rows=len(all_plot_jobs)):
+            rendered, skipped = render_jobs(all_plot_jobs, config.plot_dir, workers=config.plot_workers,
+                                            force=config.replot)
+        print(f"[+] Plots: {rendered} rendered, {skipped} unchanged")
 
     # --- Combined exports ---
-    all_features = pd.concat(all_outputs, ignore_index=True)
-    all_features.to_csv(f"{args.out}_ALL_pair_features.csv", index=False)
-
-    pd.DataFrame(all_rule_hits).to_csv(f"{args.out}_rule_hits.csv", index=False)
+    rule_hits = pd.concat(all_rule_hits, ignore_index=True) if all_rule_hits else pd.DataFrame()
+    exporter.concat("ALL_pair_features", [f"{c}_pair_features" for c in ["red", "white"]], all_outputs)
+    exporter.write("rule_hits", rule_hits)
+    with prof.stage("export_wait"):
+        paths = exporter.close()
+    # The writes themselves ran on the exporter thread, overlapping the stages above
+    prof.record("export", exporter.write_seconds, rows=exporter.rows)
 
     print("[+] Done.")
-    print(f"    - Window stats: {args.out}_stats_windows.csv")
-    print(f"    - Rule hits:    {args.out}_rule_hits.csv")
-    print(f"    - Pair feats:   {args.out}_red_pair_features.csv, {args.out}_white_pair_features.csv")
-    if args.ml:
-        print(f"    - ML outputs:   {args.out}_*_ml_dbscan.csv and {args.out}_*_ml_clusters_summary.csv")
-    if args.plots:
-        print(f"    - Plots dir:    {args.plot_dir}/")
+    if config.dataset:
+        print(f"    - Dataset:      {paths['dataset']} (partitioned by `table`)")
+    else:
+        print(f"    - Window stats: {paths['stats_windows']}")
+        print(f"    - Rule hits:    {paths['rule_hits']}")
+        print(f"    - Pair feats:   {paths['red_pair_features']}, {paths['white_pair_features']}")
+        if config.joint:
+            print(f"    - Joint:        {paths['joint_stats_windows']}, {paths['joint_top']}, "
+                  f"{paths['number_marginals']}")
+        if config.ml:
+            ext = EXTENSIONS[config.format]
+            print(f"    - ML outputs:   {config.out}_*_ml_dbscan{ext} and {config.out}_*_ml_clusters_summary{ext}")
+            if config.eps_grid or config.min_samples_grid:
+                print(f"    - ML sweep:     {paths['red_ml_sweep']}, {paths['white_ml_sweep']}")
+    if config.plots:
+        print(f"    - Plots dir:    {config.plot_dir}/")
+    _finish_profile(prof, config)
+    return paths
+
+
+def main():
+    if sys.argv[1:2] == ["serve"]:
+        return serve(sys.argv[2:])
+    if sys.argv[1:2] == ["batch"]:
+        raise SystemExit(batch(sys.argv[2:]))
+
+    ap = build_parser()
+    args = ap.parse_args()
+    if args.import_profile and "importtime" not in sys._xoptions:
+        raise SystemExit(_import_profiled(args))
+    if args.check_parser:
+        if args.html_glob:
+            paths = sorted(glob.glob(os.path.expandvars(os.path.expanduser(args.html_glob))))
+        else:
+            paths = [args.html_file] if args.html_file else []
+        if not paths:
+            raise SystemExit("--check-parser needs --html-glob or --html-file")
+        problems = check_parser_conformance(paths)
+        for msg in problems:
+            print(f"[!] {msg}")
+        print(f"[+] Parser check: {len(paths)} pages, {len(problems)} mismatches")
+        raise SystemExit(1 if problems else 0)
+
+    try:
+        check_config(args)
+    except ConfigError as e:
+        ap.error(str(e))
+    run_pipeline(args)
 
 
 if __name__ == "__main__":
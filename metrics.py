@@ -1,11 +1,156 @@
 from collections import Counter, defaultdict
 from itertools import combinations
+import numpy as np
 import pandas as pd
 
+N_NUMBERS = 26
+N_PAIRS = 325
+
+# "numpy" uses the batched bincount engine, "python" keeps the original
+# iterrows loops around so the two can be compared on the same input.
+ENGINE = "numpy"
+ENGINES = ("numpy", "python")
+
 def all_pairs_support():
     return list(combinations(range(1, 27), 2))  # 325 pairs
 
-def pair_frequencies(df: pd.DataFrame):
+SUPPORT = all_pairs_support()
+
+# PAIR_INDEX[a, b] -> position of the sorted pair (a, b) in SUPPORT
+PAIR_INDEX = np.full((N_NUMBERS + 1, N_NUMBERS + 1), -1, dtype=np.int16)
+for _i, (_a, _b) in enumerate(SUPPORT):
+    PAIR_INDEX[_a, _b] = _i
+    PAIR_INDEX[_b, _a] = _i
+PAIR_A = np.array([a for a, _ in SUPPORT], dtype=np.int8)
+PAIR_B = np.array([b for _, b in SUPPORT], dtype=np.int8)
+
+def set_engine(name: str):
+    global ENGINE
+    if name not in ENGINES:
+        raise ValueError(f"Unknown metrics engine: {name} (expected one of {ENGINES})")
+    ENGINE = name
+
+def _engine(engine):
+    engine = engine or ENGINE
+    if engine not in ENGINES:
+        raise ValueError(f"Unknown metrics engine: {engine} (expected one of {ENGINES})")
+    return engine
+
+def encode_pairs(x, y):
+    """Map ball columns to pair ids (0..324); -1 marks an invalid pair."""
+    x = np.asarray(x, dtype=np.int64)
+    y = np.asarray(y, dtype=np.int64)
+    valid = (x >= 1) & (x <= N_NUMBERS) & (y >= 1) & (y <= N_NUMBERS)
+    idx = np.full(x.shape, -1, dtype=np.int16)
+    idx[valid] = PAIR_INDEX[x[valid], y[valid]]
+    return idx
+
+# Counting functions take either a draw DataFrame or a draw_store.DrawStore,
+# which already holds day ordinals and pair ids as arrays. A
+# draw_archive.DrawArchive is counted chunk by chunk (see _chunks).
+
+def draw_pair_ids(df):
+    if not isinstance(df, pd.DataFrame):
+        return df.pair_ids[:, 0], df.pair_ids[:, 1]
+    return encode_pairs(df["r1"].values, df["r2"].values), encode_pairs(df["w1"].values, df["w2"].values)
+
+def day_ordinals(dates):
+    """Days since epoch as int64, so ages become plain integer differences."""
+    return pd.to_datetime(pd.Series(dates)).values.astype("datetime64[D]").astype(np.int64)
+
+def draw_days(df):
+    if not isinstance(df, pd.DataFrame):
+        return df.days.astype(np.int64)
+    return day_ordinals(df["date"])
+
+def _chunks(df):
+    return df.iter_chunks() if hasattr(df, "iter_chunks") else (df,)
+
+def _as_frame(df):
+    # The row-loop engine needs real rows
+    return df if isinstance(df, pd.DataFrame) else df.to_df()
+
+def _check_ids(idx, color):
+    if (idx < 0).any():
+        raise ValueError(f"{color} pair outside 1..{N_NUMBERS} or repeated ball in draw data")
+
+def _check_balls(balls, color):
+    if len(balls) and (balls.min() < 1 or balls.max() > N_NUMBERS):
+        raise ValueError(f"{color} ball outside 1..{N_NUMBERS} in draw data")
+
+def pair_counts(df: pd.DataFrame):
+    """Dense per-pair counts: two int64 arrays of length 325 (red, white)."""
+    red = np.zeros(N_PAIRS, dtype=np.int64)
+    white = np.zeros(N_PAIRS, dtype=np.int64)
+    for part in _chunks(df):
+        red_idx, white_idx = draw_pair_ids(part)
+        _check_ids(red_idx, "red")
+        _check_ids(white_idx, "white")
+        red += np.bincount(red_idx, minlength=N_PAIRS)
+        white += np.bincount(white_idx, minlength=N_PAIRS)
+    return red, white
+
+def decay_weights(days, decay: float, max_day=None):
+    days = np.asarray(days, dtype=np.int64)
+    if max_day is None:
+        max_day = days.max() if len(days) else 0
+    return np.power(float(decay), (max_day - days).astype(np.float64))
+
+def decay_table(decays, max_age: int):
+    """
+    decay ** age for ages 0..max_age, one row per decay value: (n_decays,
+    max_age + 1). Looking weights up by age gives the same floats as
+    decay_weights without a power per draw.
+    """
+    decays = np.asarray(decays, dtype=np.float64).reshape(-1, 1)
+    return np.power(decays, np.arange(max_age + 1, dtype=np.float64))
+
+DAY_BLOCK = 4096  # distinct days per (days, 325) histogram in weighted_pair_matrix
+
+def weighted_pair_matrix(pair_ids, days, table, max_day: int):
+    """
+    Decayed per-pair sums for every row of a decay_table at once: (n_decays,
+    325). Draws are binned into a (distinct days, 325) count histogram, so
+    each block of days costs one matrix product for all decay values.
+    """
+    pair_ids = np.asarray(pair_ids, dtype=np.int64)
+    days = np.asarray(days, dtype=np.int64)
+    out = np.zeros((table.shape[0], N_PAIRS))
+    if len(days) == 0:
+        return out
+    if (np.diff(days) < 0).any():
+        order = np.argsort(days, kind="stable")
+        days, pair_ids = days[order], pair_ids[order]
+    uniq, day_idx = np.unique(days, return_inverse=True)
+    ages = max_day - uniq
+    for lo in range(0, len(uniq), DAY_BLOCK):
+        hi = min(lo + DAY_BLOCK, len(uniq))
+        r0, r1 = np.searchsorted(day_idx, [lo, hi])
+        hist = np.bincount((day_idx[r0:r1] - lo) * N_PAIRS + pair_ids[r0:r1],
+                           minlength=(hi - lo) * N_PAIRS).reshape(hi - lo, N_PAIRS)
+        out += table[:, ages[lo:hi]] @ hist
+    return out
+
+def weighted_pair_sums(df: pd.DataFrame, decay: float = 0.98):
+    """Dense decayed sums: two float64 arrays of length 325 (red, white)."""
+    if len(df) == 0:
+        return np.zeros(N_PAIRS), np.zeros(N_PAIRS)
+    # Ages are measured from the latest draw; an archive knows it without a scan
+    max_day = df.max_day if hasattr(df, "iter_chunks") else None
+    red, white = np.zeros(N_PAIRS), np.zeros(N_PAIRS)
+    for part in _chunks(df):
+        red_idx, white_idx = draw_pair_ids(part)
+        _check_ids(red_idx, "red")
+        _check_ids(white_idx, "white")
+        w = decay_weights(draw_days(part), decay, max_day)
+        red += np.bincount(red_idx, weights=w, minlength=N_PAIRS)
+        white += np.bincount(white_idx, weights=w, minlength=N_PAIRS)
+    return red, white
+
+def counts_to_counter(counts) -> Counter:
+    return Counter({SUPPORT[i]: int(counts[i]) for i in np.flatnonzero(counts)})
+
+def _pair_frequencies_py(df: pd.DataFrame):
     red = Counter()
     white = Counter()
     for _, r in df.iterrows():
@@ -13,7 +158,13 @@ def pair_frequencies(df: pd.DataFrame):
         white.update([tuple(sorted((int(r.w1), int(r.w2))))])
     return red, white
 
-def weighted_scores(df: pd.DataFrame, decay: float = 0.98):
+def pair_frequencies(df: pd.DataFrame, engine=None):
+    if _engine(engine) == "python":
+        return _pair_frequencies_py(_as_frame(df))
+    red, white = pair_counts(df)
+    return counts_to_counter(red), counts_to_counter(white)
+
+def _weighted_scores_py(df: pd.DataFrame, decay: float = 0.98):
     scores = defaultdict(float)
     max_date = df["date"].max()
     for _, r in df.iterrows():
@@ -23,11 +174,75 @@ def weighted_scores(df: pd.DataFrame, decay: float = 0.98):
         scores[("white", tuple(sorted((int(r.w1), int(r.w2)))))] += w
     return scores
 
+def weighted_scores(df: pd.DataFrame, decay: float = 0.98, engine=None):
+    if _engine(engine) == "python":
+        return _weighted_scores_py(_as_frame(df), decay)
+    scores = defaultdict(float)
+    if len(df) == 0:
+        return scores
+    red_counts, white_counts = pair_counts(df)
+    red_w, white_w = weighted_pair_sums(df, decay)
+    # Only pairs that actually appear get a key, like the row loop
+    for i in np.flatnonzero(red_counts):
+        scores[("red", SUPPORT[i])] = float(red_w[i])
+    for i in np.flatnonzero(white_counts):
+        scores[("white", SUPPORT[i])] = float(white_w[i])
+    return scores
+
+N_JOINT = N_PAIRS * N_PAIRS
+
+def joint_counts(df):
+    """
+    Sparse red x white counts: each draw's pair ids become one key
+    red * 325 + white (0..105624), counted with np.unique, so memory follows
+    the combinations actually drawn. Returns (sorted keys, counts).
+    """
+    keys, counts = [], []
+    for part in _chunks(df):
+        red_idx, white_idx = draw_pair_ids(part)
+        _check_ids(red_idx, "red")
+        _check_ids(white_idx, "white")
+        k, c = np.unique(red_idx.astype(np.int32) * N_PAIRS + white_idx, return_counts=True)
+        keys.append(k)
+        counts.append(c)
+    if len(keys) <= 1:
+        return (keys[0], counts[0].astype(np.int64)) if keys else (np.empty(0, np.int32), np.empty(0, np.int64))
+    uniq, inv = np.unique(np.concatenate(keys), return_inverse=True)
+    return uniq, np.bincount(inv, weights=np.concatenate(counts)).astype(np.int64)
+
+def number_counts(df):
+    """Single-number marginals: (2, 27) int64 counts per color (column 0 unused)."""
+    out = np.zeros((2, N_NUMBERS + 1), dtype=np.int64)
+    for part in _chunks(df):
+        for c, cols in enumerate((("r1", "r2"), ("w1", "w2"))):
+            for col in cols:
+                balls = part[col].values if isinstance(part, pd.DataFrame) else part.column(col)
+                _check_balls(balls, ("red", "white")[c])
+                out[c] += np.bincount(balls.astype(np.int64), minlength=N_NUMBERS + 1)
+    return out
+
 def chi_square_per_pair(counter: Counter, total_draws: int):
     expected = total_draws / 325.0
     return {k: ((v - expected) ** 2) / expected for k, v in counter.items()}
 
-def cooccurrence_matrix(df: pd.DataFrame, color="red"):
+def cooccurrence_counts(df: pd.DataFrame, color="red"):
+    """Symmetric 27x27 count array (row/col 0 unused) built in one bincount."""
+    cols = ("r1", "r2") if color == "red" else ("w1", "w2")
+    size = N_NUMBERS + 1
+    counts = np.zeros(size * size, dtype=np.int64)
+    for part in _chunks(df):
+        if isinstance(part, pd.DataFrame):
+            a, b = part[cols[0]].values, part[cols[1]].values
+        else:
+            a, b = part.column(cols[0]), part.column(cols[1])
+        a, b = a.astype(np.int64), b.astype(np.int64)
+        _check_balls(a, color)
+        _check_balls(b, color)
+        flat = np.concatenate([a * size + b, b * size + a])
+        counts += np.bincount(flat, minlength=size * size)
+    return counts.reshape(size, size)
+
+def _cooccurrence_matrix_py(df: pd.DataFrame, color="red"):
     matrix = defaultdict(Counter)
     cols = ("r1", "r2") if color == "red" else ("w1", "w2")
 
@@ -42,3 +257,10 @@ def cooccurrence_matrix(df: pd.DataFrame, color="red"):
         for b, v in matrix[a].items():
             out.loc[a, b] = int(v)
     return out
+
+def cooccurrence_matrix(df: pd.DataFrame, color="red", engine=None):
+    if _engine(engine) == "python":
+        return _cooccurrence_matrix_py(_as_frame(df), color)
+    nums = list(range(1, 27))
+    counts = cooccurrence_counts(df, color)
+    return pd.DataFrame(counts[1:, 1:].astype(int), index=nums, columns=nums)
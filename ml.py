@@ -1,6 +1,12 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
 import pandas as pd
 from sklearn.preprocessing import StandardScaler
 from sklearn.cluster import DBSCAN
+from sklearn.metrics import pairwise_distances, silhouette_score
+from sklearn.neighbors import NearestNeighbors
+from scipy.sparse.csgraph import connected_components
 
 DEFAULT_FEATURES = [
     "frequency", "weighted_score", "chi_square",
@@ -9,7 +15,7 @@ DEFAULT_FEATURES = [
     "volatility"
 ]
 
-def run_dbscan(feature_df: pd.DataFrame, eps: float, min_samples: int, features=None):
+def scaled_features(feature_df: pd.DataFrame, features=None):
     if features is None:
         features = DEFAULT_FEATURES
 
@@ -19,7 +25,10 @@ def run_dbscan(feature_df: pd.DataFrame, eps: float, min_samples: int, features=
         raise ValueError(f"Missing ML feature columns: {missing}")
 
     X = feature_df[features].fillna(0.0).astype(float).values
-    Xs = StandardScaler().fit_transform(X)
+    return StandardScaler().fit_transform(X), features
+
+def run_dbscan(feature_df: pd.DataFrame, eps: float, min_samples: int, features=None):
+    Xs, features = scaled_features(feature_df, features)
 
     model = DBSCAN(eps=eps, min_samples=min_samples)
     labels = model.fit_predict(Xs)
@@ -43,3 +52,76 @@ def cluster_summary(clustered_df: pd.DataFrame):
     ).reset_index().sort_values(["cluster", "count"], ascending=[True, False])
 
     return summary
+
+def dbscan_labels(graph, eps: float, min_samples: int):
+    """
+    DBSCAN labels from a radius-neighbors distance graph built at any radius
+    >= eps (self-distances included). Core points are those with at least
+    min_samples neighbors within eps; clusters are the connected components
+    of the core points, numbered by their lowest index, and a border point
+    joins the lowest-numbered cluster next to it. That is the order
+    sklearn's DBSCAN assigns labels in, so the result is identical.
+    """
+    adj = graph.copy()
+    adj.data = adj.data <= eps
+    adj.eliminate_zeros()
+    n = adj.shape[0]
+    labels = np.full(n, -1, dtype=np.int64)
+    core = np.flatnonzero(adj.getnnz(axis=1) >= min_samples)
+    if len(core) == 0:
+        return labels
+
+    _, comp = connected_components(adj[core][:, core], directed=False)
+    _, first = np.unique(comp, return_index=True)
+    rank = np.empty(len(first), dtype=np.int64)
+    rank[np.argsort(first)] = np.arange(len(first))
+    labels[core] = rank[comp]
+
+    border = np.setdiff1d(np.arange(n), core)
+    links = adj[border][:, core].tocsr()
+    has_core = np.diff(links.indptr) > 0
+    if has_core.any():
+        vals = labels[core][links.indices]
+        labels[border[has_core]] = np.minimum.reduceat(vals, links.indptr[:-1][has_core])
+    return labels
+
+def _sweep_point(graph, dist, eps, min_samples):
+    labels = dbscan_labels(graph, eps, min_samples)
+    clustered = labels >= 0
+    n_clusters = int(labels.max()) + 1 if len(labels) else 0
+    sizes = np.bincount(labels[clustered]) if clustered.any() else np.zeros(1, dtype=np.int64)
+    silhouette = np.nan
+    if 2 <= n_clusters < clustered.sum():
+        sub = dist[np.ix_(clustered, clustered)]
+        silhouette = silhouette_score(sub, labels[clustered], metric="precomputed")
+    return {
+        "eps": eps,
+        "min_samples": min_samples,
+        "n_clusters": n_clusters,
+        "noise": int((~clustered).sum()),
+        "noise_fraction": float((~clustered).mean()) if len(labels) else 0.0,
+        "largest_cluster": int(sizes.max()),
+        "silhouette": silhouette,
+    }
+
+def dbscan_sweep(feature_df: pd.DataFrame, eps_grid, min_samples_grid, features=None, workers: int = 1):
+    """
+    One row per (eps, min_samples): cluster count, noise fraction, largest
+    cluster and silhouette (over non-noise pairs; NaN with fewer than two
+    clusters). Features are scaled once and a radius-neighbors graph at the
+    largest eps is shared by every grid point; dbscan_labels reads each
+    point's neighborhoods straight from it, with the same labels run_dbscan
+    gives for those settings.
+    """
+    Xs, _ = scaled_features(feature_df, features)
+    eps_grid = sorted(set(float(e) for e in eps_grid))
+    grid = [(e, int(m)) for e in eps_grid for m in sorted(set(min_samples_grid))]
+    graph = NearestNeighbors(radius=eps_grid[-1]).fit(Xs).radius_neighbors_graph(Xs, mode="distance")
+    dist = pairwise_distances(Xs)
+
+    if workers and workers > 1:
+        with ThreadPoolExecutor(max_workers=workers) as ex:
+            rows = list(ex.map(lambda p: _sweep_point(graph, dist, *p), grid))
+    else:
+        rows = [_sweep_point(graph, dist, *p) for p in grid]
+    return pd.DataFrame(rows)
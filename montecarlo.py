@@ -0,0 +1,150 @@
+import os
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from metrics import N_PAIRS
+from stats import window_stats_batch
+
+MC_VERSION = 1
+DEFAULT_CACHE_DIR = ".mc_cache"
+DEFAULT_CHUNK = 10_000  # replicates simulated per task
+
+# window_stats column -> empirical p-value column. Larger values are more
+# extreme except for entropy, where a concentrated (low entropy) window is.
+P_COLUMNS = {
+    "entropy_bits": "entropy_p_mc",
+    "kl_to_uniform_bits": "kl_p_mc",
+    "js_to_uniform_bits": "js_p_mc",
+    "chi2": "chi2_p_mc",
+    "g_test": "g_test_p_mc",
+}
+LOWER_IS_EXTREME = {"entropy_bits"}
+PAIR_P_COLUMN = "chi_square_p_mc"
+
+# Statistics recomputed on a permuted count vector can differ in the last
+# bits; values this close to the observed one count as ties.
+_RTOL = 1e-9
+
+
+class NullDistribution:
+    """
+    Window statistics over `replicates` uniform 2by2 histories of `n_draws`
+    draws: each statistic as a sorted array, plus a histogram of per-pair
+    counts pooled over every pair of every replicate (under the null all 325
+    pairs are exchangeable, so one histogram serves the per-pair chi-square).
+    """
+    __slots__ = ("n_draws", "replicates", "seed", "stats", "pair_hist")
+
+    def __init__(self, n_draws, replicates, seed, stats, pair_hist):
+        self.n_draws = int(n_draws)
+        self.replicates = int(replicates)
+        self.seed = int(seed)
+        self.stats = stats
+        self.pair_hist = pair_hist
+
+    def pvalue(self, stat: str, observed):
+        """Empirical p-value (1 + #null at least as extreme) / (1 + replicates)."""
+        null = self.stats[stat]
+        observed = np.asarray(observed, dtype=np.float64)
+        tol = _RTOL * np.maximum(np.abs(observed), 1.0)
+        if stat in LOWER_IS_EXTREME:
+            extreme = np.searchsorted(null, observed + tol, side="right")
+        else:
+            extreme = len(null) - np.searchsorted(null, observed - tol, side="left")
+        return (1 + extreme) / (1 + len(null))
+
+    def pair_pvalues(self, counts):
+        """Per-pair chi-square p-values for observed pair counts in a window of n_draws."""
+        counts = np.asarray(counts, dtype=np.float64)
+        expected = self.n_draws / N_PAIRS
+        k = np.arange(len(self.pair_hist), dtype=np.float64)
+        null_chi = (k - expected) ** 2 / expected
+        order = np.argsort(null_chi, kind="stable")
+        tail = np.cumsum(self.pair_hist[order][::-1])[::-1]  # mass at or above each sorted value
+        obs_chi = (counts - expected) ** 2 / expected
+        pos = np.searchsorted(null_chi[order], obs_chi - _RTOL * np.maximum(obs_chi, 1.0), side="left")
+        extreme = np.where(pos < len(tail), tail[np.minimum(pos, len(tail) - 1)], 0)
+        return (1 + extreme) / (1 + self.pair_hist.sum())
+
+    def save(self, path: str):
+        # A unique temp file per writer: batch jobs sharing the cache dir can save the same key at once
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(path)), suffix=".tmp")
+        with os.fdopen(fd, "wb") as f:
+            np.savez(f, version=MC_VERSION, n_draws=self.n_draws, replicates=self.replicates, seed=self.seed,
+                     pair_hist=self.pair_hist, **{f"stat_{k}": v for k, v in self.stats.items()})
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path: str):
+        with np.load(path) as z:
+            if int(z["version"]) != MC_VERSION:
+                raise ValueError(f"Unsupported null cache version in {path}")
+            stats = {k[len("stat_"):]: z[k] for k in z.files if k.startswith("stat_")}
+            return cls(int(z["n_draws"]), int(z["replicates"]), int(z["seed"]), stats, z["pair_hist"])
+
+
+def _simulate_chunk(n_draws: int, replicates: int, seed_seq):
+    rng = np.random.default_rng(seed_seq)
+    counts = rng.multinomial(n_draws, np.full(N_PAIRS, 1.0 / N_PAIRS), size=replicates)
+    stats = window_stats_batch(counts, pvalues=False)
+    return {k: stats[k] for k in P_COLUMNS}, np.bincount(counts.ravel())
+
+
+def simulate_null(n_draws: int, replicates: int, seed: int = 0, workers: int = 1,
+                  chunk: int = DEFAULT_CHUNK) -> NullDistribution:
+    """
+    Simulate the null for one window size. Replicates are split into chunks
+    seeded from SeedSequence(seed).spawn, so the result depends on (seed,
+    chunk) but not on the number of workers.
+    """
+    sizes = [min(chunk, replicates - lo) for lo in range(0, replicates, chunk)]
+    seeds = np.random.SeedSequence(seed).spawn(len(sizes))
+    args = ([n_draws] * len(sizes), sizes, seeds)
+    if workers and workers > 1 and len(sizes) > 1:
+        with ProcessPoolExecutor(max_workers=min(workers, len(sizes))) as ex:
+            parts = list(ex.map(_simulate_chunk, *args))
+    else:
+        parts = list(map(_simulate_chunk, *args))
+
+    stats = {k: np.sort(np.concatenate([p[0][k] for p in parts])) for k in P_COLUMNS}
+    hist = np.zeros(max(len(p[1]) for p in parts), dtype=np.int64)
+    for _, h in parts:
+        hist[:len(h)] += h
+    return NullDistribution(n_draws, replicates, seed, stats, hist)
+
+
+def null_distribution(n_draws: int, replicates: int, seed: int = 0, workers: int = 1,
+                      cache_dir: str = DEFAULT_CACHE_DIR) -> NullDistribution:
+    """simulate_null, cached on disk by (window size, replicate count, seed)."""
+    if cache_dir is None:
+        return simulate_null(n_draws, replicates, seed=seed, workers=workers)
+    os.makedirs(cache_dir, exist_ok=True)
+    path = os.path.join(cache_dir, f"null_n{n_draws}_r{replicates}_s{seed}.npz")
+    if os.path.isfile(path):
+        try:
+            return NullDistribution.load(path)
+        except (ValueError, OSError, KeyError):
+            pass  # stale or corrupt; resimulate
+    null = simulate_null(n_draws, replicates, seed=seed, workers=workers)
+    null.save(path)
+    return null
+
+
+def add_stats_pvalues(stats_df: pd.DataFrame, nulls: dict) -> pd.DataFrame:
+    """Empirical p-value columns for *_stats_windows rows; nulls maps draw count -> NullDistribution."""
+    out = stats_df.copy()
+    for stat, col in P_COLUMNS.items():
+        out[col] = [nulls[n].pvalue(stat, v) if n in nulls else 1.0
+                    for n, v in zip(out["total"], out[stat])]
+    return out
+
+
+def add_pair_pvalues(features: pd.DataFrame, null: NullDistribution) -> pd.DataFrame:
+    """chi_square_p_mc next to chi_square in a pair feature table (global window)."""
+    out = features.copy()
+    out.insert(out.columns.get_loc("chi_square") + 1, PAIR_P_COLUMN,
+               null.pair_pvalues(out["frequency"].to_numpy()))
+    return out
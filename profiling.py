@@ -0,0 +1,156 @@
+import cProfile
+import json
+import os
+import re
+import time
+from contextlib import nullcontext
+
+# Shared no-op context returned while profiling is off, so an instrumented
+# stage costs one method call and an empty `with`.
+_NULL = nullcontext()
+
+
+class _Stage:
+    __slots__ = ("profiler", "name", "rows", "t0", "prof")
+
+    def __init__(self, profiler, name, rows):
+        self.profiler = profiler
+        self.name = name
+        self.rows = rows
+        self.prof = None
+
+    def __enter__(self):
+        p = self.profiler
+        if p.pstats_dir and not p._profiling:
+            # cProfile cannot nest; only the outermost instrumented stage is profiled.
+            # Repeated stages share one profile so their calls accumulate.
+            self.prof = p._profiles.setdefault(self.name, cProfile.Profile())
+            p._profiling = True
+            self.prof.enable()
+        self.t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        elapsed = time.perf_counter() - self.t0
+        if self.prof is not None:
+            self.prof.disable()
+            self.profiler._profiling = False
+        self.profiler._record(self.name, elapsed, self.rows)
+        return False
+
+
+class Profiler:
+    """
+    Wall-clock timers and counters around pipeline stages.
+
+        prof = Profiler(enabled=args.profile)
+        with prof.stage("load"):
+            ...
+        prof.count("draws", len(df))
+
+    Stages with the same name accumulate. `rows` gives a rows/sec figure in
+    the report. With pstats_dir set, each outermost stage is also run under
+    cProfile, and write() dumps <pstats_dir>/<stage>.pstats.
+    """
+
+    def __init__(self, enabled: bool = False, pstats_dir: str = None):
+        self.enabled = enabled
+        self.pstats_dir = pstats_dir if enabled else None
+        self.stages = {}
+        self.counters = {}
+        self._profiling = False
+        self._profiles = {}
+        self._t0 = time.perf_counter()
+        if self.pstats_dir:
+            os.makedirs(self.pstats_dir, exist_ok=True)
+
+    def stage(self, name: str, rows: int = None):
+        if not self.enabled:
+            return _NULL
+        return _Stage(self, name, rows)
+
+    def record(self, name: str, seconds: float, rows: int = None):
+        """Add a stage timed elsewhere, e.g. on a background thread."""
+        if self.enabled:
+            self._record(name, seconds, rows)
+
+    def count(self, name: str, n: int = 1):
+        if self.enabled:
+            self.counters[name] = self.counters.get(name, 0) + n
+
+    def _record(self, name, elapsed, rows):
+        s = self.stages.setdefault(name, {"seconds": 0.0, "calls": 0, "rows": 0})
+        s["seconds"] += elapsed
+        s["calls"] += 1
+        if rows is not None:
+            s["rows"] += int(rows)
+
+    def dump_pstats(self):
+        for name, prof in self._profiles.items():
+            safe = re.sub(r"[^A-Za-z0-9_.-]+", "_", name)
+            prof.dump_stats(os.path.join(self.pstats_dir, f"{safe}.pstats"))
+
+    def report(self) -> dict:
+        stages = []
+        for name, s in self.stages.items():
+            row = {"stage": name, "seconds": s["seconds"], "calls": s["calls"]}
+            if s["rows"]:
+                row["rows"] = s["rows"]
+                row["rows_per_sec"] = s["rows"] / s["seconds"] if s["seconds"] > 0 else None
+            stages.append(row)
+        return {
+            "total_seconds": time.perf_counter() - self._t0,
+            "stages": stages,
+            "counters": dict(self.counters),
+        }
+
+    def write(self, path: str) -> dict:
+        """Write the JSON report (and the per-stage .pstats files, if enabled)."""
+        if self.pstats_dir:
+            self.dump_pstats()
+        report = self.report()
+        with open(path, "w") as f:
+            json.dump(report, f, indent=2)
+        return report
+
+    def summary(self) -> str:
+        report = self.report()
+        lines = [f"[+] Profile: {report['total_seconds']:.3f}s total"]
+        for row in sorted(report["stages"], key=lambda r: -r["seconds"]):
+            rate = f"  {row['rows_per_sec']:,.0f} rows/s" if row.get("rows_per_sec") else ""
+            lines.append(f"    {row['stage']:<24} {row['seconds']:9.3f}s  x{row['calls']}{rate}")
+        return "\n".join(lines)
+
+
+# --- import time (python -X importtime) ---
+
+_IMPORTTIME_RE = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)\s*$")
+
+
+def parse_importtime(text: str):
+    """
+    Split `python -X importtime` stderr into per-module rows and the remaining
+    (non-import) lines. Depth 0 rows are the imports the program itself made.
+    """
+    rows, other = [], []
+    for line in text.splitlines():
+        m = _IMPORTTIME_RE.match(line)
+        if m:
+            rows.append({
+                "module": m.group(4),
+                "self_ms": int(m.group(1)) / 1000,
+                "cumulative_ms": int(m.group(2)) / 1000,
+                "depth": (len(m.group(3)) - 1) // 2,
+            })
+        elif not line.startswith("import time: self"):
+            other.append(line)
+    return rows, other
+
+
+def import_summary(rows, top: int = 15) -> str:
+    roots = sorted((r for r in rows if r["depth"] == 0), key=lambda r: -r["cumulative_ms"])
+    total = sum(r["cumulative_ms"] for r in roots)
+    lines = [f"[+] Imports: {total / 1000:.3f}s in {len(rows)} modules"]
+    for r in roots[:top]:
+        lines.append(f"    {r['module']:<24} {r['cumulative_ms']:9.1f} ms")
+    return "\n".join(lines)
@@ -1,5 +1,6 @@
-import yaml
 import operator
+import numpy as np
+import pandas as pd
 
 OPS = {
     ">": operator.gt, ">=": operator.ge,
@@ -7,25 +8,130 @@ OPS = {
     "==": operator.eq
 }
 
-def load_rules(path: str):
+HIT_FACTS = ["frequency", "weighted_score", "chi_square"]
+
+class RuleSet:
+    """
+    Rules compiled once at load time: every condition becomes an entry in
+    parallel column / op / threshold arrays, grouped by rule, so a whole
+    feature table is evaluated with one vectorized comparison per condition.
+    Iterating yields the original rule dicts. columns: the feature columns
+    conditions may name, supplied by the caller that builds the tables
+    (None = no check).
+
+    A rule needs a non-empty `when`: one without conditions would fire on
+    every pair, so it is rejected here instead.
+    """
+
+    def __init__(self, rules: list, columns=None):
+        known = None if columns is None else set(columns)
+        self.rules = rules
+        self.names = []
+        self.severities = []
+        self.columns = []          # column name per condition
+        self.ops = []              # operator string per condition
+        thresholds = []
+        rule_starts = []
+
+        for i, rule in enumerate(rules):
+            label = f"rule #{i + 1}"
+            if not isinstance(rule, dict):
+                raise ValueError(f"{label}: expected a mapping, got {type(rule).__name__}")
+            name = rule.get("name", "UNKNOWN")
+            label = f"rule #{i + 1} ({name})"
+            when = rule.get("when")
+            if not isinstance(when, dict) or not when:
+                raise ValueError(f"{label}: 'when' must be a non-empty mapping of column: \"<op> <number>\"")
+
+            rule_starts.append(len(self.columns))
+            for field, condition in when.items():
+                parts = str(condition).split()
+                if len(parts) != 2:
+                    raise ValueError(f"{label}: condition for '{field}' must look like \"> 2.0\", got {condition!r}")
+                op, threshold = parts
+                if known is not None and str(field) not in known:
+                    raise ValueError(f"{label}: unknown feature column {field!r} "
+                                     f"(expected one of {', '.join(columns)})")
+                if op not in OPS:
+                    raise ValueError(f"{label}: unknown operator {op!r} for '{field}' "
+                                     f"(expected one of {', '.join(OPS)})")
+                try:
+                    threshold = float(threshold)
+                except ValueError:
+                    raise ValueError(f"{label}: threshold for '{field}' is not a number: {threshold!r}") from None
+                self.columns.append(str(field))
+                self.ops.append(op)
+                thresholds.append(threshold)
+
+            self.names.append(name)
+            self.severities.append(rule.get("severity", "unknown"))
+
+        self.thresholds = np.asarray(thresholds, dtype=np.float64)
+        self.rule_starts = np.asarray(rule_starts, dtype=np.intp)
+
+    def __len__(self):
+        return len(self.rules)
+
+    def __iter__(self):
+        return iter(self.rules)
+
+    def match(self, df: pd.DataFrame):
+        """Boolean (n_rows, n_rules) mask of which rules fire for each row."""
+        if not len(self.rules):
+            return np.zeros((len(df), 0), dtype=bool)
+        missing = sorted(set(self.columns) - set(df.columns))
+        if missing:
+            using = sorted({self.names[self._rule_of(i)] for i, c in enumerate(self.columns) if c in missing})
+            raise ValueError(f"Rules {using} reference unknown feature columns: {missing}")
+
+        cols = sorted(set(self.columns))
+        values = df[cols].to_numpy(dtype=np.float64)
+        col_idx = np.array([cols.index(c) for c in self.columns])
+        cond = np.empty((len(df), len(self.columns)), dtype=bool)
+        for op in set(self.ops):
+            sel = np.array([o == op for o in self.ops])
+            cond[:, sel] = OPS[op](values[:, col_idx[sel]], self.thresholds[sel])
+        return np.logical_and.reduceat(cond, self.rule_starts, axis=1)
+
+    def _rule_of(self, cond_index: int) -> int:
+        return int(np.searchsorted(self.rule_starts, cond_index, side="right") - 1)
+
+def compile_rules(rules, columns=None) -> RuleSet:
+    if isinstance(rules, RuleSet):
+        return rules
+    if rules is None:
+        rules = []
+    if not isinstance(rules, list):
+        raise ValueError(f"'rules' must be a list, got {type(rules).__name__}")
+    return RuleSet(rules, columns=columns)
+
+def load_rules(path: str, columns=None) -> RuleSet:
+    import yaml
+
     with open(path, "r") as f:
         data = yaml.safe_load(f)
-    return data.get("rules", [])
+    try:
+        return compile_rules((data or {}).get("rules", []), columns=columns)
+    except ValueError as e:
+        raise ValueError(f"{path}: {e}") from None
 
-def evaluate_rules(color: str, pair, facts: dict, rules: list):
+def evaluate_rules(color: str, pair, facts: dict, rules):
+    """
+    Rule hits for one pair's facts. A condition on a field missing from
+    `facts` raises ValueError, as evaluate_rules_df does for a missing
+    column, rather than counting as no match.
+    """
+    rules = compile_rules(rules)
+    ends = list(rules.rule_starts[1:]) + [len(rules.columns)]
     hits = []
-    for rule in rules:
+    for r, (start, end) in enumerate(zip(rules.rule_starts, ends)):
         matched = True
-        for field, condition in rule.get("when", {}).items():
-            op, threshold = condition.split()
-            threshold = float(threshold)
+        for k in range(start, end):
+            field = rules.columns[k]
             if field not in facts:
-                matched = False
-                break
-            if op not in OPS:
-                matched = False
-                break
-            if not OPS[op](float(facts[field]), threshold):
+                raise ValueError(f"Rule {rules.names[r]!r} references {field!r}, which is not in the facts "
+                                 f"for pair {pair}")
+            if not OPS[rules.ops[k]](float(facts[field]), rules.thresholds[k]):
                 matched = False
                 break
 
@@ -33,10 +139,28 @@ def evaluate_rules(color: str, pair, facts: dict, rules: list):
             hits.append({
                 "color": color,
                 "pair": pair,
-                "rule": rule.get("name", "UNKNOWN"),
-                "severity": rule.get("severity", "unknown"),
+                "rule": rules.names[r],
+                "severity": rules.severities[r],
                 "frequency": facts.get("frequency"),
                 "weighted_score": facts.get("weighted_score"),
                 "chi_square": facts.get("chi_square"),
             })
     return hits
+
+def evaluate_rules_df(df: pd.DataFrame, rules, color: str = None) -> pd.DataFrame:
+    """
+    Vectorized evaluate_rules over a whole feature table. Conditions may name
+    any numeric column. Hits come out row by row, in rule order within a row.
+    """
+    rules = compile_rules(rules)
+    mask = rules.match(df)
+    rows, rule_idx = np.nonzero(mask)
+    hits = pd.DataFrame({
+        "color": df["color"].to_numpy()[rows] if color is None else color,
+        "pair": df["pair"].array[rows],
+        "rule": np.asarray(rules.names, dtype=object)[rule_idx],
+        "severity": np.asarray(rules.severities, dtype=object)[rule_idx],
+    })
+    for fact in HIT_FACTS:
+        hits[fact] = df[fact].to_numpy(dtype=np.float64)[rows] if fact in df.columns else None
+    return hits
@@ -1,12 +1,76 @@
+import numpy as np
 import pandas as pd
 
+from metrics import SUPPORT, N_PAIRS, counts_to_counter, chi_square_per_pair
+
+# Composite weights for (frequency, weighted score, chi-square)
+DEFAULT_WEIGHTS = (0.4, 0.4, 0.2)
+CONFIDENCE_BINS = [-1, 0.33, 0.66, 1.01]
+# pd.cut's LOW/MEDIUM/HIGH plus the UNKNOWN that attach_temporal fills in
+CONFIDENCE = pd.CategoricalDtype(["LOW", "MEDIUM", "HIGH", "UNKNOWN"], ordered=True)
+
+# dtype of the `pair` column: a categorical over the 325 (a, b) tuples in
+# pair-id order, so a column's codes are its pair ids and groupby / merge /
+# filter compare small ints instead of hashing tuples. Writes the same CSV.
+PAIR_DTYPE = pd.CategoricalDtype(pd.Index(SUPPORT, tupleize_cols=False))
+
+def pair_column(ids) -> pd.Categorical:
+    """The `pair` column for an array of pair ids."""
+    return pd.Categorical.from_codes(np.asarray(ids), dtype=PAIR_DTYPE)
+
 def normalize(series: pd.Series) -> pd.Series:
     mn, mx = series.min(), series.max()
     if mx == mn:
         return series * 0.0
     return (series - mn) / (mx - mn)
 
-def build_score_table(color: str, pairs, freq_dict, weighted_dict, chi_dict):
+def normalize_observed(values, observed):
+    """
+    Row-wise normalize() over the last axis, restricted to observed pairs
+    (the ones a score table would contain); unobserved entries come out 0.
+    """
+    values = np.asarray(values, dtype=np.float64)
+    mn = np.where(observed, values, np.inf).min(axis=-1, keepdims=True)
+    mx = np.where(observed, values, -np.inf).max(axis=-1, keepdims=True)
+    rng = mx - mn
+    with np.errstate(invalid="ignore", divide="ignore"):
+        out = np.where(rng > 0, (values - mn) / np.where(rng > 0, rng, 1.0), 0.0)
+    return np.where(observed, out, 0.0)
+
+def single_weights(weights) -> tuple:
+    """
+    One (w_freq, w_weighted, w_chi) triple, for the table builders that
+    score one weighting; a (k, 3) batch is only for composite_from_arrays.
+    """
+    w = np.asarray(weights, dtype=np.float64)
+    if w.shape != (3,):
+        raise ValueError(f"expected one (w_freq, w_weighted, w_chi) weight triple, got shape {w.shape}; "
+                         "score a batch of weightings with composite_from_arrays")
+    return tuple(float(x) for x in w)
+
+def composite_from_arrays(freq, weighted, chi, weights=DEFAULT_WEIGHTS):
+    """
+    Batched composite_score over dense (..., 325) arrays, matching
+    build_score_table for observed pairs; pairs with zero frequency score 0,
+    as they do after the temporal merge. `weights` is one (w_freq,
+    w_weighted, w_chi) triple, or a (k, 3) array to score k weightings at
+    once, giving a (k, ..., 325) result.
+    """
+    observed = np.asarray(freq) > 0
+    parts = [normalize_observed(x, observed) for x in (freq, weighted, chi)]
+    w = np.asarray(weights, dtype=np.float64)
+    if w.ndim == 2:
+        w = w.T.reshape((3, -1) + (1,) * parts[0].ndim)
+    return w[0] * parts[0] + w[1] * parts[1] + w[2] * parts[2]
+
+def confidence_bucket(scores):
+    """pd.cut(scores, CONFIDENCE_BINS) as a CONFIDENCE categorical, via searchsorted."""
+    scores = np.asarray(scores, dtype=np.float64)
+    codes = np.searchsorted(CONFIDENCE_BINS, scores, side="left") - 1
+    codes[(codes < 0) | (codes >= len(CONFIDENCE_BINS) - 1) | np.isnan(scores)] = -1
+    return pd.Categorical.from_codes(codes, dtype=CONFIDENCE)
+
+def build_score_table(color: str, pairs, freq_dict, weighted_dict, chi_dict, weights=DEFAULT_WEIGHTS):
     rows = []
     for pair in pairs:
         rows.append({
@@ -18,16 +82,18 @@ def build_score_table(color: str, pairs, freq_dict, weighted_dict, chi_dict):
         })
 
     df = pd.DataFrame(rows)
+    df["pair"] = pd.Categorical(df["pair"], dtype=PAIR_DTYPE)
 
     df["freq_norm"] = normalize(df["frequency"])
     df["weighted_norm"] = normalize(df["weighted_score"])
     df["chi_norm"] = normalize(df["chi_square"])
 
     # Tunable weights (kept simple and stable)
+    w_freq, w_weighted, w_chi = single_weights(weights)
     df["composite_score"] = (
-        0.4 * df["freq_norm"] +
-        0.4 * df["weighted_norm"] +
-        0.2 * df["chi_norm"]
+        w_freq * df["freq_norm"] +
+        w_weighted * df["weighted_norm"] +
+        w_chi * df["chi_norm"]
     )
 
     df["confidence"] = pd.cut(
@@ -37,3 +103,18 @@ def build_score_table(color: str, pairs, freq_dict, weighted_dict, chi_dict):
     )
 
     return df.sort_values(["composite_score", "frequency"], ascending=[False, False]).reset_index(drop=True)
+
+def build_score_table_from_counts(color: str, counts, weighted, total_draws: int, weights=DEFAULT_WEIGHTS):
+    """Same table as build_score_table, from dense length-325 count/weight arrays."""
+    freq = counts_to_counter(counts)
+    weighted_dict = {(color, SUPPORT[i]): float(weighted[i]) for i in np.flatnonzero(counts)}
+    chi = chi_square_per_pair(freq, total_draws)
+    return build_score_table(color, freq.keys(), freq, weighted_dict, chi, weights=weights)
+
+def chi_square_from_counts(counts, total_draws):
+    """chi_square_per_pair as a dense array over the last axis (0 where a pair is unseen)."""
+    counts = np.asarray(counts)
+    expected = np.asarray(total_draws, dtype=np.float64)[..., None] / 325.0
+    with np.errstate(invalid="ignore", divide="ignore"):
+        chi = ((counts - expected) ** 2) / expected
+    return np.where(counts > 0, chi, 0.0)
@@ -0,0 +1,315 @@
+import asyncio
+import json
+import os
+import time
+from urllib.parse import urlsplit, parse_qs
+
+import pandas as pd
+
+from data_parser import parse_from_html, BALL_COLS, DEFAULT_PARSER
+from incremental import PairState
+from rules import evaluate_rules_df
+
+COLORS = ("red", "white")
+MAX_BODY = 64 * 2 ** 20
+
+REASONS = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed",
+           413: "Payload Too Large", 500: "Internal Server Error"}
+
+
+class HTTPError(Exception):
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+
+
+class Snapshot:
+    """
+    Immutable view of the enriched tables at one point in the draw history.
+    Readers hold a reference to one snapshot for a whole request; ingestion
+    builds a new one and swaps it in, so nothing a reader sees changes under it.
+    """
+    __slots__ = ("version", "n_draws", "min_date", "max_date", "features", "stats", "rule_hits", "built_at")
+
+    def __init__(self, state: PairState, rules, version: int):
+        self.version = version
+        self.n_draws = len(state)
+        draws = state.draws()
+        self.min_date = str(draws["date"].min().date()) if len(draws) else None
+        self.max_date = str(draws["date"].max().date()) if len(draws) else None
+        # Same tables as main.enrich_with_facts, from the running sums
+        self.features = {color: state.features(color) for color in COLORS}
+        self.stats = pd.DataFrame(state.stats_rows())
+        hits = [evaluate_rules_df(self.features[c], rules, c) for c in COLORS] if len(rules) else []
+        self.rule_hits = pd.concat(hits, ignore_index=True) if hits else pd.DataFrame()
+        self.built_at = time.time()
+
+    def info(self) -> dict:
+        return {"version": self.version, "draws": self.n_draws,
+                "min_date": self.min_date, "max_date": self.max_date}
+
+
+def _records(df: pd.DataFrame) -> list:
+    # to_json maps NaN to null and pair tuples to [a, b]
+    return json.loads(df.to_json(orient="records", double_precision=15))
+
+
+def _param(query: dict, name: str, default=None):
+    values = query.get(name)
+    return values[-1] if values else default
+
+
+def _int_param(query, name, default):
+    value = _param(query, name)
+    if value is None:
+        return default
+    try:
+        return int(value)
+    except ValueError:
+        raise HTTPError(400, f"'{name}' must be an integer, got {value!r}") from None
+
+
+def _color_param(query, required=True):
+    color = _param(query, "color")
+    if color is None and not required:
+        return None
+    if color not in COLORS:
+        raise HTTPError(400, f"'color' must be one of {', '.join(COLORS)}")
+    return color
+
+
+def draws_from_json(payload) -> pd.DataFrame:
+    """Draws posted as [{"date": "2025-01-09", "r1": .., "r2": .., "w1": .., "w2": ..}, ...]."""
+    if isinstance(payload, dict):
+        payload = payload.get("draws")
+    if not isinstance(payload, list):
+        raise HTTPError(400, "expected a list of draws or {\"draws\": [...]}")
+    df = pd.DataFrame(payload)
+    if df.empty:
+        return pd.DataFrame(columns=["date"] + BALL_COLS)
+    missing = [c for c in ["date"] + BALL_COLS if c not in df.columns]
+    if missing:
+        raise HTTPError(400, f"draws are missing fields: {missing}")
+    try:
+        df["date"] = pd.to_datetime(df["date"])
+        balls = df[BALL_COLS].astype("int64")
+    except (ValueError, TypeError) as e:
+        raise HTTPError(400, f"bad draw: {e}") from None
+    if ((balls < 1) | (balls > 26)).any().any():
+        raise HTTPError(400, "balls must be between 1 and 26")
+    df[BALL_COLS] = balls
+    return df[["date"] + BALL_COLS]
+
+
+class AnalysisService:
+    """
+    Keeps the draw history as a PairState and serves queries from the current
+    Snapshot. Ingestion runs one at a time on a worker thread and publishes a
+    new snapshot when done; reads never wait for it.
+    """
+
+    def __init__(self, state: PairState, rules, state_path: str = None, parser: str = DEFAULT_PARSER):
+        self.state = state
+        self.rules = rules
+        self.state_path = state_path
+        self.parser = parser
+        self.snapshot = Snapshot(state, rules, version=1)
+        self._ingest_lock = None
+
+    # --- queries (read the snapshot reference once) ---
+
+    def top(self, query: dict) -> dict:
+        snap = self.snapshot
+        df = snap.features[_color_param(query)]
+        by = _param(query, "by", "composite_score")
+        if by not in df.columns or not pd.api.types.is_numeric_dtype(df[by]):
+            raise HTTPError(400, f"'by' must be a numeric feature column, got {by!r}")
+        n = _int_param(query, "n", 10)
+        ascending = _param(query, "order", "desc") == "asc"
+        rows = df.nsmallest(n, by) if ascending else df.nlargest(n, by)
+        return {**snap.info(), "by": by, "rows": _records(rows)}
+
+    def pair(self, query: dict) -> dict:
+        snap = self.snapshot
+        color = _color_param(query)
+        a, b = _int_param(query, "a", None), _int_param(query, "b", None)
+        if a is None or b is None:
+            raise HTTPError(400, "'a' and 'b' are required")
+        pair = (min(a, b), max(a, b))
+        df = snap.features[color]
+        row = df[df["pair"] == pair]
+        if row.empty:
+            raise HTTPError(404, f"pair {pair} has not been drawn as {color}")
+        return {**snap.info(), "row": _records(row)[0]}
+
+    def stats(self, query: dict) -> dict:
+        snap = self.snapshot
+        df = snap.stats
+        color = _color_param(query, required=False)
+        if color is not None:
+            df = df[df["color"] == color]
+        return {**snap.info(), "rows": _records(df)}
+
+    def rule_hits(self, query: dict) -> dict:
+        snap = self.snapshot
+        df = snap.rule_hits
+        color = _color_param(query, required=False)
+        if color is not None and len(df):
+            df = df[df["color"] == color]
+        severity = _param(query, "severity")
+        if severity is not None and len(df):
+            df = df[df["severity"] == severity]
+        return {**snap.info(), "rows": _records(df)}
+
+    def health(self, query: dict) -> dict:
+        return self.snapshot.info()
+
+    # --- ingestion ---
+
+    def _apply(self, draws: pd.DataFrame) -> int:
+        added = self.state.update(draws)
+        if added:
+            snapshot = Snapshot(self.state, self.rules, version=self.snapshot.version + 1)
+            if self.state_path:
+                self.state.save(self.state_path)
+            self.snapshot = snapshot
+        return added
+
+    async def ingest(self, draws: pd.DataFrame) -> dict:
+        if self._ingest_lock is None:
+            self._ingest_lock = asyncio.Lock()
+        async with self._ingest_lock:
+            loop = asyncio.get_running_loop()
+            try:
+                added = await loop.run_in_executor(None, self._apply, draws)
+            except ValueError as e:
+                raise HTTPError(400, str(e)) from None
+        return {**self.snapshot.info(), "added": added}
+
+    def parse_ingest_body(self, body: bytes, content_type: str) -> pd.DataFrame:
+        if "html" in content_type:
+            try:
+                return parse_from_html(body.decode("utf-8"), parser=self.parser)
+            except UnicodeDecodeError as e:
+                raise HTTPError(400, f"HTML body is not UTF-8: {e}") from None
+            except (RuntimeError, ValueError) as e:
+                raise HTTPError(400, f"invalid HTML page: {e}") from None
+        try:
+            payload = json.loads(body or b"null")
+        except ValueError as e:
+            raise HTTPError(400, f"invalid JSON: {e}") from None
+        return draws_from_json(payload)
+
+
+GET_ROUTES = {
+    "/top": AnalysisService.top,
+    "/pair": AnalysisService.pair,
+    "/stats": AnalysisService.stats,
+    "/rules": AnalysisService.rule_hits,
+    "/health": AnalysisService.health,
+}
+
+
+async def _read_request(reader):
+    line = await reader.readline()
+    if not line:
+        return None
+    try:
+        method, target, _ = line.decode("latin-1").split(" ", 2)
+    except ValueError:
+        raise HTTPError(400, "malformed request line") from None
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b"\n", b""):
+            break
+        name, _, value = line.decode("latin-1").partition(":")
+        headers[name.strip().lower()] = value.strip()
+    try:
+        length = int(headers.get("content-length") or 0)
+    except ValueError:
+        raise HTTPError(400, f"invalid Content-Length: {headers['content-length']!r}") from None
+    if length < 0:
+        raise HTTPError(400, f"invalid Content-Length: {length}")
+    if length > MAX_BODY:
+        raise HTTPError(413, f"request body over {MAX_BODY} bytes")
+    body = await reader.readexactly(length) if length else b""
+    return method.upper(), target, headers, body
+
+
+async def _dispatch(service, method, target, headers, body):
+    url = urlsplit(target)
+    query = parse_qs(url.query)
+    if url.path == "/ingest":
+        if method != "POST":
+            raise HTTPError(405, "use POST /ingest")
+        # Parsing a large page (up to MAX_BODY) is CPU-bound; keep it off the event loop like _apply
+        loop = asyncio.get_running_loop()
+        draws = await loop.run_in_executor(None, service.parse_ingest_body, body,
+                                           headers.get("content-type", ""))
+        return await service.ingest(draws)
+    handler = GET_ROUTES.get(url.path)
+    if handler is None:
+        raise HTTPError(404, f"unknown endpoint {url.path} (try {', '.join(GET_ROUTES)}, /ingest)")
+    if method != "GET":
+        raise HTTPError(405, f"use GET {url.path}")
+    return handler(service, query)
+
+
+def _response(status: int, payload, keep_alive: bool) -> bytes:
+    body = json.dumps(payload).encode()
+    head = (f"HTTP/1.1 {status} {REASONS.get(status, '')}\r\n"
+            f"Content-Type: application/json\r\n"
+            f"Content-Length: {len(body)}\r\n"
+            f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n")
+    return head.encode("latin-1") + body
+
+
+def make_handler(service: AnalysisService):
+    async def handle(reader, writer):
+        try:
+            while True:
+                keep_alive = False
+                try:
+                    request = await _read_request(reader)
+                    if request is None:
+                        break
+                    method, target, headers, body = request
+                    keep_alive = headers.get("connection", "").lower() != "close"
+                    status, payload = 200, await _dispatch(service, method, target, headers, body)
+                except HTTPError as e:
+                    status, payload = e.status, {"error": str(e)}
+                except (asyncio.IncompleteReadError, ConnectionError):
+                    break
+                except Exception as e:
+                    status, payload = 500, {"error": f"{type(e).__name__}: {e}"}
+                writer.write(_response(status, payload, keep_alive))
+                await writer.drain()
+                if not keep_alive:
+                    break
+        finally:
+            writer.close()
+    return handle
+
+
+async def serve(service: AnalysisService, host: str = "127.0.0.1", port: int = 8765, socket_path: str = None):
+    handler = make_handler(service)
+    if socket_path:
+        if os.path.exists(socket_path):
+            os.remove(socket_path)
+        server = await asyncio.start_unix_server(handler, path=socket_path)
+        where = f"unix:{socket_path}"
+    else:
+        server = await asyncio.start_server(handler, host, port)
+        where = f"http://{host}:{port}"
+    info = service.snapshot.info()
+    print(f"[+] Serving {info['draws']} draws ({info['min_date']} .. {info['max_date']}) on {where}")
+    async with server:
+        await server.serve_forever()
+
+
+def run(service: AnalysisService, host: str = "127.0.0.1", port: int = 8765, socket_path: str = None):
+    try:
+        asyncio.run(serve(service, host, port, socket_path))
+    except KeyboardInterrupt:
+        print("[+] Stopped")
@@ -1,66 +1,176 @@
 import math
 
+import numpy as np
+
 EPS = 1e-12
 
+# Batched versions work on the last axis, so a (n_windows, 325) matrix gives
+# one value per window; the scalar functions below are thin wrappers.
+
+def entropy_bits(probs):
+    probs = np.asarray(probs, dtype=np.float64)
+    logs = np.log2(probs, out=np.zeros_like(probs), where=probs > 0)
+    return -np.sum(probs * logs, axis=-1)
+
+def kl_bits(p, q):
+    p = np.maximum(np.asarray(p, dtype=np.float64), EPS)
+    q = np.maximum(np.asarray(q, dtype=np.float64), EPS)
+    return np.sum(p * np.log2(p / q), axis=-1)
+
+def js_bits(p, q):
+    p = np.asarray(p, dtype=np.float64)
+    q = np.asarray(q, dtype=np.float64)
+    m = (p + q) / 2
+    return 0.5 * kl_bits(p, m) + 0.5 * kl_bits(q, m)
+
+def g_stats(observed, expected):
+    o = np.asarray(observed, dtype=np.float64)
+    e = np.asarray(expected, dtype=np.float64)
+    o, e = np.broadcast_arrays(o, e)
+    ratio = np.divide(o, e, out=np.ones_like(o), where=(o > 0) & (e > 0))
+    return np.sum(2.0 * o * np.log(ratio), axis=-1)
+
+def chi_square_stats(observed, expected):
+    o = np.asarray(observed, dtype=np.float64)
+    e = np.asarray(expected, dtype=np.float64)
+    o, e = np.broadcast_arrays(o, e)
+    return np.sum(np.divide((o - e) ** 2, e, out=np.zeros_like(o), where=e > 0), axis=-1)
+
+_erfc = np.frompyfunc(math.erfc, 1, 1)
+
+def approx_chi_square_pvalues(x2, df):
+    """Wilson-Hilferty normal approximation, elementwise."""
+    x2 = np.asarray(x2, dtype=np.float64)
+    if df <= 0:
+        return np.ones_like(x2)
+    a = 1 - 2/(9*df)
+    b = math.sqrt(2/(9*df))
+    z = (np.cbrt(x2/df) - a) / b
+    return 0.5 * np.asarray(_erfc(z / math.sqrt(2)), dtype=np.float64)
+
+def chi_square_pvalues(x2, df: int):
+    """
+    Exact upper-tail chi-square probability for integer df, elementwise.
+    Q(df/2, x/2) has a finite series for integer df:
+        even df = 2m:    exp(-y) * sum_{i<m} y^i / i!
+        odd  df = 2m+1:  erfc(sqrt y) + exp(-y) * sum_{1<=i<=m} y^(i-1/2) / Gamma(i+1/2)
+    with y = x/2, summed in log space so far tails do not underflow early.
+    """
+    x2 = np.asarray(x2, dtype=np.float64)
+    if df <= 0:
+        return np.ones_like(x2)
+    df = int(df)
+    m = df // 2
+    y = np.maximum(x2, 0.0) / 2
+    logy = np.log(np.where(y > 0, y, 1.0))[..., None]
+    if df % 2 == 0:
+        i = np.arange(m, dtype=np.float64)
+        lgam = np.array([math.lgamma(k + 1) for k in range(m)])
+        head = 0.0
+    else:
+        i = np.arange(1, m + 1, dtype=np.float64) - 0.5
+        lgam = np.array([math.lgamma(k + 0.5) for k in range(1, m + 1)])
+        head = np.asarray(_erfc(np.sqrt(y)), dtype=np.float64)
+    if len(i) == 0:
+        return np.where(y > 0, head, 1.0)
+    terms = i * logy - lgam - y[..., None]
+    top = terms.max(axis=-1, keepdims=True)
+    tail = np.exp(top[..., 0]) * np.exp(terms - top).sum(axis=-1)
+    return np.where(y > 0, np.minimum(head + tail, 1.0), 1.0)
+
 def shannon_entropy(probs):
-    h = 0.0
-    for p in probs:
-        if p > 0:
-            h -= p * math.log(p, 2)
-    return h
+    return float(entropy_bits(probs))
 
 def kl_divergence(p, q):
-    d = 0.0
-    for pi, qi in zip(p, q):
-        pi = max(pi, EPS)
-        qi = max(qi, EPS)
-        d += pi * math.log(pi / qi, 2)
-    return d
+    return float(kl_bits(p, q))
 
 def js_divergence(p, q):
-    m = [(pi + qi) / 2 for pi, qi in zip(p, q)]
-    return 0.5 * kl_divergence(p, m) + 0.5 * kl_divergence(q, m)
+    return float(js_bits(p, q))
 
 def g_test_stat(observed, expected):
-    g = 0.0
-    for o, e in zip(observed, expected):
-        if o > 0 and e > 0:
-            g += 2.0 * o * math.log(o / e)
-    return g
+    return float(g_stats(observed, expected))
 
 def chi_square_stat(observed, expected):
-    x2 = 0.0
-    for o, e in zip(observed, expected):
-        if e > 0:
-            x2 += (o - e) ** 2 / e
-    return x2
+    return float(chi_square_stats(observed, expected))
 
 def approx_chi_square_pvalue(x2, df):
-    if df <= 0:
-        return 1.0
-    a = 1 - 2/(9*df)
-    b = math.sqrt(2/(9*df))
-    z = ((x2/df) ** (1/3) - a) / b
-    return 0.5 * math.erfc(z / math.sqrt(2))
+    return float(approx_chi_square_pvalues(x2, df))
+
+def chi_square_pvalue(x2, df):
+    return float(chi_square_pvalues(x2, df))
+
+STAT_KEYS = ["total", "entropy_bits", "kl_to_uniform_bits", "js_to_uniform_bits",
+             "chi2", "g_test", "chi2_p_approx", "chi2_p"]
+
+def window_stats_batch(counts, pvalues: bool = True) -> dict:
+    """
+    All window statistics for a (n_windows, k) count matrix in one pass.
+    Returns STAT_KEYS -> length-n_windows arrays; all-zero rows get the
+    same values as window_stats on an empty window. pvalues=False skips the
+    two p-value columns (the costly part for very many rows).
+    """
+    obs = np.atleast_2d(np.asarray(counts, dtype=np.float64))
+    n, k = obs.shape
+    total = obs.sum(axis=1)
+    empty = total == 0
+    safe_total = np.where(empty, 1.0, total)
+
+    expected = np.broadcast_to((safe_total / k)[:, None], obs.shape)
+    p = obs / safe_total[:, None]
+    q = np.full(k, 1.0 / k)
+    x2 = chi_square_stats(obs, expected)
+
+    out = {
+        "total": total.astype(np.int64),
+        "entropy_bits": entropy_bits(p),
+        "kl_to_uniform_bits": kl_bits(p, q),
+        "js_to_uniform_bits": js_bits(p, q),
+        "chi2": x2,
+        "g_test": g_stats(obs, expected),
+    }
+    if pvalues:
+        out["chi2_p_approx"] = approx_chi_square_pvalues(x2, df=k-1)
+        out["chi2_p"] = chi_square_pvalues(x2, df=k-1)
+    for key, value in out.items():
+        value[empty] = 1.0 if key.startswith("chi2_p") else 0
+    return out
+
+def sparse_window_stats(counts, k: int) -> dict:
+    """
+    window_stats for a k-cell window given only its nonzero counts, so a
+    large support (e.g. the 325 x 325 joint red/white cells) never has to be
+    materialized. Empty cells are added in closed form; values match
+    window_stats_batch on the dense vector.
+    """
+    obs = np.asarray(counts, dtype=np.float64)
+    obs = obs[obs > 0]
+    total = obs.sum()
+    if total == 0:
+        return {"total": 0, "entropy_bits": 0.0, "kl_to_uniform_bits": 0.0, "js_to_uniform_bits": 0.0,
+                "chi2": 0.0, "g_test": 0.0, "chi2_p_approx": 1.0, "chi2_p": 1.0}
+    zeros = k - len(obs)
+    p = obs / total
+    q = 1.0 / k
+    e = total / k
+    x2 = chi_square_stats(obs, e) + zeros * e
+    # An empty cell has p = 0, clamped to EPS by kl_bits
+    kl = kl_bits(p, q) + zeros * EPS * math.log2(EPS / q)
+    js = js_bits(p, q) + zeros * 0.5 * (EPS * math.log2(2 * EPS / q) + q)
+    return {
+        "total": int(total),
+        "entropy_bits": float(entropy_bits(p)),
+        "kl_to_uniform_bits": float(kl),
+        "js_to_uniform_bits": float(js),
+        "chi2": float(x2),
+        "g_test": float(g_stats(obs, e)),
+        "chi2_p_approx": float(approx_chi_square_pvalues(x2, df=k-1)),
+        "chi2_p": float(chi_square_pvalues(x2, df=k-1)),
+    }
 
 def window_stats(counts_dict, support_keys):
     obs = [counts_dict.get(k, 0) for k in support_keys]
-    total = sum(obs)
-    if total == 0:
+    if sum(obs) == 0:
         return {"total": 0, "entropy_bits": 0, "kl_to_uniform_bits": 0, "js_to_uniform_bits": 0,
-                "chi2": 0, "g_test": 0, "chi2_p_approx": 1.0}
-
-    k = len(support_keys)
-    expected = [total / k] * k
-    p = [o / total for o in obs]
-    q = [1.0 / k] * k
-
-    H = shannon_entropy(p)
-    KL = kl_divergence(p, q)
-    JS = js_divergence(p, q)
-    x2 = chi_square_stat(obs, expected)
-    g = g_test_stat(obs, expected)
-    pval = approx_chi_square_pvalue(x2, df=k-1)
-
-    return {"total": total, "entropy_bits": H, "kl_to_uniform_bits": KL, "js_to_uniform_bits": JS,
-            "chi2": x2, "g_test": g, "chi2_p_approx": pval}
+                "chi2": 0, "g_test": 0, "chi2_p_approx": 1.0, "chi2_p": 1.0}
+    batch = window_stats_batch([obs])
+    return {key: (int if key == "total" else float)(batch[key][0]) for key in STAT_KEYS}
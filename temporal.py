@@ -1,33 +1,70 @@
+import numpy as np
 import pandas as pd
 from typing import Optional
 
-from metrics import pair_frequencies, weighted_scores, chi_square_per_pair
-from scoring import build_score_table
+from metrics import (
+    pair_frequencies, weighted_scores, chi_square_per_pair, counts_to_counter,
+    draw_pair_ids, draw_days, decay_weights, decay_table, weighted_pair_matrix, N_PAIRS
+)
+from draw_store import DrawStore
+from scoring import (
+    build_score_table, build_score_table_from_counts, composite_from_arrays, chi_square_from_counts,
+    normalize_observed, confidence_bucket, single_weights, DEFAULT_WEIGHTS, pair_column
+)
+from stats import window_stats_batch, STAT_KEYS
 
 WINDOWS = [365, 90, 30]
+COLORS = ("red", "white")
 
-def get_window_df(df: pd.DataFrame, days: Optional[int]):
+# Numeric columns of every pair feature table (pair_features / attach_temporal);
+# the columns rules may test
+FEATURE_COLUMNS = (
+    "frequency", "weighted_score", "chi_square", "freq_norm", "weighted_norm", "chi_norm", "composite_score",
+    "score_global", *(f"score_{d}d" for d in WINDOWS), *(f"delta_{d}d" for d in WINDOWS), "volatility",
+)
+
+def parse_decays(text) -> list:
+    """--decay value: one decay, or a comma-separated list for a sweep."""
+    try:
+        decays = [float(d) for d in str(text).split(",") if d.strip()]
+    except ValueError:
+        decays = []
+    if not decays or not all(0 < d <= 1 for d in decays):
+        raise ValueError(f"Invalid decay list: {text!r} (expected values in (0, 1], e.g. 0.95,0.98)")
+    return list(dict.fromkeys(decays))
+
+def get_window_df(df, days: Optional[int]):
+    """
+    Draws on or after latest - days. A DrawStore gives a zero-copy view; a
+    DataFrame gives a filtered frame (callers only read it, so no .copy()).
+    """
     if days is None:
         return df
+    if not isinstance(df, pd.DataFrame):
+        return df.window(days)
     cutoff = df["date"].max() - pd.Timedelta(days=days)
-    return df[df["date"] >= cutoff].copy()
+    return df[df["date"] >= cutoff]
 
-def window_score_df(df: pd.DataFrame, color: str, days: Optional[int], decay: float):
+def window_score_df(df: pd.DataFrame, color: str, days: Optional[int], decay: float, weights=DEFAULT_WEIGHTS):
     sub = get_window_df(df, days)
     red_freq, white_freq = pair_frequencies(sub)
     freq = red_freq if color == "red" else white_freq
     w = weighted_scores(sub, decay=decay)
     chi = chi_square_per_pair(freq, len(sub))
-    return build_score_table(color, freq.keys(), freq, w, chi)
+    return build_score_table(color, freq.keys(), freq, w, chi, weights=weights)
 
-def build_temporal_features(df: pd.DataFrame, color: str, decay: float):
-    global_scores = window_score_df(df, color, None, decay)[["pair", "composite_score"]].rename(
+def combine_window_scores(color: str, tables: dict):
+    """
+    tables maps window days (None = global, then WINDOWS) to a score table
+    from build_score_table; returns the per-pair temporal features.
+    """
+    global_scores = tables[None][["pair", "composite_score"]].rename(
         columns={"composite_score": "score_global"}
     )
 
     merged = global_scores
     for days in WINDOWS:
-        win = window_score_df(df, color, days, decay)[["pair", "composite_score"]].rename(
+        win = tables[days][["pair", "composite_score"]].rename(
             columns={"composite_score": f"score_{days}d"}
         )
         merged = merged.merge(win, on="pair", how="outer")
@@ -50,3 +87,188 @@ def build_temporal_features(df: pd.DataFrame, color: str, decay: float):
     merged["trend"] = merged.apply(trend, axis=1)
     merged["color"] = color
     return merged
+
+class WindowCounts:
+    """
+    Per-pair counts and decayed sums for the global history and every window
+    in WINDOWS, for both colors. Keys are window days (None = global); arrays
+    are shaped (2, 325) with rows in COLORS order.
+    """
+
+    def __init__(self, n_draws: dict, counts: dict, weighted: dict):
+        self.n_draws = n_draws
+        self.counts = counts
+        self.weighted = weighted
+
+    def score_table(self, color: str, days: Optional[int] = None, weights=DEFAULT_WEIGHTS):
+        c = COLORS.index(color)
+        return build_score_table_from_counts(color, self.counts[days][c], self.weighted[days][c],
+                                             self.n_draws[days], weights=weights)
+
+    def freq(self, color: str, days: Optional[int] = None):
+        return counts_to_counter(self.counts[days][COLORS.index(color)])
+
+def compute_windows(df, decay: float, windows=None) -> WindowCounts:
+    """
+    All windows for both colors in one pass over the draws. Every window ends
+    at the latest draw, so with draws sorted by day a window is a suffix; the
+    draws are split at the window start offsets, each segment is counted once,
+    and each window is the cumulative sum of the segments after its start.
+    Decay ages are measured against the latest draw, which every window
+    contains, so one weight vector serves all windows.
+    """
+    if hasattr(df, "window_counts"):  # a DrawArchive counts itself chunk by chunk
+        return df.window_counts(decay, windows)
+    windows = list(WINDOWS if windows is None else windows)
+    n = len(df)
+    if n == 0:
+        zeros = {d: np.zeros((2, N_PAIRS)) for d in [None] + windows}
+        return WindowCounts({d: 0 for d in zeros}, {d: z.astype(np.int64) for d, z in zeros.items()}, zeros)
+
+    days = draw_days(df)
+    red_idx, white_idx = draw_pair_ids(df)
+    if isinstance(df, pd.DataFrame):  # a DrawStore is already sorted
+        order = np.argsort(days, kind="stable")
+        days, red_idx, white_idx = days[order], red_idx[order], white_idx[order]
+    if (red_idx < 0).any() or (white_idx < 0).any():
+        raise ValueError("Draw data contains a ball outside 1..26 or a repeated ball")
+    weights = decay_weights(days, decay, days[-1])
+
+    starts = {w: int(np.searchsorted(days, days[-1] - w, side="left")) for w in windows}
+    # Latest segment first; cumulative sums then give each window's totals
+    bounds = sorted(set(starts.values()) | {0}, reverse=True)
+    run_counts = np.zeros((2, N_PAIRS), dtype=np.int64)
+    run_weighted = np.zeros((2, N_PAIRS))
+    at_bound = {}
+    stop = n
+    for start in bounds:
+        for c, idx in enumerate((red_idx, white_idx)):
+            seg = idx[start:stop]
+            run_counts[c] += np.bincount(seg, minlength=N_PAIRS)
+            run_weighted[c] += np.bincount(seg, weights=weights[start:stop], minlength=N_PAIRS)
+        at_bound[start] = (run_counts.copy(), run_weighted.copy())
+        stop = start
+
+    n_draws, counts, weighted = {None: n}, {None: at_bound[0][0]}, {None: at_bound[0][1]}
+    for w, start in starts.items():
+        n_draws[w] = n - start
+        counts[w], weighted[w] = at_bound[start]
+    return WindowCounts(n_draws, counts, weighted)
+
+def compute_decay_sweep(df, decays, windows=None) -> dict:
+    """
+    compute_windows for several decay values in one pass: {decay: WindowCounts}.
+    Counts are shared; the decayed sums for all values come from one
+    decay_table and one weighted_pair_matrix per segment (or archive chunk).
+    """
+    windows = list(WINDOWS if windows is None else windows)
+    decays = [float(d) for d in decays]
+    store = DrawStore.from_frame(df) if isinstance(df, pd.DataFrame) else df
+    n = len(store)
+    if n == 0:
+        return {d: compute_windows(store, d, windows) for d in decays}
+
+    max_day = store.max_day
+    table = decay_table(decays, max_day - int(store.days[0]))
+    starts = {w: n - len(store.window(w)) for w in windows}
+    run_counts = np.zeros((2, N_PAIRS), dtype=np.int64)
+    run_weighted = np.zeros((len(decays), 2, N_PAIRS))
+    at_bound = {}
+    stop = n
+    for start in sorted(set(starts.values()) | {0}, reverse=True):
+        seg = store[start:stop]
+        for part in (seg.iter_chunks() if hasattr(seg, "iter_chunks") else (seg,)):
+            for c in range(2):
+                ids = part.pair_ids[:, c]
+                run_counts[c] += np.bincount(ids, minlength=N_PAIRS)
+                run_weighted[:, c] += weighted_pair_matrix(ids, part.days, table, max_day)
+        at_bound[start] = (run_counts.copy(), run_weighted.copy())
+        stop = start
+
+    n_draws = {None: n, **{w: n - start for w, start in starts.items()}}
+    bound = {None: 0, **starts}
+    return {d: WindowCounts(n_draws, {w: at_bound[s][0] for w, s in bound.items()},
+                            {w: at_bound[s][1][k] for w, s in bound.items()})
+            for k, d in enumerate(decays)}
+
+def stats_window_rows(windows: WindowCounts):
+    """Rows for *_stats_windows.csv: window_stats per window and color, in one batch."""
+    keys = [(days, c) for days in windows.counts for c in range(len(COLORS))]
+    stats = window_stats_batch(np.stack([windows.counts[days][c] for days, c in keys]))
+    rows = []
+    for i, (days, c) in enumerate(keys):
+        row = {"window": "global" if days is None else f"{days}d", "color": COLORS[c]}
+        for key in STAT_KEYS:
+            row[key] = int(stats[key][i]) if key == "total" else float(stats[key][i])
+        rows.append(row)
+    return rows
+
+def temporal_from_windows(windows: WindowCounts, color: str):
+    tables = {days: windows.score_table(color, days) for days in windows.counts}
+    return combine_window_scores(color, tables)
+
+def pair_features(windows: WindowCounts, color: str, weights=DEFAULT_WEIGHTS) -> pd.DataFrame:
+    """
+    The enriched pair table (attach_temporal of the global score table and
+    the temporal features) straight from the dense (325,) arrays: every
+    window is scored in one composite_from_arrays call, and since rows are
+    indexed by pair id the windows line up without a merge. Same rows,
+    values and order as the table-by-table path.
+    """
+    c = COLORS.index(color)
+    keys = [None] + WINDOWS
+    counts = np.stack([windows.counts[d][c] for d in keys])
+    weighted = np.stack([windows.weighted[d][c] for d in keys])
+    chi = chi_square_from_counts(counts, [windows.n_draws[d] for d in keys])
+    scores = composite_from_arrays(counts, weighted, chi, single_weights(weights))
+
+    observed = counts[0] > 0
+    ids = np.flatnonzero(observed)
+    out = pd.DataFrame({
+        "color": color,
+        "pair": pair_column(ids),
+        "frequency": counts[0, ids],
+        "weighted_score": weighted[0, ids],
+        "chi_square": chi[0, ids],
+        "freq_norm": normalize_observed(counts[0], observed)[ids],
+        "weighted_norm": normalize_observed(weighted[0], observed)[ids],
+        "chi_norm": normalize_observed(chi[0], observed)[ids],
+        "composite_score": scores[0, ids],
+        "confidence": confidence_bucket(scores[0, ids]),
+        "score_global": scores[0, ids],
+    })
+    for k, days in enumerate(WINDOWS, start=1):
+        out[f"score_{days}d"] = scores[k, ids]
+    for days in WINDOWS:
+        out[f"delta_{days}d"] = out[f"score_{days}d"] - out["score_global"]
+    out["volatility"] = out[["score_global"] + [f"score_{d}d" for d in WINDOWS]].std(axis=1)
+    delta = out["delta_30d"].to_numpy()
+    out["trend"] = np.select([delta > 0.15, delta < -0.15], ["EMERGING", "FADING"], "STABLE").astype(object)
+    return out.sort_values(["composite_score", "frequency"], ascending=[False, False]).reset_index(drop=True)
+
+def build_temporal_features(df: pd.DataFrame, color: str, decay: float, windows: Optional[WindowCounts] = None,
+                            weights=DEFAULT_WEIGHTS):
+    """
+    windows: a compute_windows result to reuse; without one the windows are
+    recomputed per table with window_score_df.
+    """
+    if windows is not None:
+        tables = {days: windows.score_table(color, days, weights=weights) for days in windows.counts}
+    else:
+        tables = {days: window_score_df(df, color, days, decay, weights=weights) for days in [None] + WINDOWS}
+    return combine_window_scores(color, tables)
+
+def attach_temporal(score_df: pd.DataFrame, temporal_df: pd.DataFrame):
+    merged = score_df.merge(temporal_df, on=["color", "pair"], how="left")
+
+    # Fill numeric NaNs only (avoid categorical 'confidence' blowing up)
+    num_cols = merged.select_dtypes(include=["number"]).columns
+    merged[num_cols] = merged[num_cols].fillna(0.0)
+
+    # Optional: fill trend/confidence if missing (should rarely happen)
+    if "trend" in merged.columns:
+        merged["trend"] = merged["trend"].fillna("STABLE")
+    if "confidence" in merged.columns:
+        merged["confidence"] = merged["confidence"].cat.add_categories(["UNKNOWN"]).fillna("UNKNOWN")
+
+    return merged
@@ -0,0 +1,60 @@
+import pandas as pd
+import pytest
+
+from bench.synth import synthetic_draws, synthetic_pages
+from data_parser import PARSERS, parse_from_html
+
+# One page the generator would never write: attributes in another order,
+# single and unquoted class values, extra classes, entities and whitespace
+# inside the text, a card that is not a draw and one with a missing ball.
+ODD_PAGE = """<!DOCTYPE html><html><body>
+<A href="/draw-result?gc=2by2&amp;date=2024-03-01" data-x='1'  CLASS = "other card">
+  <div class='card-body'>
+    <h5 id="t1" class="card-title  text-muted">
+      Fri,   Mar 1,
+      2024
+    </h5>
+    <div class="game-ball-group">
+      <div data-n="1" class='item-2by2 red-balls form-control col'> 8 </div>
+      <div class="form-control col red-balls item-2by2"><span>2</span>1</div>
+      <div class="form-control white-balls item-2by2 col">&#32;3&#x20;</div>
+      <div class=" item-2by2 form-control white-balls ">
+        14
+      </div>
+    </div>
+  </div>
+</a>
+<a class="card" href="#"><h5 class="card-title">Sat, March 2, 2024</h5>
+<div class="form-control red-balls item-2by2">5</div><div class="form-control red-balls item-2by2">6</div>
+<div class="form-control white-balls item-2by2">7</div></a>
+<a class=cardx href="#"><h5 class="card-title">Sun, Mar 3, 2024</h5></a>
+<a class="card" href="#"><h5 class="card-title">Mon, Mar 4, 2024</h5>
+<div class="form-control red-balls item-2by2">1</div><div class="form-control red-balls item-2by2">2</div>
+<div class="form-control white-balls item-2by2">3</div><div class="form-control white-balls item-2by2">4</div></a>
+</body></html>
+"""
+
+
+def _parse_all(html):
+    return {name: parse_from_html(html, parser=name) for name in PARSERS}
+
+
+@pytest.mark.parametrize("seed", [0, 1])
+def test_backends_agree_on_synthetic_pages(seed):
+    for html in synthetic_pages(synthetic_draws(450, seed=seed), cards_per_page=100):
+        frames = _parse_all(html)
+        for name, df in frames.items():
+            pd.testing.assert_frame_equal(df, frames["bs4"], obj=f"{name} parser")
+
+
+def test_backends_agree_on_odd_markup():
+    frames = _parse_all(ODD_PAGE)
+    for name, df in frames.items():
+        pd.testing.assert_frame_equal(df, frames["bs4"], obj=f"{name} parser")
+    assert len(frames["bs4"]) == 2
+
+
+def test_page_without_cards_fails_in_every_backend():
+    for name in PARSERS:
+        with pytest.raises(RuntimeError, match="No draws parsed"):
+            parse_from_html("<html><body>consent</body></html>", parser=name)
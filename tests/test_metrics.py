@@ -0,0 +1,34 @@
+import pytest
+
+from bench.synth import synthetic_draws
+from draw_store import DrawStore
+from metrics import cooccurrence_counts, number_counts
+
+
+@pytest.mark.parametrize("ball", [0, 27, 40])
+def test_cooccurrence_rejects_out_of_range_balls(ball):
+    df = synthetic_draws(50, seed=2)
+    df.loc[10, "r2"] = ball
+    with pytest.raises(ValueError, match="outside 1..26"):
+        cooccurrence_counts(df, "red")
+
+
+def test_cooccurrence_counts_every_draw_twice():
+    df = synthetic_draws(300, seed=2)
+    for color in ("red", "white"):
+        assert cooccurrence_counts(df, color).sum() == 2 * len(df)
+        assert (cooccurrence_counts(DrawStore.from_frame(df), color) == cooccurrence_counts(df, color)).all()
+
+
+@pytest.mark.parametrize("ball", [0, 27, 40])
+def test_number_counts_rejects_out_of_range_balls(ball):
+    df = synthetic_draws(50, seed=2)
+    df.loc[10, "w1"] = ball
+    with pytest.raises(ValueError, match="white ball outside 1..26"):
+        number_counts(df)
+
+
+def test_number_counts_sums_to_two_balls_per_draw():
+    counts = number_counts(synthetic_draws(300, seed=2))
+    assert counts.shape == (2, 27)
+    assert (counts[:, 0] == 0).all() and (counts.sum(axis=1) == 600).all()
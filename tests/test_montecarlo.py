@@ -0,0 +1,29 @@
+import multiprocessing
+import os
+
+import numpy as np
+
+from montecarlo import NullDistribution, null_distribution
+
+
+def _save_repeatedly(path, null, rounds):
+    for _ in range(rounds):
+        null.save(path)
+
+
+def test_two_processes_save_the_same_key(tmp_path):
+    null = null_distribution(200, 400, seed=3, cache_dir=None)
+    path = str(tmp_path / "null_n200_r400_s3.npz")
+    ctx = multiprocessing.get_context("spawn")
+    procs = [ctx.Process(target=_save_repeatedly, args=(path, null, 200)) for _ in range(2)]
+    for p in procs:
+        p.start()
+    for p in procs:
+        p.join()
+    assert [p.exitcode for p in procs] == [0, 0]
+
+    loaded = NullDistribution.load(path)
+    np.testing.assert_array_equal(loaded.pair_hist, null.pair_hist)
+    for stat, values in null.stats.items():
+        np.testing.assert_array_equal(loaded.stats[stat], values)
+    assert os.listdir(tmp_path) == [os.path.basename(path)]
@@ -0,0 +1,42 @@
+import pandas as pd
+import pytest
+
+from rules import compile_rules, evaluate_rules, evaluate_rules_df
+from scoring import pair_column
+
+RULES = [
+    {"name": "HOT", "severity": "high", "when": {"frequency": "> 5", "delta_30d": ">= 0.1"}},
+    {"name": "COLD", "severity": "low", "when": {"frequency": "< 2"}},
+]
+
+
+def test_scalar_and_vectorized_agree():
+    df = pd.DataFrame({
+        "color": "red", "pair": pair_column([0, 1, 2]),
+        "frequency": [8, 1, 6], "delta_30d": [0.2, 0.5, 0.0],
+        "weighted_score": [1.0, 2.0, 3.0], "chi_square": [0.1, 0.2, 0.3],
+    })
+    hits = evaluate_rules_df(df, RULES)
+    assert list(zip(hits["pair"], hits["rule"])) == [((1, 2), "HOT"), ((1, 3), "COLD")]
+    scalar = [h["rule"] for _, row in df.iterrows() for h in evaluate_rules("red", row["pair"], row, RULES)]
+    assert scalar == list(hits["rule"])
+
+
+@pytest.mark.parametrize("rule", [{"name": "ALL"}, {"name": "ALL", "when": {}}])
+def test_rule_without_conditions_is_rejected(rule):
+    # The original loop fired such a rule on every pair
+    with pytest.raises(ValueError, match="ALL.*'when' must be a non-empty mapping"):
+        compile_rules([rule])
+
+
+def test_missing_fact_raises():
+    # The original loop counted a missing fact as no match
+    with pytest.raises(ValueError, match="'delta_30d', which is not in the facts"):
+        evaluate_rules("red", (1, 2), {"frequency": 9}, RULES)
+
+
+def test_columns_are_checked_only_when_given():
+    rule = [{"name": "TYPO", "when": {"delta30d": "> 0.1"}}]
+    assert len(compile_rules(rule)) == 1
+    with pytest.raises(ValueError, match="unknown feature column 'delta30d'"):
+        compile_rules(rule, columns=["delta_30d"])
@@ -0,0 +1,32 @@
+import numpy as np
+import pytest
+
+from backtest import rolling_scores
+from bench.synth import synthetic_draws
+from bootstrap import bootstrap_ci
+from draw_store import DrawStore
+from scoring import DEFAULT_WEIGHTS, composite_from_arrays, single_weights
+from temporal import compute_windows, pair_features
+
+BATCH = [DEFAULT_WEIGHTS, (0.5, 0.3, 0.2)]
+
+
+def test_batched_weights_score_every_weighting():
+    counts = np.arange(325)[None, :] % 7
+    chi = counts * 0.5
+    scores = composite_from_arrays(counts, counts * 0.9, chi, BATCH)
+    assert scores.shape == (2, 1, 325)
+    np.testing.assert_allclose(scores[1], composite_from_arrays(counts, counts * 0.9, chi, BATCH[1]))
+
+
+def test_table_builders_reject_a_weight_batch():
+    df = synthetic_draws(500, seed=1)
+    windows = compute_windows(df, 0.98)
+    assert single_weights([0.4, 0.4, 0.2]) == DEFAULT_WEIGHTS
+    pair_features(windows, "red", weights=DEFAULT_WEIGHTS)
+    with pytest.raises(ValueError, match="weight triple"):
+        pair_features(windows, "red", weights=BATCH)
+    with pytest.raises(ValueError, match="weight triple"):
+        next(rolling_scores(df, [30], weights=BATCH))
+    with pytest.raises(ValueError, match="weight triple"):
+        bootstrap_ci(DrawStore.from_frame(df), 0.98, 2, weights=BATCH)
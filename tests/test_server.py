@@ -0,0 +1,45 @@
+import asyncio
+
+import pytest
+
+from server import AnalysisService, HTTPError, MAX_BODY, _read_request
+
+
+def _read(raw: bytes):
+    async def run():
+        reader = asyncio.StreamReader()
+        reader.feed_data(raw)
+        reader.feed_eof()
+        return await _read_request(reader)
+    return asyncio.run(run())
+
+
+@pytest.mark.parametrize("body, content_type", [
+    (b"<html><body>consent page</body></html>", "text/html"),
+    (b"\xff\xfe<html></html>", "text/html"),
+    (b"{not json", "application/json"),
+])
+def test_bad_ingest_body_is_a_400(body, content_type):
+    service = AnalysisService.__new__(AnalysisService)  # parsing needs no state
+    service.parser = "fast"
+    with pytest.raises(HTTPError) as e:
+        service.parse_ingest_body(body, content_type)
+    assert e.value.status == 400
+
+
+@pytest.mark.parametrize("value", ["abc", "1.5", "-1", " -20 "])
+def test_bad_content_length_is_a_400(value):
+    with pytest.raises(HTTPError) as e:
+        _read(f"POST /ingest HTTP/1.1\r\nContent-Length: {value}\r\n\r\n".encode())
+    assert e.value.status == 400
+
+
+def test_oversized_content_length_is_a_413():
+    with pytest.raises(HTTPError) as e:
+        _read(f"POST /ingest HTTP/1.1\r\nContent-Length: {MAX_BODY + 1}\r\n\r\n".encode())
+    assert e.value.status == 413
+
+
+def test_request_with_body_is_read():
+    method, target, headers, body = _read(b"POST /ingest HTTP/1.1\r\nContent-Length: 2\r\n\r\n[]")
+    assert (method, target, body) == ("POST", "/ingest", b"[]")
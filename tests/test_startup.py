@@ -0,0 +1,8 @@
+from bench.__main__ import startup_check, STARTUP_BUDGET, HEAVY_MODULES
+
+
+def test_import_main_is_light():
+    # Same check as the benchmark: best of a few fresh `import main` runs
+    result = startup_check(repeat=3, budget=STARTUP_BUDGET)
+    assert result["heavy_modules"] == [], f"import main loaded {result['heavy_modules']} (of {HEAVY_MODULES})"
+    assert result["seconds"] <= STARTUP_BUDGET, f"import main took {result['seconds']:.2f}s"
@@ -1,45 +1,143 @@
+import hashlib
+import json
 import os
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+
+import matplotlib
+matplotlib.use("Agg")  # headless: render boxes have no display, and Agg is the fastest raster backend
 import matplotlib.pyplot as plt
+import pandas as pd
+
+# Bump when plot styling changes so cached PNGs are re-rendered
+VIZ_VERSION = 1
+MANIFEST = ".plot_manifest.json"
+
+# One figure per size, cleared and reused instead of a new plt.figure per plot
+_FIGURES = {}
 
 def ensure_dir(d):
     os.makedirs(d, exist_ok=True)
 
+def _axes(figsize):
+    fig = _FIGURES.get(figsize)
+    if fig is None or not plt.fignum_exists(fig.number):
+        fig = _FIGURES[figsize] = plt.figure(figsize=figsize)
+    fig.clf()
+    return fig, fig.add_subplot(111)
+
 def plot_heatmap(df_matrix, title, out_path):
-    plt.figure(figsize=(10, 8))
-    plt.imshow(df_matrix.values, aspect="auto")
-    plt.title(title)
-    plt.xlabel("Number")
-    plt.ylabel("Number")
-    plt.xticks(range(len(df_matrix.columns)), df_matrix.columns, rotation=90)
-    plt.yticks(range(len(df_matrix.index)), df_matrix.index)
-    plt.tight_layout()
-    plt.savefig(out_path)
-    plt.close()
+    fig, ax = _axes((10, 8))
+    ax.imshow(df_matrix.values, aspect="auto")
+    ax.set_title(title)
+    ax.set_xlabel("Number")
+    ax.set_ylabel("Number")
+    ax.set_xticks(range(len(df_matrix.columns)))
+    ax.set_xticklabels(df_matrix.columns, rotation=90)
+    ax.set_yticks(range(len(df_matrix.index)))
+    ax.set_yticklabels(df_matrix.index)
+    fig.tight_layout()
+    fig.savefig(out_path)
 
 def plot_bar(df, title, out_path, x_col="pair", y_col="value", top_n=10):
     sub = df.head(top_n)
-    plt.figure(figsize=(12, 5))
-    plt.bar([str(x) for x in sub[x_col]], sub[y_col])
-    plt.title(title)
-    plt.xticks(rotation=45, ha="right")
-    plt.tight_layout()
-    plt.savefig(out_path)
-    plt.close()
+    fig, ax = _axes((12, 5))
+    ax.bar([str(x) for x in sub[x_col]], sub[y_col])
+    ax.set_title(title)
+    ax.tick_params(axis="x", labelrotation=45)
+    for label in ax.get_xticklabels():
+        label.set_horizontalalignment("right")
+    fig.tight_layout()
+    fig.savefig(out_path)
 
 def plot_hist(series, title, out_path, bins=40):
-    plt.figure(figsize=(10, 5))
-    plt.hist(series, bins=bins)
-    plt.title(title)
-    plt.tight_layout()
-    plt.savefig(out_path)
-    plt.close()
+    fig, ax = _axes((10, 5))
+    ax.hist(series, bins=bins)
+    ax.set_title(title)
+    fig.tight_layout()
+    fig.savefig(out_path)
 
 def plot_scatter(x, y, title, out_path, xlabel, ylabel):
-    plt.figure(figsize=(8, 6))
-    plt.scatter(x, y, s=10)
-    plt.title(title)
-    plt.xlabel(xlabel)
-    plt.ylabel(ylabel)
-    plt.tight_layout()
-    plt.savefig(out_path)
-    plt.close()
+    fig, ax = _axes((8, 6))
+    ax.scatter(x, y, s=10)
+    ax.set_title(title)
+    ax.set_xlabel(xlabel)
+    ax.set_ylabel(ylabel)
+    fig.tight_layout()
+    fig.savefig(out_path)
+
+# --- batched rendering ---
+
+PLOTTERS = {
+    "heatmap": plot_heatmap,
+    "bar": plot_bar,
+    "hist": plot_hist,
+    "scatter": plot_scatter,
+}
+
+# kind: key in PLOTTERS; args/kwargs: the plot_* call minus out_path (which is
+# passed by keyword, so arguments after it in the signature go in kwargs)
+PlotJob = namedtuple("PlotJob", ["kind", "out_path", "args", "kwargs"])
+
+def plot_job(kind, out_path, *args, **kwargs):
+    if kind not in PLOTTERS:
+        raise ValueError(f"Unknown plot kind: {kind}")
+    return PlotJob(kind, out_path, args, kwargs)
+
+def _digest_value(h, value):
+    if isinstance(value, (pd.DataFrame, pd.Series)):
+        h.update(value.to_csv().encode())
+    else:
+        h.update(repr(value).encode())
+
+def job_hash(job: PlotJob) -> str:
+    """Hash of everything that determines the rendered image."""
+    h = hashlib.sha1(f"{VIZ_VERSION}|{matplotlib.__version__}|{job.kind}".encode())
+    for value in job.args:
+        _digest_value(h, value)
+    for key in sorted(job.kwargs):
+        h.update(key.encode())
+        _digest_value(h, job.kwargs[key])
+    return h.hexdigest()
+
+def render_job(job: PlotJob):
+    PLOTTERS[job.kind](*job.args, out_path=job.out_path, **job.kwargs)
+    return job.out_path
+
+def _load_manifest(plot_dir):
+    try:
+        with open(os.path.join(plot_dir, MANIFEST)) as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return {}
+
+def render_jobs(jobs, plot_dir, workers: int = 1, force: bool = False):
+    """
+    Render a batch of PlotJobs. A job is skipped when its output exists and
+    its input hash matches the one recorded in <plot_dir>/.plot_manifest.json
+    from the last run. The rest render in-process (reusing figures) or, with
+    workers > 1, in a process pool. Returns (rendered, skipped).
+    """
+    ensure_dir(plot_dir)
+    manifest = _load_manifest(plot_dir)
+    hashes = {job.out_path: job_hash(job) for job in jobs}
+    todo = [
+        job for job in jobs
+        if force or manifest.get(os.path.basename(job.out_path)) != hashes[job.out_path]
+        or not os.path.isfile(job.out_path)
+    ]
+
+    if workers and workers > 1 and len(todo) > 1:
+        with ProcessPoolExecutor(max_workers=min(workers, len(todo))) as ex:
+            list(ex.map(render_job, todo))
+    else:
+        for job in todo:
+            render_job(job)
+
+    for job in jobs:
+        manifest[os.path.basename(job.out_path)] = hashes[job.out_path]
+    tmp = os.path.join(plot_dir, MANIFEST + ".tmp")
+    with open(tmp, "w") as f:
+        json.dump(manifest, f, indent=1, sort_keys=True)
+    os.replace(tmp, os.path.join(plot_dir, MANIFEST))
+    return len(todo), len(jobs) - len(todo)